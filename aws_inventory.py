@@ -2,13 +2,18 @@
 import argparse
 import logging
 import os.path
+import sys
 
-import botocore
 from opinel.utils.console import configPrintException
 
+import aws_inventory.apimodel
 import aws_inventory.config
 import aws_inventory.blacklist
+import aws_inventory.diff
 import aws_inventory.invoker
+import aws_inventory.progress
+import aws_inventory.search_index
+import aws_inventory.tracing
 
 
 # create a module logger and ignore messages outside of the module. botocore was spewing messages
@@ -76,15 +81,115 @@ def parse_args(args=None):
                             '(default: %(default)s)'
                         ))
 
+    parser.add_argument('--no-model-cache',
+                        action='store_true',
+                        help=('Always build the API model from the botocore service models instead of '
+                              'using the cached one (cache: {})'.format(
+                                  aws_inventory.config.API_MODEL_CACHE_DIR
+                              )))
+
+    parser.add_argument('--no-region-preflight',
+                        action='store_true',
+                        help=('Invoke APIs in every selected region instead of first checking which '
+                              'regions are enabled for the account (cached for {:d} hours in '
+                              '{})'.format(aws_inventory.config.REGION_PREFLIGHT_TTL / 3600,
+                                           aws_inventory.config.CACHE_DIR)))
+
+    parser.add_argument('--max-threads',
+                        type=int,
+                        default=aws_inventory.config.MAX_THREADS,
+                        help=('Number of worker threads invoking APIs, which bounds the number of '
+                              'API calls in flight. Calls mostly wait on the network, so it can be '
+                              'well above the number of CPUs (default: %(default)s)'))
+
+    parser.add_argument('--stream-pages',
+                        action='store_true',
+                        help=('Store each page of a paginated response as it arrives, using the '
+                              'largest page size an operation allows, instead of building the full '
+                              'response in memory first. Only effective with a disk backend '
+                              '(--store-dir, --resume, or --sqlite-db); the in-memory store merges '
+                              'the pages in memory anyway'))
+
+    parser.add_argument('--keep-response-metadata',
+                        action='store_true',
+                        help=('Store the full ResponseMetadata of each response (HTTP headers, '
+                              'etc.) instead of only its request ID, HTTP status code, and retry '
+                              'attempts'))
+
+    parser.add_argument('--store-dir',
+                        help=('Directory to append responses to as they arrive instead of keeping '
+                              'them in memory until the end of the run'))
+
+    parser.add_argument('--sqlite-db',
+                        metavar='FILE',
+                        help=('SQLite database to write responses to as they arrive instead of '
+                              'keeping them in memory until the end of the run. Besides the '
+                              'responses, it has an indexed table of the ARNs, IDs, names, and '
+                              'tags of the resources in them (see aws_inventory/database.py)'))
+
+    parser.add_argument('--resume',
+                        metavar='STORE_DIR',
+                        help=('Continue a run which stopped early, skipping operations already '
+                              'recorded in its --store-dir'))
+
+    parser.add_argument('--progress',
+                        choices=aws_inventory.progress.REPORTERS,
+                        default=aws_inventory.progress.GUI,
+                        help=('How to show progress. "gui" opens a window and waits for the start '
+                              'button. The others start right away and need no display: '
+                              '"terminal" redraws a progress bar, "log" logs a line every {:d} '
+                              'seconds, and "none" shows nothing (default: %(default)s)'.format(
+                                  aws_inventory.config.PROGRESS_LOG_INTERVAL
+                              )))
+
+    parser.add_argument('--trace',
+                        action='store_true',
+                        help=('Record the timing of every API call. Writes a Chrome trace-event file '
+                              '(*{}, for chrome://tracing or Perfetto) and a summary of the slowest '
+                              'services, regions, and operations (*{}) next to the GUI data '
+                              'file'.format(aws_inventory.tracing.TRACE_FILE_SUFFIX,
+                                            aws_inventory.tracing.SUMMARY_FILE_SUFFIX)))
+
+    parser.add_argument('--metrics-port',
+                        type=int,
+                        help=('Serve live metrics of the scan for Prometheus to scrape on '
+                              'http://{}:<port>/metrics'.format(aws_inventory.config.METRICS_ADDRESS)))
+
     parser.add_argument('--exceptions-dump', help='File to dump the exceptions store')
 
     parser.add_argument('--responses-dump', help='File to dump the responses store')
 
+    parser.add_argument('--dump-format',
+                        choices=['pickle', 'indexed'],
+                        default='pickle',
+                        help=('Format of the responses and exceptions dumps. "pickle" is a pickled '
+                              'dict, which must be loaded whole. "indexed" has an index of its '
+                              'entries, so single responses can be read without loading the rest '
+                              '(see aws_inventory/dumpfile.py) (default: %(default)s)'))
+
     parser.add_argument('--gui-data-file',
-                        help='File to the GUI data (default: {})'.format(
-                            aws_inventory.config.GUI_DATA_FILENAME_TEMPLATE.template
+                        help='File to the GUI data (default: {}, or {} if chunked)'.format(
+                            aws_inventory.config.GUI_DATA_FILENAME_TEMPLATE.template,
+                            aws_inventory.config.GUI_CHUNKED_DATA_FILENAME_TEMPLATE.template
                         ))
 
+    parser.add_argument('--gui-data-format',
+                        choices=['json', 'chunked'],
+                        default='json',
+                        help=('Format of the GUI data. "json" is one JSON document, which the GUI '
+                              'loads whole. "chunked" lets the GUI show the services right away and '
+                              'load each operation\'s response when it is opened, for inventories '
+                              'too large to load at once. The prebuilt GUI in gui/dist does not '
+                              'read it yet; build the GUI from gui/src to use it '
+                              '(default: %(default)s)'))
+
+    parser.add_argument('--search-index',
+                        action='store_true',
+                        help=('Write a search index (*{}) next to the GUI data file. It is read by '
+                              'the GUI built from gui/src, not by the prebuilt one in '
+                              'gui/dist'.format(
+                                  aws_inventory.search_index.SEARCH_INDEX_FILE_SUFFIX)))
+
     parser.add_argument('--debug',
                         action='store_true',
                         help='Print debugging information')
@@ -99,17 +204,77 @@ def parse_args(args=None):
 
     parsed = parser.parse_args(args)
 
+    if parsed.max_threads < 1:
+        parser.error('--max-threads must be at least 1')
+
+    if parsed.metrics_port is not None and not 0 <= parsed.metrics_port <= 65535:
+        parser.error('--metrics-port must be between 0 and 65535')
+
+    if parsed.resume and parsed.store_dir:
+        parser.error('--resume continues the run in its own store directory; do not use '
+                     '--store-dir with it')
+
+    if parsed.sqlite_db and (parsed.store_dir or parsed.resume):
+        parser.error('--sqlite-db is a store of its own; do not use --store-dir or --resume with it')
+
     # Fill in filename-based defaults. We can't use "default" kwarg because we need another
     #   commandline arg, namely the profile name.
 
     if not parsed.gui_data_file:
         tool_dir = os.path.dirname(__file__)
-        relative_path = aws_inventory.config.GUI_DATA_FILENAME_TEMPLATE.substitute(
-            profile=parsed.profile
-        )
+        if parsed.gui_data_format == 'chunked':
+            filename_template = aws_inventory.config.GUI_CHUNKED_DATA_FILENAME_TEMPLATE
+        else:
+            filename_template = aws_inventory.config.GUI_DATA_FILENAME_TEMPLATE
+        relative_path = filename_template.substitute(profile=parsed.profile)
         parsed.gui_data_file = os.path.join(tool_dir, relative_path)
     return parsed
 
+def parse_diff_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog='aws_inventory.py diff',
+        description=('Compare the results of two runs. Results can be a responses dump, a store '
+                     'directory, a SQLite database, or a GUI data file, the same kind for both.')
+    )
+
+    parser.add_argument('old', help='Results of the earlier run')
+
+    parser.add_argument('new', help='Results of the later run')
+
+    parser.add_argument('--json-file',
+                        help=('File to write the added, removed, and modified responses and '
+                              'resources to as JSON (default: stdout)'))
+
+    parser.add_argument('--gui-data-file',
+                        help='GUI data file to write the changed resources to, to view them in the GUI')
+
+    parser.add_argument('--debug',
+                        action='store_true',
+                        help='Print debugging information')
+
+    return parser.parse_args(args)
+
+def diff_main(args):
+    setup_logging(args.debug)
+
+    old_results = aws_inventory.diff.open_results(args.old)
+    new_results = aws_inventory.diff.open_results(args.new)
+    try:
+        diff = aws_inventory.diff.diff_results(old_results, new_results)
+    finally:
+        old_results.close()
+        new_results.close()
+
+    if args.json_file:
+        with open(args.json_file, 'wb') as out_fp:
+            aws_inventory.diff.write_json(diff, out_fp)
+    else:
+        aws_inventory.diff.write_json(diff, sys.stdout)
+
+    if args.gui_data_file:
+        with open(args.gui_data_file, 'wb') as out_fp:
+            aws_inventory.diff.write_gui_data(diff, out_fp)
+
 def filter_services(api_model, services=frozenset(), excluded_services=frozenset()):
     """Build a list of services by merging together a white- and black-list.
 
@@ -189,56 +354,6 @@ def filter_operations(api_model, op_blacklist_parser, regions, services):
 
     return svc_descriptors
 
-def build_api_model():
-    """Build a model of the available API.
-
-    :rtype: dict
-    :return: dict describing operations from a service and available regions
-    """
-    boto_session = botocore.session.get_session()
-
-    LOGGER.debug('Building service list.')
-    available_services = frozenset(boto_session.get_available_services())
-
-    svc_descriptors = {}
-    for svc_name in available_services:
-        # validate regions
-        available_regions = frozenset(boto_session.get_available_regions(svc_name))
-        svc_descriptors[svc_name] = {'regions': available_regions}
-
-        if available_regions:
-            LOGGER.debug(
-                '[%s] Available service region(s): %s.',
-                svc_name,
-                ', '.join(available_regions))
-        else:
-            LOGGER.warning(
-                '[%s] Unable to obtain a valid region. Assuming service is region agnostic (i.e., '
-                'global).', svc_name)
-
-        operations = []
-        # get operation names from local service model files
-        api_version = boto_session.get_config_variable('api_versions').get(svc_name, None)
-        service_model = boto_session.get_service_model(svc_name, api_version=api_version)
-
-        # Filter out operations we don't care about. Currently we care about operations with
-        #   names indicating a list- or describe-like action and the operation doesn't require
-        #   any params.
-        # create list of desired service operations
-        for svc_op in service_model.operation_names:
-            if aws_inventory.config.SVC_OPS_RE.match(svc_op):
-                operation_model = service_model.operation_model(svc_op)
-                try:
-                    if not operation_model.input_shape.required_members:
-                        operations.append(svc_op)
-                except AttributeError:
-                    # no input shape
-                    operations.append(svc_op)
-
-        svc_descriptors[svc_name]['ops'] = operations
-
-    return svc_descriptors
-
 def main(args):
     setup_logging(args.debug)
 
@@ -246,7 +361,13 @@ def main(args):
         print aws_inventory.__version__
         return
 
-    api_model = build_api_model()
+    if args.gui_data_format == 'chunked':
+        LOGGER.warning('The prebuilt GUI in gui/dist cannot open chunked GUI data. Build the GUI '
+                       'from gui/src to view "%s".', args.gui_data_file)
+
+    api_model = aws_inventory.apimodel.build_api_model(
+        None if args.no_model_cache else aws_inventory.config.API_MODEL_CACHE_DIR
+    )
 
     if args.list_svcs:
         print '\n'.join(sorted(filter_services(api_model)))
@@ -317,4 +438,7 @@ def main(args):
         aws_inventory.invoker.ApiInvoker(args, service_descriptors, ops_count).start()
 
 if __name__ == '__main__':
-    main(parse_args())
+    if sys.argv[1:2] == ['diff']:
+        diff_main(parse_diff_args(sys.argv[2:]))
+    else:
+        main(parse_args())
@@ -0,0 +1,166 @@
+"""Build the reference API model from botocore service models and cache it on disk."""
+
+import errno
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import time
+
+import botocore.session
+
+import config
+import version
+
+
+LOGGER = logging.getLogger(__name__)
+
+# botocore session of a model building process. Created on first use.
+_SESSION = None
+
+def _get_session():
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = botocore.session.get_session()
+    return _SESSION
+
+def describe_service(svc_name):
+    """Describe the regions and desired operations of a service.
+
+    :param str svc_name: service name
+    :rtype: tuple
+    :return: service name and dict describing operations and available regions
+    """
+    boto_session = _get_session()
+
+    # validate regions
+    available_regions = frozenset(boto_session.get_available_regions(svc_name))
+    descriptor = {'regions': available_regions}
+
+    if available_regions:
+        LOGGER.debug(
+            '[%s] Available service region(s): %s.',
+            svc_name,
+            ', '.join(available_regions))
+    else:
+        LOGGER.warning(
+            '[%s] Unable to obtain a valid region. Assuming service is region agnostic (i.e., '
+            'global).', svc_name)
+
+    operations = []
+    # get operation names from local service model files
+    api_version = boto_session.get_config_variable('api_versions').get(svc_name, None)
+    service_model = boto_session.get_service_model(svc_name, api_version=api_version)
+
+    # Filter out operations we don't care about. Currently we care about operations with
+    #   names indicating a list- or describe-like action and the operation doesn't require
+    #   any params.
+    # create list of desired service operations
+    for svc_op in service_model.operation_names:
+        if config.SVC_OPS_RE.match(svc_op):
+            operation_model = service_model.operation_model(svc_op)
+            try:
+                if not operation_model.input_shape.required_members:
+                    operations.append(svc_op)
+            except AttributeError:
+                # no input shape
+                operations.append(svc_op)
+
+    descriptor['ops'] = operations
+    return svc_name, descriptor
+
+def get_cache_key(boto_session):
+    """Key identifying a built API model. It changes whenever anything the model depends on does.
+
+    :param botocore.session.Session boto_session: botocore session
+    :rtype: str
+    :return: hex digest
+    """
+    key_data = {
+        'version': version.__version__,
+        'botocore_version': botocore.__version__,
+        'svc_ops_re': config.SVC_OPS_RE.pattern,
+        'api_versions': boto_session.get_config_variable('api_versions'),
+        'data_path': boto_session.get_config_variable('data_path')
+    }
+    return hashlib.sha1(json.dumps(key_data, sort_keys=True)).hexdigest()
+
+def _load_cache(cache_file):
+    try:
+        with open(cache_file, 'rb') as in_fp:
+            svc_descriptors = pickle.load(in_fp)
+        # the modification time tells when the model was last used
+        try:
+            os.utime(cache_file, None)
+        except OSError:
+            pass
+        return svc_descriptors
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            LOGGER.warning('Unable to read API model cache "%s": %s', cache_file, e)
+    except Exception as e:
+        LOGGER.warning('Ignoring corrupt API model cache "%s": %s', cache_file, e)
+    return None
+
+def _save_cache(cache_dir, cache_file, svc_descriptors):
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # remove models which were not used for a while. Others may be used by runs with other
+        # inputs, e.g., from another virtualenv sharing the cache directory.
+        expired = time.time() - config.API_MODEL_CACHE_TTL
+        for stale_file in glob.glob(os.path.join(cache_dir, config.API_MODEL_CACHE_GLOB)):
+            if stale_file != cache_file and os.path.getmtime(stale_file) < expired:
+                os.remove(stale_file)
+        # write to a temporary file first so a concurrent run never reads a partial cache
+        tmp_file = '{}.{:d}.tmp'.format(cache_file, os.getpid())
+        with open(tmp_file, 'wb') as out_fp:
+            pickle.dump(svc_descriptors, out_fp, pickle.HIGHEST_PROTOCOL)
+        if os.name == 'nt' and os.path.exists(cache_file):
+            os.remove(cache_file)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError) as e:
+        LOGGER.warning('Unable to write API model cache in "%s": %s', cache_dir, e)
+
+def _build(boto_session, svc_names):
+    process_count = min(multiprocessing.cpu_count(), len(svc_names))
+    if process_count > 1:
+        pool = multiprocessing.Pool(process_count)
+        try:
+            return dict(pool.map(describe_service, svc_names))
+        finally:
+            pool.close()
+            pool.join()
+    return dict(describe_service(svc_name) for svc_name in svc_names)
+
+def build_api_model(cache_dir=config.API_MODEL_CACHE_DIR):
+    """Build a model of the available API. The model is read from the cache when it was already
+    built for the same inputs. Otherwise, services are described in parallel and the model is cached.
+
+    :param str cache_dir: directory of the cache, or None to disable the cache
+    :rtype: dict
+    :return: dict describing operations from a service and available regions
+    """
+    boto_session = _get_session()
+
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(
+            cache_dir,
+            config.API_MODEL_CACHE_FILENAME_TEMPLATE.substitute(key=get_cache_key(boto_session))
+        )
+        svc_descriptors = _load_cache(cache_file)
+        if svc_descriptors is not None:
+            LOGGER.debug('Using cached API model "%s".', cache_file)
+            return svc_descriptors
+
+    LOGGER.debug('Building service list.')
+    available_services = sorted(boto_session.get_available_services())
+    svc_descriptors = _build(boto_session, available_services)
+
+    if cache_file:
+        _save_cache(cache_dir, cache_file, svc_descriptors)
+    return svc_descriptors
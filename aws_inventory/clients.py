@@ -0,0 +1,136 @@
+"""Create and reuse botocore clients across worker threads."""
+
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+import botocore.exceptions
+import botocore.session
+
+import config
+
+
+LOGGER = logging.getLogger(__name__)
+
+class ClientFactory(object):
+    """Create clients once per service, region, and credentials.
+
+    botocore sessions are not safe to share between threads, so each thread gets its own. They all
+    share one data loader, so service models and endpoint data are read and parsed once per run
+    rather than once per session. Clients for different services and regions are created at the same
+    time, and can be created ahead of the workers needing them with :meth:`warm_up`.
+    """
+
+    def __init__(self, credentials, client_config, endpoint_url=None,
+                 max_threads=config.MAX_THREADS):
+        """
+        :param dict credentials: AWS credentials
+        :param botocore.config.Config client_config: config for all clients to share
+        :param str endpoint_url: endpoint for all clients instead of the AWS ones (e.g., a test
+            server)
+        :param int max_threads: maximum number of threads creating clients ahead of use, as for
+            invoking APIs
+        """
+        self.credentials = credentials
+        self.client_config = client_config
+        self.endpoint_url = endpoint_url
+        self.max_threads = max_threads
+        self._local = threading.local()
+        self._session = botocore.session.get_session()
+        self._loader = self._session.get_component('data_loader')
+        self._api_versions = self._session.get_config_variable('api_versions')
+        self._clients = {}  # {(svc, region, access key ID): client}
+        self._client_locks = {}  # {(svc, region, access key ID): Lock}
+        self._lock = threading.Lock()
+        self._default_region_services = set()  # services needing DEFAULT_REGION to create a client
+        self._warm_up_pool = None
+
+    def get_session(self):
+        """Get the botocore session of the current thread.
+
+        :rtype: botocore.session.Session
+        :return: session
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = botocore.session.get_session()
+            session.register_component('data_loader', self._loader)
+        return session
+
+    def get_api_version(self, svc_name):
+        """
+        :param str svc_name: service name
+        :rtype: str
+        :return: API version configured for the service, or None for the latest
+        """
+        return self._api_versions.get(svc_name, None)
+
+    def get_client(self, svc_name, region, credentials=None):
+        """Get the client for a service in a region. Clients are created on first use.
+
+        :param str svc_name: service name
+        :param str region: region name
+        :param dict credentials: AWS credentials, or None for the factory's credentials
+        :rtype: botocore.client.BaseClient
+        :return: client for the service in the region
+        """
+        credentials = credentials or self.credentials
+        key = (svc_name, region, credentials['AccessKeyId'])
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client_lock = self._client_locks.setdefault(key, threading.Lock())
+        # only one thread creates a given client, while others are created at the same time
+        with client_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self._create_client(svc_name, region, credentials)
+        return client
+
+    def _create_client(self, svc_name, region, credentials):
+        session = self.get_session()
+        kwargs = {'api_version': self.get_api_version(svc_name),
+                  'endpoint_url': self.endpoint_url,
+                  'aws_access_key_id': credentials['AccessKeyId'],
+                  'aws_secret_access_key': credentials['SecretAccessKey'],
+                  'aws_session_token': credentials['SessionToken'],
+                  'config': self.client_config}
+        if svc_name not in self._default_region_services:
+            try:
+                return session.create_client(svc_name, region_name=region, **kwargs)
+            except botocore.exceptions.NoRegionError:
+                LOGGER.warning('[%s][%s] Issue in region detection. Using default region.',
+                               config.DEFAULT_REGION,
+                               svc_name)
+                # every other region of the service would fail the same way
+                self._default_region_services.add(svc_name)
+        return session.create_client(svc_name, region_name=config.DEFAULT_REGION, **kwargs)
+
+    def warm_up(self, keys, threads=None):
+        """Create clients in the background, in order, ahead of the workers needing them. A worker
+        needing a client which is being created waits for it rather than creating another one.
+
+        :param list keys: (service, region) tuples
+        :param int threads: number of threads creating clients, or None for max_threads
+        """
+        threads = threads or self.max_threads
+        def create(key):
+            try:
+                self.get_client(*key)
+            except Exception as e:
+                # the worker invoking the API will run into it again and record it
+                LOGGER.debug('[%s][%s] Unable to create client ahead of use: %s', key[1], key[0], e)
+
+        if not keys:
+            return
+        self._warm_up_pool = ThreadPool(min(threads, len(keys)))
+        self._warm_up_pool.map_async(create, keys, chunksize=1)
+        self._warm_up_pool.close()
+
+    def close(self):
+        """Stop creating clients in the background."""
+        if self._warm_up_pool is not None:
+            self._warm_up_pool.terminate()
+            self._warm_up_pool.join()
+            self._warm_up_pool = None
@@ -0,0 +1,100 @@
+"""Lossless JSON encoding of API responses.
+
+Responses contain values JSON has no type for. They are tagged so they can be decoded again:
+datetimes become {"__datetime__": ISO 8601 string} and binary strings which are not valid UTF-8
+become {"__bytes__": base64 string}.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+import re
+
+from botocore.utils import parse_timestamp
+from dateutil.tz import tzoffset, tzutc
+
+
+DATETIME_TAG = '__datetime__'
+BYTES_TAG = '__bytes__'
+
+# output of datetime.isoformat()
+_ISOFORMAT_RE = re.compile(r'^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{6}))?'
+                           r'(?:([+-])(\d\d):(\d\d))?$')
+_UTC = tzutc()
+
+def _parse_datetime(text):
+    """Parse a datetime tagged by :func:`encode`. Much faster than parse_timestamp, which is only
+    used for other formats."""
+    match = _ISOFORMAT_RE.match(text)
+    if not match:
+        return parse_timestamp(text)
+    year, month, day, hour, minute, second, microsecond, sign, offset_hours, offset_minutes = \
+        match.groups()
+    tzinfo = None
+    if sign:
+        offset = (int(offset_hours) * 60 + int(offset_minutes)) * 60 * (-1 if sign == '-' else 1)
+        tzinfo = _UTC if offset == 0 else tzoffset(None, offset)
+    return datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                             int(microsecond or 0), tzinfo)
+
+def _tag(obj):
+    if isinstance(obj, dict):
+        return dict((key, _tag(val)) for key, val in obj.iteritems())
+    elif isinstance(obj, (list, tuple)):
+        return [_tag(val) for val in obj]
+    elif isinstance(obj, datetime.datetime):
+        return {DATETIME_TAG: obj.isoformat()}
+    elif isinstance(obj, str):
+        try:
+            obj.decode('utf-8')
+        except UnicodeDecodeError:
+            return {BYTES_TAG: base64.b64encode(obj)}
+    return obj
+
+def _untag(obj):
+    if len(obj) == 1:
+        if DATETIME_TAG in obj:
+            return _parse_datetime(obj[DATETIME_TAG])
+        elif BYTES_TAG in obj:
+            return base64.b64decode(obj[BYTES_TAG])
+    return obj
+
+def _tag_datetime(obj):
+    if isinstance(obj, datetime.datetime):
+        return {DATETIME_TAG: obj.isoformat()}
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+def encode(obj):
+    """Encode an object to a single line of JSON.
+
+    :param obj: object to encode
+    :rtype: str
+    :return: JSON
+    """
+    try:
+        # datetimes are tagged as they are met, without copying the object to tag them
+        return json.dumps(obj, separators=(',', ':'), default=_tag_datetime)
+    except UnicodeDecodeError:
+        # binary strings
+        return json.dumps(_tag(obj), separators=(',', ':'))
+
+def decode(data):
+    """Decode an object encoded with :func:`encode`.
+
+    :param str data: JSON
+    :return: decoded object
+    """
+    return json.loads(data, object_hook=_untag)
+
+def fingerprint(obj):
+    """Hash an object by its content. Objects with different content have different fingerprints.
+    Equal objects nearly always have the same one, but not when their dicts iterate in a different
+    order (e.g., keys were added in a different order and collide), so compare objects whose
+    fingerprints differ. Keys are not sorted since that makes json.dumps several times slower.
+
+    :param obj: object to hash
+    :rtype: str
+    :return: hex digest
+    """
+    return hashlib.sha1(encode(obj)).hexdigest()
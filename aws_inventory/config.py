@@ -1,26 +1,174 @@
 """Configuration parameters affecting tool operation."""
 
 import multiprocessing
+import os.path
 import re
 import string
 
 
-# max number of threads for invoking APIs of a service in a region
+# default number of worker threads invoking APIs, which is also the max number of API calls in flight.
+# Workers share one queue of work across all services and regions. The workload is almost all network
+# wait, so --max-threads may be set much higher on a small machine.
 MAX_THREADS = multiprocessing.cpu_count() * 2
 
 # RE to filter desired service operation names
 SVC_OPS_RE = re.compile(r'^(Describe|List).+')
 
+# size at which the disk-backed result store starts a new segment file
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# number of statements in each transaction of the SQLite result store. See database.py
+SQLITE_BATCH_SIZE = 1000
+
+# parts of the ResponseMetadata of each response which are stored, unless --keep-response-metadata
+RESPONSE_METADATA_SUMMARY_KEYS = ('RequestId', 'HTTPStatusCode', 'RetryAttempts')
+# longest string value shared between responses when stored. Keys are always shared.
+INTERN_MAX_LENGTH = 64
+
+## Progress reporting. See progress.py ##
+# number of seconds of recent progress used to compute calls per second and the ETA
+PROGRESS_RATE_WINDOW = 10
+# number of seconds between redrawing the terminal progress bar, and between progress log lines
+PROGRESS_TERMINAL_INTERVAL = 0.5
+PROGRESS_LOG_INTERVAL = 10
+# number of seconds between refreshes of the GUI. Progress in between is shown all at once.
+PROGRESS_GUI_INTERVAL = 0.2
+
+# number of rows in each table of the call trace summary. See tracing.py
+TRACE_SUMMARY_TOP = 20
+
+## Live metrics. See metrics.py ##
+# address to serve metrics on. Only local by default.
+METRICS_ADDRESS = '127.0.0.1'
+# upper bounds, in seconds, of the request latency histogram buckets
+METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
 ## some constants ##
 
+# directory for caches which outlive a run
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'aws_inventory')
+# directory for caching the API model built from botocore service models
+API_MODEL_CACHE_DIR = CACHE_DIR
+# name of the API model cache file. The key identifies the inputs the model was built from.
+API_MODEL_CACHE_FILENAME_TEMPLATE = string.Template('api_model-$key.pickle')
+API_MODEL_CACHE_GLOB = 'api_model-*.pickle'
+# number of seconds since it was last used after which a cached API model is removed. Models built for
+# other inputs (e.g., another virtualenv's botocore) are kept until then.
+API_MODEL_CACHE_TTL = 30 * 24 * 60 * 60
+
 # used to create JSON file (in "./gui/") for holding the GUI data
 GUI_DATA_FILENAME_TEMPLATE = string.Template('gui/aws_inventory_data-$profile.json')
+# used instead for the chunked GUI data, which the GUI loads lazily. See store.py
+GUI_CHUNKED_DATA_FILENAME_TEMPLATE = string.Template('gui/aws_inventory_data-$profile.ndjson')
+
+# error codes meaning the credentials expired during the run
+EXPIRED_CREDENTIALS_ERROR_CODES = frozenset([
+    'ExpiredToken',
+    'ExpiredTokenException',
+    'RequestExpired',
+    'TokenRefreshRequired'
+])
+
+## Throttling control. See throttle.py ##
+# error codes meaning an API call was throttled
+THROTTLING_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'SlowDown',
+    'BandwidthLimitExceeded',
+    'EC2ThrottledException',
+    'PriorRequestNotComplete'
+])
+# concurrent calls allowed to a service in a region at first, and at most. The maximum is also bounded
+# by the number of worker threads.
+THROTTLE_INITIAL_CONCURRENCY = 4
+THROTTLE_MAX_CONCURRENCY = 25
+# minimum number of seconds between lowering the concurrency limit of a service in a region
+THROTTLE_DECREASE_INTERVAL = 1
+# retries of a throttled call and the backoff between them, in seconds
+THROTTLE_MAX_RETRIES = 6
+THROTTLE_BACKOFF_BASE = 0.5
+THROTTLE_BACKOFF_CAP = 20
+
+## Error classification. See errors.py ##
+# error codes meaning a call may succeed if retried
+TRANSIENT_ERROR_CODES = frozenset([
+    'InternalError',
+    'InternalFailure',
+    'InternalServerError',
+    'InternalServiceError',
+    'InternalServiceException',
+    'ServiceUnavailable',
+    'ServiceUnavailableException',
+    'RequestTimeout',
+    'RequestTimeoutException'
+])
+# retries of a call which failed with a transient error other than throttling
+TRANSIENT_MAX_RETRIES = 2
+# error codes meaning the service (or the whole region) is not enabled for the account
+REGION_DISABLED_ERROR_CODES = frozenset([
+    'AuthFailure',
+    'InvalidClientTokenId',
+    'UnrecognizedClientException'
+])
+# error codes meaning the credentials are not allowed to invoke the operation in the region
+AUTH_ERROR_CODES = frozenset([
+    'AccessDenied',
+    'AccessDeniedException',
+    'AuthorizationError',
+    'Forbidden',
+    'NotAuthorized',
+    'OptInRequired',
+    'SubscriptionRequiredException',
+    'UnauthorizedAccess',
+    'UnauthorizedException',
+    'UnauthorizedOperation'
+])
+# error codes meaning the operation will fail the same way in any region
+PERMANENT_ERROR_CODES = frozenset([
+    'InvalidAction',
+    'InvalidParameter',
+    'InvalidParameterCombination',
+    'InvalidParameterException',
+    'InvalidParameterValue',
+    'InvalidParameterValueException',
+    'MissingAction',
+    'MissingParameter',
+    'UnknownOperationException',
+    'UnsupportedOperation',
+    'ValidationError',
+    'ValidationException'
+])
+
+## Region preflight. See preflight.py ##
+# name of the file caching which regions are enabled. The key identifies the credentials.
+REGION_PREFLIGHT_CACHE_FILENAME_TEMPLATE = string.Template('regions-$key.json')
+# number of seconds a cached region state is valid
+REGION_PREFLIGHT_TTL = 24 * 60 * 60
+# timeouts, in seconds, of a region probe. Kept short since a reachable region answers quickly.
+REGION_PREFLIGHT_CONNECT_TIMEOUT = 5
+REGION_PREFLIGHT_READ_TIMEOUT = 5
+# maximum number of regions probed at the same time
+REGION_PREFLIGHT_MAX_THREADS = 32
+# region whose global STS endpoint is used to check the credentials before probing regions
+REGION_PREFLIGHT_CREDENTIALS_REGION = 'us-east-1'
 
 ## Network-related timeouts. See botocore/endpoint.py ##
 # number of seconds to wait for a connection to succeed. By default, botocore tries 4 times.
 CLIENT_CONNECT_TIMEOUT = 10
 # number of seconds to wait for a complete API response to be received
 CLIENT_READ_TIMEOUT = 10
+# number of times botocore itself retries a failed call. Throttled and transient failures are retried
+# by the invoker, which backs off and lowers the concurrency of the endpoint (see throttle.py).
+# botocore's own retries would hold the endpoint's slot and add calls to an endpoint already
+# throttled.
+CLIENT_MAX_RETRIES = 0
 
 # region to use when service model says there are no regions, but creating a client still
 # requires one
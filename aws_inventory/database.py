@@ -0,0 +1,398 @@
+"""Storage of responses in a SQLite database, with a table of the resources found in them.
+
+Responses are written as they arrive, encoded with codec.py, one row per service, region, and
+operation. Pages of a paginated response are kept in their own table until the last one arrives, then
+merged into a single response.
+
+Each response is also flattened into the resources table: every object in it with an ARN, an ID, or a
+name (e.g., an instance in DescribeInstances) is a row, and its tags are rows of the tags table. Those
+columns are indexed, so finding where an ARN or ID is does not read any response, e.g.:
+
+    SELECT service, region, operation, path FROM resources WHERE resource_id = 'i-0123456789abcdef0';
+    SELECT r.arn FROM resources r JOIN tags t ON t.resource = r.id WHERE t.key = 'team';
+
+Writes are batched into transactions of config.SQLITE_BATCH_SIZE statements. A database is complete
+once the backend is closed.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from botocore.utils import merge_dicts
+
+import codec
+import config
+import store
+
+
+LOGGER = logging.getLogger(__name__)
+
+# regions are stored as text, so services without regions (None) are stored as ''
+NO_REGION = ''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    service TEXT NOT NULL,
+    region TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    response TEXT NOT NULL,
+    PRIMARY KEY (service, region, operation)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    service TEXT NOT NULL,
+    region TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    page_number INTEGER NOT NULL,
+    page TEXT NOT NULL,
+    result_keys TEXT NOT NULL,
+    PRIMARY KEY (service, region, operation, page_number)
+);
+CREATE TABLE IF NOT EXISTS exceptions (
+    service TEXT NOT NULL,
+    region TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    exception TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    PRIMARY KEY (service, region, operation)
+);
+CREATE TABLE IF NOT EXISTS resources (
+    id INTEGER PRIMARY KEY,
+    service TEXT NOT NULL,
+    region TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    path TEXT NOT NULL,
+    arn TEXT,
+    resource_id TEXT,
+    name TEXT
+);
+CREATE INDEX IF NOT EXISTS resources_operation ON resources (service, region, operation);
+CREATE INDEX IF NOT EXISTS resources_arn ON resources (arn);
+CREATE INDEX IF NOT EXISTS resources_resource_id ON resources (resource_id);
+CREATE INDEX IF NOT EXISTS resources_name ON resources (name);
+CREATE TABLE IF NOT EXISTS tags (
+    resource INTEGER NOT NULL REFERENCES resources (id),
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS tags_resource ON tags (resource);
+CREATE INDEX IF NOT EXISTS tags_key_value ON tags (key, value);
+"""
+
+# keys holding the tags of a resource, as a list of {"Key": key, "Value": value} or a dict
+TAG_KEYS = ('Tags', 'TagList', 'TagSet')
+
+def _singular(key):
+    """
+    :param str key: key of a list, e.g., "Instances" or "Policies"
+    :rtype: str
+    :return: what an item of the list is called, e.g., "Instance" or "Policy"
+    """
+    if key.endswith('ies'):
+        return key[:-3] + 'y'
+    elif key.endswith('s'):
+        return key[:-1]
+    return key
+
+def _pick(obj, kind, item_name):
+    """Pick the value of an ARN, ID, or name key of an object. Objects have several (e.g., an
+    instance has an ImageId and a VpcId), so the one named after the object wins, e.g., InstanceId
+    for an item of Instances, or GroupId for an item of SecurityGroups.
+
+    :param dict obj: object in a response
+    :param str kind: "Arn", "Id", or "Name"
+    :param str item_name: what the object is called, or None
+    :rtype: str
+    :return: value, or None
+    """
+    val = obj.get(kind, obj.get(kind.upper()))
+    if isinstance(val, basestring):
+        return val
+    best = None
+    for key, val in obj.iteritems():
+        if not isinstance(val, basestring) or not (key.endswith(kind) or key.endswith(kind.upper())):
+            continue
+        prefix = key[:-len(kind)]
+        if kind == 'Arn' and val.startswith('arn:') and best is None:
+            best = (0, key, val)
+        if item_name and prefix and item_name.endswith(prefix):
+            if best is None or (len(prefix), key) > best[:2]:
+                best = (len(prefix), key, val)
+    return best[2] if best else None
+
+def _get_tags(obj):
+    """
+    :param dict obj: object in a response
+    :rtype: list
+    :return: (key, value) tuples
+    """
+    for tag_key in TAG_KEYS:
+        tags = obj.get(tag_key)
+        if isinstance(tags, dict):
+            return [(key, val) for key, val in tags.iteritems() if isinstance(key, basestring)]
+        elif isinstance(tags, list):
+            pairs = []
+            for tag in tags:
+                if isinstance(tag, dict):
+                    key = tag.get('Key', tag.get('key', tag.get('TagKey')))
+                    if isinstance(key, basestring):
+                        pairs.append((key, tag.get('Value', tag.get('value', tag.get('TagValue')))))
+            return pairs
+    return []
+
+def _format_tag_value(val):
+    if val is None or isinstance(val, basestring):
+        return val
+    return json.dumps(val)
+
+def iter_resources(resp):
+    """Find the resources in a response: objects with an ARN, an ID, or a name, and the items of
+    lists of them (e.g., QueueUrls or TableNames). Response metadata is skipped.
+
+    :param resp: response
+    :rtype: iterator
+    :return: (path, arn, resource_id, name, tags) tuples, where the path is a JMESPath expression of
+        the resource in the response, e.g., "Reservations[0].Instances[1]"
+    """
+    for path, _, arn, resource_id, name, tags in iter_resource_values(resp):
+        yield path, arn, resource_id, name, tags
+
+def iter_resource_values(resp):
+    """Find the resources in a response, as :func:`iter_resources` does, along with their values.
+    Resources are found in depth-first order, so the resources in a resource follow it.
+
+    :param resp: response
+    :rtype: iterator
+    :return: (path, value, arn, resource_id, name, tags) tuples
+    """
+    stack = [(resp, '', None)]  # (value, path, what the value is called)
+    while stack:
+        obj, path, item_name = stack.pop()
+        if isinstance(obj, dict):
+            if path:
+                arn = _pick(obj, 'Arn', item_name)
+                resource_id = _pick(obj, 'Id', item_name)
+                name = _pick(obj, 'Name', item_name)
+                tags = _get_tags(obj)
+                if name is None:
+                    name = dict(tags).get('Name')
+                if arn is not None or resource_id is not None or name is not None:
+                    yield path, obj, arn, resource_id, name, tags
+            for key in sorted(obj, reverse=True):
+                if key != 'ResponseMetadata' and key not in TAG_KEYS:
+                    stack.append((obj[key], '{}.{}'.format(path, key) if path else key, key))
+        elif isinstance(obj, list):
+            item_name = _singular(item_name) if item_name else None
+            for i in xrange(len(obj) - 1, -1, -1):
+                stack.append((obj[i], '{}[{:d}]'.format(path, i), item_name))
+        elif isinstance(obj, basestring) and path.endswith(']') and item_name:
+            # item of a list of ARNs, IDs, names, or URLs
+            if item_name.endswith(('Arn', 'ARN')):
+                yield path, obj, obj, None, None, []
+            elif item_name.endswith(('Id', 'Url')):
+                yield path, obj, None, obj, None, []
+            elif item_name.endswith('Name'):
+                yield path, obj, None, None, obj, []
+
+class SqliteBackend(object):
+    """Response storage in a SQLite database, with a table of the resources in the responses."""
+
+    def __init__(self, path, batch_size=config.SQLITE_BATCH_SIZE, read_only=False):
+        """
+        :param str path: database file. It is created if it does not exist, unless read_only.
+        :param int batch_size: number of statements per transaction
+        :param bool read_only: open the results of an earlier run without modifying them, e.g., to
+            compare runs. The journal mode and schema are left as they are.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        # responses are added from the worker threads, so the connection is shared behind the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.text_factory = str
+        if read_only:
+            self._conn.execute('PRAGMA query_only = ON')
+        else:
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.execute('PRAGMA synchronous = NORMAL')
+            self._conn.executescript(SCHEMA)
+        self._pending = 0  # statements since the last commit
+        self.bytes_written = 0  # total size of the encoded responses
+        self._keys = set(self._conn.execute('SELECT service, region, operation FROM responses'))
+        self.resource_count = self._conn.execute('SELECT COUNT(*) FROM resources').fetchone()[0]
+
+    def _execute(self, statement, params=()):
+        self._pending += 1
+        return self._conn.execute(statement, params)
+
+    def _executemany(self, statement, rows):
+        self._pending += len(rows)
+        self._conn.executemany(statement, rows)
+
+    def _maybe_commit(self):
+        if self._pending >= self.batch_size:
+            self._conn.commit()
+            self._pending = 0
+
+    def _delete(self, key):
+        self._execute('DELETE FROM tags WHERE resource IN (SELECT id FROM resources WHERE '
+                      'service = ? AND region = ? AND operation = ?)', key)
+        self.resource_count -= self._execute('DELETE FROM resources WHERE service = ? AND '
+                                             'region = ? AND operation = ?', key).rowcount
+        self._execute('DELETE FROM responses WHERE service = ? AND region = ? AND operation = ?',
+                      key)
+        self._keys.discard(key)
+
+    def _insert(self, key, resp):
+        data = codec.encode(resp)
+        self._delete(key)
+        self._execute('INSERT INTO responses VALUES (?, ?, ?, ?)', key + (data,))
+        self._keys.add(key)
+        self.bytes_written += len(data)
+        for path, arn, resource_id, name, tags in iter_resources(resp):
+            resource = self._execute(
+                'INSERT INTO resources (service, region, operation, path, arn, resource_id, name) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', key + (path, arn, resource_id, name)
+            ).lastrowid
+            self.resource_count += 1
+            if tags:
+                self._executemany('INSERT INTO tags VALUES (?, ?, ?)',
+                                  [(resource, tag_key, _format_tag_value(val))
+                                   for tag_key, val in tags])
+
+    def put_response(self, service, region, svc_op, resp):
+        with self._lock:
+            self._insert((service, region or NO_REGION, svc_op), resp)
+            self._maybe_commit()
+
+    def put_page(self, service, region, svc_op, page, result_keys, page_number):
+        key = (service, region or NO_REGION, svc_op)
+        with self._lock:
+            if page_number == 1:
+                # first page replaces any existing response
+                self._execute('DELETE FROM pages WHERE service = ? AND region = ? AND '
+                              'operation = ?', key)
+                self._delete(key)
+            self._execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)',
+                          key + (page_number, codec.encode(page), json.dumps(result_keys)))
+            self._maybe_commit()
+
+    def finish_pages(self, service, region, svc_op, non_aggregate_part):
+        key = (service, region or NO_REGION, svc_op)
+        with self._lock:
+            resp = {}
+            for page, result_keys in self._conn.execute(
+                    'SELECT page, result_keys FROM pages WHERE service = ? AND region = ? AND '
+                    'operation = ? ORDER BY page_number', key).fetchall():
+                store.merge_page(resp, codec.decode(page), json.loads(result_keys))
+            merge_dicts(resp, non_aggregate_part)
+            self._execute('DELETE FROM pages WHERE service = ? AND region = ? AND operation = ?',
+                          key)
+            self._insert(key, resp)
+            self._maybe_commit()
+
+    def share_response(self, service, region, svc_op, resp, first):
+        # stored again, since resources are found by the region of their response
+        self.put_response(service, region, svc_op, resp)
+
+    def remove_response(self, service, region, svc_op):
+        key = (service, region or NO_REGION, svc_op)
+        with self._lock:
+            self._execute('DELETE FROM pages WHERE service = ? AND region = ? AND operation = ?',
+                          key)
+            self._delete(key)
+            self._maybe_commit()
+
+    def put_exception(self, service, region, svc_op, exc):
+        with self._lock:
+            self._execute('INSERT OR REPLACE INTO exceptions VALUES (?, ?, ?, ?, ?)',
+                          (service, region or NO_REGION, svc_op, exc['exception'], exc['outcome']))
+            self._maybe_commit()
+
+    def get_response(self, service, region, svc_op):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response FROM responses WHERE service = ? AND region = ? AND operation = ?',
+                (service, region or NO_REGION, svc_op)
+            ).fetchone()
+        return codec.decode(row[0]) if row else None
+
+    def iter_responses(self):
+        """Iterate over stored responses, ordered by service, region, and operation. Only one
+        response at a time is read from the database.
+
+        :rtype: iterator
+        :return: (service, region, operation, response) tuples
+        """
+        with self._lock:
+            keys = sorted(self._keys)
+        for service, region, svc_op in keys:
+            resp = self.get_response(service, region, svc_op)
+            if resp is not None:
+                yield service, region or None, svc_op, resp
+
+    def iter_keys(self):
+        """Iterate over the keys of complete responses, without reading them.
+
+        :rtype: iterator
+        :return: (service, region, operation) tuples
+        """
+        with self._lock:
+            keys = list(self._keys)
+        for service, region, svc_op in keys:
+            yield service, region or None, svc_op
+
+    def iter_exceptions(self):
+        """Iterate over stored exceptions.
+
+        :rtype: iterator
+        :return: (service, region, operation, exception) tuples
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM exceptions').fetchall()
+        for service, region, svc_op, exc, outcome in rows:
+            yield service, region or None, svc_op, {'exception': exc, 'outcome': outcome}
+
+    def find_resources(self, value):
+        """Find the resources with an ARN, ID, or name.
+
+        :param str value: ARN, ID, or name
+        :rtype: list
+        :return: resources, as dicts of the columns of the resources table, with the region None
+            for services without regions
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT * FROM resources WHERE arn = ? UNION SELECT * FROM resources WHERE '
+                'resource_id = ? UNION SELECT * FROM resources WHERE name = ? ORDER BY id',
+                (value, value, value)
+            )
+            columns = [column[0] for column in cursor.description]
+            resources = [dict(zip(columns, row)) for row in cursor]
+        for resource in resources:
+            resource['region'] = resource['region'] or None
+        return resources
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        :return: number of responses, and size in bytes of the database file and its write-ahead log
+        """
+        size = 0
+        for path in (self.path, self.path + '-wal'):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                # no log yet, or an in-memory database
+                pass
+        return {'backend': 'sqlite', 'responses': len(self._keys), 'bytes': size}
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+        if self.bytes_written:
+            LOGGER.info('Wrote %d responses with %d resources to database "%s".',
+                        len(self._keys), self.resource_count, self.path)
@@ -0,0 +1,336 @@
+"""Differences between the results of two runs.
+
+Results are read from any format a run writes: a responses dump (pickled or indexed), a store
+directory, a SQLite database, or a GUI data file (JSON or chunked). Both runs should be in the same
+kind of format, since the GUI data has values as the GUI shows them (e.g., "Size = 8") rather than
+their types.
+
+Comparing is done in two passes. First, each response is fingerprinted by its content (see
+codec.fingerprint), without its response metadata, which differs on every call. Only responses with
+different fingerprints, or in one run only, are then compared, resource by resource. Resources are
+the objects with an ARN, an ID, or a name (see database.iter_resources) and are keyed by the first
+of those they have.
+"""
+
+import json
+import logging
+import os
+import pickle
+import re
+
+import codec
+import database
+import dumpfile
+import segments
+import store
+
+
+LOGGER = logging.getLogger(__name__)
+
+SQLITE_HEADER = 'SQLite format 3\x00'
+
+# kinds of change
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+# operation node text with the number of non-empty parts of the response
+_OPERATION_TEXT_RE = re.compile(r'^(.+) \(\d+\)$')
+_LIST_ITEM_TEXT_RE = re.compile(r'^\[\d+\]$')
+
+class DiffError(Exception):
+    """Generic error for comparing results."""
+    pass
+
+def _nodes_to_value(nodes):
+    """Rebuild a value from the jsTree nodes of its children in the GUI data. Leaf values are the
+    text the GUI shows.
+
+    :param list nodes: child nodes
+    :rtype: dict or list
+    """
+    def is_list_item(node):
+        if 'children' in node:
+            return bool(_LIST_ITEM_TEXT_RE.match(node['text']))
+        return not isinstance(node['text'], basestring) or ' = ' not in node['text']
+
+    if any(is_list_item(node) for node in nodes):
+        return [_nodes_to_value(node['children']) if 'children' in node else node['text']
+                for node in nodes]
+    value = {}
+    for node in nodes:
+        if node.get('type') == 'response_metadata':
+            continue
+        if 'children' in node:
+            value[node['text']] = _nodes_to_value(node['children'])
+        else:
+            key, _, val = node['text'].partition(' = ')
+            value[key] = val
+    return value
+
+class GuiDataSource(object):
+    """Responses in a GUI data file, JSON or chunked. Responses are rebuilt from the nodes of their
+    operations, and chunks are read only when their response is."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fp = open(path, 'rb')
+        # not readline, since a JSON GUI data file is a single line
+        header = json.dumps(store.CHUNKED_DATA_HEADER) + '\n'
+        if self._fp.read(len(header)) == header:
+            self._fp.seek(max(0, os.path.getsize(path) - 256))
+            offset, length = json.loads(self._fp.read().splitlines()[-1])['manifest']
+            self._fp.seek(offset)
+            roots = json.loads(self._fp.read(length))['responses']
+        else:
+            self._fp.seek(0)
+            roots = json.load(self._fp)['responses']
+        # {(svc, region, svc_op): child nodes, [offset, length] of the chunk of the child nodes, or
+        #   the text of a value with no children}
+        self._operations = {}
+        for service_node in roots[0]['children']:
+            for region_node in service_node['children']:
+                for operation_node in region_node['children']:
+                    if 'children' in operation_node:
+                        match = _OPERATION_TEXT_RE.match(operation_node['text'])
+                        svc_op = match.group(1) if match else operation_node['text']
+                        children = operation_node['children']
+                        if children is True:
+                            children = operation_node['data']['chunk']
+                    else:
+                        svc_op, _, children = operation_node['text'].partition(' = ')
+                    self._operations[(service_node['text'], region_node['text'], svc_op)] = children
+
+    def get_response(self, service, region, svc_op):
+        children = self._operations.get((service, region, svc_op))
+        if isinstance(children, basestring) or children is None:
+            return children
+        if children and isinstance(children[0], int):
+            offset, length = children
+            self._fp.seek(offset)
+            children = json.loads(self._fp.read(length))
+        return _nodes_to_value(children)
+
+    def iter_responses(self):
+        for key in sorted(self._operations, key=lambda k: (k[0], k[1] or '', k[2])):
+            yield key + (self.get_response(*key),)
+
+    def close(self):
+        self._fp.close()
+
+class DumpSource(object):
+    """Responses in an indexed responses dump."""
+
+    def __init__(self, path):
+        self._fp = open(path, 'rb')
+        self._reader = dumpfile.DumpReader(self._fp)
+        if self._reader.kind != dumpfile.RESPONSES:
+            raise DiffError('"{}" is a dump of {}, not responses.'.format(path, self._reader.kind))
+
+    def get_response(self, service, region, svc_op):
+        if (service, region, svc_op) not in self._reader:
+            return None
+        return self._reader.get(service, region, svc_op)
+
+    def iter_responses(self):
+        return self._reader.iter_entries()
+
+    def close(self):
+        self._fp.close()
+
+def open_results(path):
+    """Open the results of a run.
+
+    :param str path: responses dump, store directory, SQLite database, or GUI data file
+    :rtype: object
+    :return: source of responses, with iter_responses, get_response, and close methods like the
+        result store backends
+    """
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, segments.INDEX_FILENAME)):
+            raise DiffError('No results in directory "{}".'.format(path))
+        return segments.SegmentBackend(path)
+    with open(path, 'rb') as in_fp:
+        start = in_fp.read(len(SQLITE_HEADER))
+    if start == SQLITE_HEADER:
+        return database.SqliteBackend(path, read_only=True)
+    elif start.startswith(dumpfile.MAGIC):
+        return DumpSource(path)
+    elif start.startswith('{'):
+        return GuiDataSource(path)
+    # pickles of protocol 0 and 1, as written by earlier versions, have no header
+    backend = store.MemoryBackend()
+    try:
+        with open(path, 'rb') as in_fp:
+            backend.responses = pickle.load(in_fp)
+    except Exception:
+        raise DiffError('Unrecognized results "{}".'.format(path))
+    if not isinstance(backend.responses, dict):
+        raise DiffError('Unrecognized results "{}".'.format(path))
+    return backend
+
+def _fingerprint_response(resp):
+    return codec.fingerprint(store.without_metadata(resp))
+
+def _fingerprint_all(results):
+    """
+    :rtype: dict
+    :return: {(svc, region, svc_op): fingerprint of the response}
+    """
+    return dict(((service, region, svc_op), _fingerprint_response(resp))
+                for service, region, svc_op, resp in results.iter_responses())
+
+def _get_resources(resp):
+    """Key the outermost resources of a response by the first of their ARN, ID, and name. Resources
+    within a resource (e.g., the security groups of an instance) are compared as part of it.
+
+    :param resp: response
+    :rtype: dict
+    :return: {key: (path, value)}
+    """
+    resources = {}
+    outermost = None
+    for path, val, arn, resource_id, name, _ in database.iter_resource_values(resp):
+        if outermost and (path.startswith(outermost + '.') or path.startswith(outermost + '[')):
+            continue
+        outermost = path
+        key = next(part for part in (arn, resource_id, name) if part is not None)
+        if key in resources:
+            # same key in different places, e.g., a name
+            key = '{} ({})'.format(key, path)
+        resources[key] = (path, val)
+    return resources
+
+def _iter_changes(old, new, path=''):
+    """Compare two values of a resource.
+
+    :rtype: iterator
+    :return: (path, old value, new value) tuples of each difference, with None for a missing value
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(set(old) | set(new)):
+            for change in _iter_changes(old.get(key), new.get(key),
+                                        '{}.{}'.format(path, key) if path else key):
+                yield change
+    elif isinstance(old, list) and isinstance(new, list):
+        for i in xrange(max(len(old), len(new))):
+            for change in _iter_changes(old[i] if i < len(old) else None,
+                                        new[i] if i < len(new) else None,
+                                        '{}[{:d}]'.format(path, i)):
+                yield change
+    elif old != new:
+        yield path, old, new
+
+def _diff_resources(old_resp, new_resp):
+    """
+    :param old_resp: response of the old run, or None
+    :param new_resp: response of the new run, or None
+    :rtype: list
+    :return: changed resources
+    """
+    old_resources = _get_resources(old_resp) if old_resp is not None else {}
+    new_resources = _get_resources(new_resp) if new_resp is not None else {}
+    changes = []
+    for key in sorted(set(old_resources) | set(new_resources)):
+        if key not in old_resources:
+            path, val = new_resources[key]
+            changes.append({'change': ADDED, 'id': key, 'path': path, 'value': val})
+        elif key not in new_resources:
+            path, val = old_resources[key]
+            changes.append({'change': REMOVED, 'id': key, 'path': path, 'value': val})
+        else:
+            (old_path, old_val), (new_path, new_val) = old_resources[key], new_resources[key]
+            if old_val != new_val:
+                changes.append({'change': MODIFIED,
+                                'id': key,
+                                'path': new_path,
+                                'changes': [{'path': path, 'old': old, 'new': new}
+                                            for path, old, new in _iter_changes(old_val, new_val)]})
+    return changes
+
+def diff_results(old_results, new_results):
+    """Compare the results of two runs.
+
+    :param object old_results: source of responses of the old run (see :func:`open_results`)
+    :param object new_results: source of responses of the new run
+    :rtype: dict
+    :return: {"summary": number of responses and resources of each kind of change, "responses":
+        {kind of change: [(svc, region, svc_op), ...]}, "resources": [changed resource, ...]}
+    """
+    old_fingerprints = _fingerprint_all(old_results)
+    new_fingerprints = _fingerprint_all(new_results)
+    responses = {ADDED: [], REMOVED: [], MODIFIED: []}
+    for key in sorted(set(old_fingerprints) | set(new_fingerprints),
+                      key=lambda k: (k[0], k[1] or '', k[2])):
+        if key not in old_fingerprints:
+            responses[ADDED].append(key)
+        elif key not in new_fingerprints:
+            responses[REMOVED].append(key)
+        elif old_fingerprints[key] != new_fingerprints[key]:
+            responses[MODIFIED].append(key)
+
+    resources = []
+    for change in (ADDED, REMOVED, MODIFIED):
+        for key in list(responses[change]):
+            old_resp = old_results.get_response(*key)
+            new_resp = new_results.get_response(*key)
+            if (change == MODIFIED and
+                    store.without_metadata(old_resp) == store.without_metadata(new_resp)):
+                # equal, but fingerprinted differently (see codec.fingerprint)
+                responses[MODIFIED].remove(key)
+                continue
+            service, region, svc_op = key
+            for resource in _diff_resources(old_resp, new_resp):
+                resource.update({'service': service, 'region': region, 'operation': svc_op})
+                resources.append(resource)
+    resources.sort(key=lambda r: (r['service'], r['region'] or '', r['operation'], r['id']))
+    LOGGER.info('%d responses unchanged, %d added, %d removed, %d modified.',
+                len(old_fingerprints) - len(responses[REMOVED]) - len(responses[MODIFIED]),
+                len(responses[ADDED]),
+                len(responses[REMOVED]),
+                len(responses[MODIFIED]))
+    return {
+        'summary': {
+            'responses': dict((change, len(keys)) for change, keys in responses.iteritems()),
+            'resources': dict((change, sum(1 for r in resources if r['change'] == change))
+                              for change in (ADDED, REMOVED, MODIFIED))
+        },
+        'responses': responses,
+        'resources': resources
+    }
+
+def write_json(diff, fp):
+    """Write a diff as JSON.
+
+    :param dict diff: diff from :func:`diff_results`
+    :param file fp: file to write to
+    """
+    fp.write(store.dumps_response(diff))
+    fp.write('\n')
+
+def write_gui_data(diff, fp, profile='diff'):
+    """Write a diff as a GUI data file: each operation with changes has the resources added, removed,
+    and modified, and the old and new values of what was modified.
+
+    :param dict diff: diff from :func:`diff_results`
+    :param file fp: file to write to
+    :param str profile: name of the runs
+    """
+    storage = store.ResultStore(profile)
+    changed = {}  # {(svc, region, svc_op): {kind of change: {id: value}}}
+    for resource in diff['resources']:
+        key = (resource['service'], resource['region'], resource['operation'])
+        if resource['change'] == MODIFIED:
+            val = dict((change['path'], {'Old': change['old'], 'New': change['new']})
+                       for change in resource['changes'])
+        else:
+            val = resource['value']
+        changed.setdefault(key, {}).setdefault(resource['change'].capitalize(), {})[
+            resource['id']] = val
+    for change in (ADDED, REMOVED, MODIFIED):
+        for key in diff['responses'][change]:
+            # changes outside of any resource leave the response without resources to show
+            changed.setdefault(key, {'Response': change.capitalize()})
+    for (service, region, svc_op), resp in changed.iteritems():
+        storage.add_response(service, region, svc_op, resp)
+    storage.generate_data_file(fp)
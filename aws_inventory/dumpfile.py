@@ -0,0 +1,203 @@
+"""Indexed dump files of responses or exceptions, for reading back a few entries without loading all.
+
+A dump file is:
+
+* MAGIC
+* a record for each entry: its length as a 4-byte big-endian integer, then its value encoded with
+  codec.py (JSON, tagging datetimes and binary strings) and compressed with zlib
+* an index: zlib-compressed JSON, {"kind": kind, "entries": [[service, region, svc_op, offset,
+  length], ...]}, where offset and length locate the compressed value of an entry. Responses with the
+  same value, apart from their ResponseMetadata, may share a record. The record then has no
+  ResponseMetadata, and each entry has its own as a sixth element.
+* a footer: the offset and length of the index as 8- and 4-byte big-endian integers, then MAGIC
+
+Nothing in it is pickled, so it can be read safely, and from any language with JSON and zlib.
+"""
+
+import hashlib
+import logging
+import pickle
+import struct
+import zlib
+
+import codec
+
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = 'AWSIDMP1'
+_LENGTH = struct.Struct('>I')
+_FOOTER = struct.Struct('>QI8s')
+
+# kinds of dump
+RESPONSES = 'responses'  # responses, {svc: {region: {svc_op: response}}} as a pickle
+EXCEPTIONS = 'exceptions'  # exceptions, {svc: {svc_op: {region: exception}}} as a pickle
+KINDS = (RESPONSES, EXCEPTIONS)
+
+class DumpError(Exception):
+    """Generic error for reading or writing dump files."""
+    pass
+
+class DumpWriter(object):
+    """Write entries one at a time, then the index when closed."""
+
+    def __init__(self, fp, kind, deduplicate=False):
+        """
+        :param file fp: file to write to, opened in binary mode
+        :param str kind: one of KINDS
+        :param bool deduplicate: whether responses with the same value, apart from their
+            ResponseMetadata, share a record
+        """
+        if kind not in KINDS:
+            raise DumpError('Unknown kind of dump "{}".'.format(kind))
+        self.fp = fp
+        self.kind = kind
+        self._entries = []
+        self._offset = len(MAGIC)
+        self._records = {} if deduplicate else None  # {digest of value: (offset, length)}
+        fp.write(MAGIC)
+
+    def add(self, service, region, svc_op, value):
+        """
+        :param str service: service name
+        :param str region: region name
+        :param str svc_op: service operation name
+        :param value: response or exception
+        """
+        metadata = []
+        if self._records is not None and isinstance(value, dict) and 'ResponseMetadata' in value:
+            metadata = [value['ResponseMetadata']]
+            value = dict((key, val) for key, val in value.iteritems() if key != 'ResponseMetadata')
+        encoded = codec.encode(value)
+        digest = hashlib.sha1(encoded).digest() if self._records is not None else None
+        if digest is not None and digest in self._records:
+            self._entries.append([service, region, svc_op] + list(self._records[digest]) + metadata)
+            return
+        data = zlib.compress(encoded)
+        if digest is not None:
+            self._records[digest] = (self._offset + _LENGTH.size, len(data))
+        self.fp.write(_LENGTH.pack(len(data)))
+        self.fp.write(data)
+        self._entries.append([service, region, svc_op, self._offset + _LENGTH.size, len(data)] +
+                             metadata)
+        self._offset += _LENGTH.size + len(data)
+
+    def close(self):
+        """Write the index and footer. The file itself is left open."""
+        data = zlib.compress(codec.encode({'kind': self.kind, 'entries': self._entries}))
+        self.fp.write(data)
+        self.fp.write(_FOOTER.pack(self._offset, len(data), MAGIC))
+
+class DumpReader(object):
+    """Read entries of a dump file. Only the index is read when opened."""
+
+    def __init__(self, fp):
+        """
+        :param file fp: file to read, opened in binary mode
+        """
+        self.fp = fp
+        fp.seek(0)
+        if fp.read(len(MAGIC)) != MAGIC:
+            raise DumpError('Not an indexed dump file: "{}".'.format(getattr(fp, 'name', fp)))
+        fp.seek(-_FOOTER.size, 2)
+        index_offset, index_length, magic = _FOOTER.unpack(fp.read(_FOOTER.size))
+        if magic != MAGIC:
+            raise DumpError('Truncated dump file: "{}".'.format(getattr(fp, 'name', fp)))
+        index = self._read(index_offset, index_length)
+        self.kind = index['kind']
+        self._entries = [tuple(entry) for entry in index['entries']]
+        self._locations = dict((entry[:3], entry[3:]) for entry in self._entries)
+
+    def _read(self, offset, length, metadata=None):
+        self.fp.seek(offset)
+        value = codec.decode(zlib.decompress(self.fp.read(length)))
+        if metadata is not None:
+            value['ResponseMetadata'] = metadata
+        return value
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._locations
+
+    def keys(self):
+        """
+        :rtype: list
+        :return: (service, region, operation) tuples, in the order they were written
+        """
+        return [entry[:3] for entry in self._entries]
+
+    def get(self, service, region, svc_op):
+        """Read a single entry.
+
+        :param str service: service name
+        :param str region: region name
+        :param str svc_op: service operation name
+        :return: response or exception
+        """
+        try:
+            location = self._locations[(service, region, svc_op)]
+        except KeyError:
+            raise KeyError((service, region, svc_op))
+        return self._read(*location)
+
+    def iter_entries(self, services=None):
+        """Read entries one at a time, in the order they were written.
+
+        :param iterable services: services to read, or None for all of them
+        :rtype: iterator
+        :return: (service, region, operation, value) tuples
+        """
+        services = frozenset(services) if services is not None else None
+        for entry in self._entries:
+            if services is None or entry[0] in services:
+                yield entry[:3] + (self._read(*entry[3:]),)
+
+    def load(self, services=None):
+        """Read entries into the nested dict a pickled dump of the same kind holds.
+
+        :param iterable services: services to read, or None for all of them
+        :rtype: dict
+        """
+        nested = {}
+        for service, region, svc_op, value in self.iter_entries(services):
+            if self.kind == RESPONSES:
+                nested.setdefault(service, {}).setdefault(region, {})[svc_op] = value
+            else:
+                nested.setdefault(service, {}).setdefault(svc_op, {})[region] = value
+        return nested
+
+def iter_nested(nested, kind):
+    """Iterate over the entries of a response or exception store.
+
+    :param dict nested: {svc: {region: {svc_op: response}}} or {svc: {svc_op: {region: exception}}}
+    :param str kind: one of KINDS
+    :rtype: iterator
+    :return: (service, region, operation, value) tuples
+    """
+    for service, svc_store in nested.iteritems():
+        for outer, inner_store in svc_store.iteritems():
+            for inner, value in inner_store.iteritems():
+                if kind == RESPONSES:
+                    yield service, outer, inner, value
+                else:
+                    yield service, inner, outer, value
+
+def convert_pickle(pickle_fp, out_fp, kind):
+    """Convert a pickled dump (e.g., from --dump-format pickle) to an indexed dump. The pickle is loaded
+    whole, so only convert trusted files.
+
+    :param file pickle_fp: pickled dump
+    :param file out_fp: file to write the indexed dump to
+    :param str kind: one of KINDS
+    :rtype: int
+    :return: number of entries
+    """
+    writer = DumpWriter(out_fp, kind)
+    count = 0
+    for service, region, svc_op, value in iter_nested(pickle.load(pickle_fp), kind):
+        writer.add(service, region, svc_op, value)
+        count += 1
+    writer.close()
+    return count
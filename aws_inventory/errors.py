@@ -0,0 +1,66 @@
+"""Classify exceptions from invoking APIs to decide what else to invoke."""
+
+import botocore.exceptions
+
+import config
+
+
+# outcomes of an exception
+SKIP_OPERATION = 'skip_operation'  # the operation will fail in any region. Do not invoke it again.
+SKIP_TARGET = 'skip_target'  # the operation failed in this region only
+RETRY = 'retry'  # transient failure. Try again, within a retry budget.
+# the service is not enabled in this region (e.g., not offered there). Do not invoke anything else of
+#   the service in it. Whether the whole region is disabled is left to the preflight check.
+SKIP_REGION = 'skip_region'
+STOP = 'stop'  # nothing else will succeed (e.g., credentials expired). Stop invoking APIs.
+
+def get_error_code(exc):
+    """
+    :param Exception exc: exception from invoking an API
+    :rtype: str
+    :return: error code of an API error response, or None
+    """
+    if isinstance(exc, botocore.exceptions.ClientError):
+        return exc.response.get('Error', {}).get('Code')
+    return None
+
+def classify(exc):
+    """Classify an exception from invoking an API.
+
+    :param Exception exc: exception from invoking an API
+    :rtype: str
+    :return: outcome
+    """
+    if isinstance(exc, botocore.exceptions.ClientError):
+        code = get_error_code(exc)
+        status = exc.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+        if code in config.EXPIRED_CREDENTIALS_ERROR_CODES:
+            return STOP
+        elif code in config.THROTTLING_ERROR_CODES or code in config.TRANSIENT_ERROR_CODES:
+            return RETRY
+        elif code in config.REGION_DISABLED_ERROR_CODES:
+            return SKIP_REGION
+        elif code in config.AUTH_ERROR_CODES:
+            return SKIP_TARGET
+        elif code in config.PERMANENT_ERROR_CODES:
+            return SKIP_OPERATION
+        elif status >= 500:
+            return RETRY
+        # unknown API errors may well be specific to the region
+        return SKIP_TARGET
+    elif isinstance(exc, (botocore.exceptions.ConnectionError,
+                          botocore.exceptions.HTTPClientError)):
+        # connect and read timeouts, endpoint connection errors, connections closed
+        return RETRY
+    # parameter validation, missing models, and anything unexpected will not get better
+    return SKIP_OPERATION
+
+def get_max_retries(exc):
+    """
+    :param Exception exc: exception from invoking an API
+    :rtype: int
+    :return: number of times a failed call can be retried
+    """
+    if get_error_code(exc) in config.THROTTLING_ERROR_CODES:
+        return config.THROTTLE_MAX_RETRIES
+    return config.TRANSIENT_MAX_RETRIES
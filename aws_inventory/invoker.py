@@ -1,15 +1,29 @@
 """Abstraction for invoking AWS APIs (a.k.a. operations) and handling responses."""
 
+import collections
+import itertools
 import logging
+import os.path
+import sys
+import time
 from Queue import Queue
-from threading import Thread
+from threading import Event, Thread
 
 import botocore
 from opinel.utils.credentials import read_creds
 
+import clients
 import config
+import database
+import errors
+import metrics
+import preflight
 import progress
+import search_index
+import segments
 import store
+import throttle
+import tracing
 
 
 LOGGER = logging.getLogger(__name__)
@@ -17,17 +31,38 @@ LOGGER = logging.getLogger(__name__)
 class ApiInvoker(object):
     """Invoke APIs from GUI."""
 
-    def __init__(self, script_args, svc_descriptors, ops_count):
+    def __init__(self, script_args, svc_descriptors, ops_count, credentials=None, endpoint_url=None):
+        """
+        :param argparse.Namespace script_args: command line arguments
+        :param dict svc_descriptors: operations and regions to invoke for each service
+        :param int ops_count: number of operations to invoke
+        :param dict credentials: AWS credentials, or None to read them as the arguments say
+        :param str endpoint_url: endpoint for all clients instead of the AWS ones (e.g., a test
+            server)
+        """
         self.script_args = script_args
         self.svc_descriptors = svc_descriptors
         self.ops_count = ops_count
         self.progress_bar = None
-        self.store = store.ResultStore(script_args.profile)
+        self.client_config = None
+        self.client_factory = None
+        self.endpoint_url = endpoint_url
+        self.tracer = tracing.Tracer() if script_args.trace else None
+        self._max_page_sizes = {}  # {(svc, svc_op): page size}
+        backend = self._create_store_backend()
+        if backend is None and script_args.stream_pages:
+            LOGGER.warning('Pages are merged in memory without --store-dir, --resume, or '
+                           '--sqlite-db, so --stream-pages only changes the page size.')
+        self.store = store.ResultStore(script_args.profile, backend,
+                                       script_args.keep_response_metadata)
+        self.metrics = None
+        if script_args.metrics_port is not None:
+            self.metrics = metrics.Metrics(self.store.get_stats)
 
         # search for AWS credentials
         # using opinel allows us to use MFA and a CSV file. Otherwise, we could just use
         # botocore.session.get_session({'profile': args.profile, 'region': args.regions[0]})
-        self.credentials = read_creds(
+        self.credentials = credentials or read_creds(
             script_args.profile,
             script_args.csv_credentials,
             script_args.mfa_serial,
@@ -36,152 +71,421 @@ class ApiInvoker(object):
             raise EnvironmentError('Failed to get AWS account credentials.')
         LOGGER.info('Using AWS credential key ID: %s.', self.credentials['AccessKeyId'])
 
+        if not (script_args.dry_run or script_args.no_region_preflight):
+            self._preflight_regions()
+
+    def _preflight_regions(self):
+        """Remove regions which are not enabled for the account, or cannot be reached, from the
+        operations to invoke."""
+        regions = set()
+        for descriptor in self.svc_descriptors.values():
+            regions.update(region for region in descriptor['regions'] if region is not None)
+        if not regions:
+            return
+        region_states = preflight.get_region_states(regions, self.credentials)
+        self.ops_count = preflight.prune_regions(self.svc_descriptors, region_states)
+        LOGGER.debug('Total operations to invoke after region preflight: %d.', self.ops_count)
+
+    def _create_store_backend(self):
+        """Create the backend for storing responses.
+
+        :rtype: object
+        :return: backend, or None for the default in-memory backend
+        """
+        if self.script_args.resume:
+            journal_dir = self.script_args.resume
+            if not os.path.exists(os.path.join(journal_dir, segments.INDEX_FILENAME)):
+                raise EnvironmentError('No journal to resume in "{}".'.format(journal_dir))
+            LOGGER.info('Resuming from journal in directory "%s".', journal_dir)
+            return segments.SegmentBackend(journal_dir)
+
+        if self.script_args.sqlite_db:
+            if os.path.exists(self.script_args.sqlite_db):
+                raise EnvironmentError('Database "{}" already exists.'.format(
+                    self.script_args.sqlite_db))
+            LOGGER.info('Storing responses in database "%s".', self.script_args.sqlite_db)
+            return database.SqliteBackend(self.script_args.sqlite_db)
+
+        store_dir = self.script_args.store_dir
+        if not store_dir:
+            return None
+        if os.path.exists(os.path.join(store_dir, segments.INDEX_FILENAME)):
+            raise EnvironmentError(
+                'Store directory "{}" already holds results. Use --resume to continue that '
+                'run.'.format(store_dir)
+            )
+        LOGGER.info('Storing responses in directory "%s".', store_dir)
+        return segments.SegmentBackend(store_dir)
+
     def start(self):
-        """Start the invoker with associated GUI. Wait for GUI to stop."""
-        self.progress_bar = progress.GuiProgressBar(
-            'AWS Inventory',
-            self.ops_count,
-            self._probe_services)
-        self.progress_bar.mainloop()
+        """Start the invoker with the selected progress reporter. Wait for the work to finish, or for
+        the GUI to close."""
+        self.progress_bar = progress.create_reporter(self.script_args.progress,
+                                                     'AWS Inventory',
+                                                     self.ops_count)
+        if self.metrics:
+            self.metrics.serve(self.script_args.metrics_port)
+        self.progress_bar.run(self._probe_services)
 
     def _probe_services(self):
         try:
             # create a config for all clients to share
-            client_config = botocore.config.Config(
+            # a single client may have a call in flight from every worker thread
+            max_pool_connections = max(config.CLIENT_MAX_POOL_CONNECTIONS,
+                                       self.script_args.max_threads)
+            self.client_config = botocore.config.Config(
                 connect_timeout=config.CLIENT_CONNECT_TIMEOUT,
-                max_pool_connections=config.CLIENT_MAX_POOL_CONNECTIONS,
-                read_timeout=config.CLIENT_READ_TIMEOUT
+                max_pool_connections=max_pool_connections,
+                read_timeout=config.CLIENT_READ_TIMEOUT,
+                retries={'max_attempts': config.CLIENT_MAX_RETRIES}
             )
+            self.client_factory = clients.ClientFactory(self.credentials,
+                                                        self.client_config,
+                                                        self.endpoint_url,
+                                                        self.script_args.max_threads)
 
-            session = botocore.session.get_session()
+            # one queue of work items across all services and regions so a slow API in one place
+            # does not hold up the rest
+            completed = self.store.get_completed_targets()
+            svc_targets = []
             for svc_name in self.svc_descriptors:
-                operations = self.svc_descriptors[svc_name]['ops']
-                regions = self.svc_descriptors[svc_name]['regions']
-
-                # call each API across each region
-                api_version = session.get_config_variable('api_versions').get(svc_name, None)
-                params = {'svc_name': svc_name,
-                          'dry_run': self.script_args.dry_run,
-                          'store': self.store}
-                for region in regions:
-                    self.progress_bar.update_svc_text(svc_name, region)
-                    try:
-                        client = session.create_client(
-                            svc_name,
-                            region_name=region,
-                            api_version=api_version,
-                            aws_access_key_id=self.credentials['AccessKeyId'],
-                            aws_secret_access_key=self.credentials['SecretAccessKey'],
-                            aws_session_token=self.credentials['SessionToken'],
-                            config=client_config
-                        )
-                    except botocore.exceptions.NoRegionError:
-                        LOGGER.warning('[%s][%s] Issue in region detection. Using default region.',
-                                       config.DEFAULT_REGION,
-                                       svc_name)
-                        client = session.create_client(
-                            svc_name,
-                            region_name=config.DEFAULT_REGION,
-                            api_version=api_version,
-                            aws_access_key_id=self.credentials['AccessKeyId'],
-                            aws_secret_access_key=self.credentials['SecretAccessKey'],
-                            aws_session_token=self.credentials['SessionToken'],
-                            config=client_config
-                        )
-                    params.update({'region': region, 'client': client})
-                    # schedule worker threads to invoke all APIs. Wait until all APIs have been
-                    # invoked.
-                    thread_work(
-                        operations,
-                        self.svc_worker,
-                        params)
-                    self.progress_bar.update_progress(len(operations))
+                svc_targets.append([])
+                for region in self.svc_descriptors[svc_name]['regions']:
+                    for svc_op in self.svc_descriptors[svc_name]['ops']:
+                        if (svc_name, region, svc_op) not in completed:
+                            svc_targets[-1].append((svc_name, region, svc_op))
+            # interleave services so calls in flight are spread over many endpoints rather than
+            # waiting on the concurrency limit of one
+            targets = [target
+                       for targets in itertools.izip_longest(*svc_targets)
+                       for target in targets
+                       if target is not None]
+            self.progress_bar.set_target_counts(
+                collections.Counter(target[:2] for target in targets)
+            )
+            if completed:
+                LOGGER.info('Skipping %d operation(s) completed by an earlier run.',
+                            self.ops_count - len(targets))
+                self.progress_bar.update_progress(self.ops_count - len(targets))
+
+            if not self.script_args.dry_run:
+                # clients for the first targets are created first
+                client_keys = []
+                client_keys_seen = set()
+                for target in targets:
+                    if target[:2] not in client_keys_seen:
+                        client_keys_seen.add(target[:2])
+                        client_keys.append(target[:2])
+                self.client_factory.warm_up(client_keys)
+
+            params = {'dry_run': self.script_args.dry_run,
+                      'store': self.store,
+                      'get_client': self.client_factory.get_client,
+                      'get_max_page_size': self._get_max_page_size,
+                      'stream_pages': self.script_args.stream_pages,
+                      'rate_controller': throttle.RateController(max_limit=min(
+                          config.THROTTLE_MAX_CONCURRENCY, self.script_args.max_threads)),
+                      'progress_bar': self.progress_bar,
+                      'tracer': self._get_tracer(),
+                      'stop': Event()}
+            if self.metrics:
+                self.metrics.target_count = len(targets)
+                self.metrics.worker_count = min(self.script_args.max_threads, len(targets))
+            params['tracer'].start()
+            thread_work(targets, self.svc_worker, params, self.script_args.max_threads)
+            if self.tracer:
+                # also when stopped early, since the trace may show why
+                self.tracer.write(self.script_args.gui_data_file)
+            if params['stop'].is_set():
+                self._write_partial_results()
+                raise progress.LifetimeError('Stopped before invoking all APIs.')
             self.progress_bar.finish_work()
             self.write_results()
         except progress.LifetimeError as e:
             LOGGER.debug(e)
+        finally:
+            if self.metrics:
+                self.metrics.shutdown()
+            if self.client_factory:
+                self.client_factory.close()
+            self.store.close()
 
-    def write_results(self, response_dump_fp=None, exception_dump_fp=None, gui_data_fp=None):
+    def _write_partial_results(self):
+        """Write the results of a run which stopped early when nothing else keeps them. A store
+        directory or database already holds them, and the run can be resumed instead.
+        """
+        if isinstance(self.store.backend, store.MemoryBackend):
+            LOGGER.warning('Stopped before invoking all APIs. Writing the results so far.')
+            self.write_results()
+        else:
+            LOGGER.warning('Stopped before invoking all APIs. The results so far are stored in '
+                           '"%s".', self.script_args.store_dir or self.script_args.resume or
+                           self.script_args.sqlite_db)
+
+    def _get_tracer(self):
+        """Get the tracer to call while invoking: the call trace, live metrics, both, or neither.
+
+        :rtype: tracing.NullTracer
+        :return: tracer
+        """
+        tracers = [tracer for tracer in (self.tracer, self.metrics) if tracer]
+        if not tracers:
+            return tracing.NullTracer()
+        elif len(tracers) == 1:
+            return tracers[0]
+        return tracing.TracerGroup(tracers)
+
+    def _get_max_page_size(self, svc_name, svc_op):
+        """Get the largest page size a paginated operation allows.
+
+        :param str svc_name: service name
+        :param str svc_op: service operation name
+        :rtype: int
+        :return: maximum page size, or None when the service model does not specify one
+        """
+        key = (svc_name, svc_op)
+        try:
+            return self._max_page_sizes[key]
+        except KeyError:
+            pass
+        page_size = None
+        session = self.client_factory.get_session()
+        api_version = self.client_factory.get_api_version(svc_name)
+        try:
+            paginator_config = session.get_paginator_model(
+                svc_name,
+                api_version=api_version
+            ).get_paginator(svc_op)
+            limit_key = paginator_config.get('limit_key')
+            if limit_key:
+                service_model = session.get_service_model(svc_name, api_version=api_version)
+                input_shape = service_model.operation_model(svc_op).input_shape
+                page_size = input_shape.members[limit_key].metadata.get('max')
+        except (botocore.exceptions.DataNotFoundError, KeyError, ValueError):
+            pass
+        self._max_page_sizes[key] = page_size
+        return page_size
+
+    def write_results(self, response_dump_fp=None, exception_dump_fp=None, gui_data_fp=None,
+                      search_index_fp=None):
         """Output the results, if not a dry run.
 
         :param file response_dump_fp: file for responses
         :param file exception_dump_fp: file for exceptions
         :param file gui_data_fp: file for GUI data
+        :param file search_index_fp: file for the search index of the GUI data, written only with
+            --search-index. If gui_data_fp is given without it, no search index is written.
         """
         if not self.script_args.dry_run:
+            if self.script_args.dump_format == 'indexed':
+                dump_response_store = self.store.dump_indexed_response_store
+                dump_exception_store = self.store.dump_indexed_exception_store
+            else:
+                dump_response_store = self.store.dump_response_store
+                dump_exception_store = self.store.dump_exception_store
+
             if response_dump_fp:
-                self.store.dump_response_store(response_dump_fp)
+                dump_response_store(response_dump_fp)
             elif self.script_args.responses_dump:
                 with open(self.script_args.responses_dump, 'wb') as out_fp:
-                    self.store.dump_response_store(out_fp)
+                    dump_response_store(out_fp)
 
             if exception_dump_fp:
-                self.store.dump_exception_store(exception_dump_fp)
+                dump_exception_store(exception_dump_fp)
             elif self.script_args.exceptions_dump:
                 with open(self.script_args.exceptions_dump, 'wb') as out_fp:
-                    self.store.dump_exception_store(out_fp)
+                    dump_exception_store(out_fp)
 
             if self.script_args.verbose:
-                print self.store.get_response_store()
+                self.store.write_response_store(sys.stdout)
+                print
 
+            if self.script_args.gui_data_format == 'chunked':
+                generate_data_file = self.store.generate_chunked_data_file
+            else:
+                generate_data_file = self.store.generate_data_file
+            index = None
+            if (search_index_fp or not gui_data_fp) and self.script_args.search_index:
+                index = search_index.SearchIndex()
             if gui_data_fp:
-                self.store.generate_data_file(gui_data_fp)
+                generate_data_file(gui_data_fp, index)
             else:
-                with open(self.script_args.gui_data_file, 'w') as out_fp:
-                    self.store.generate_data_file(out_fp)
+                with open(self.script_args.gui_data_file, 'wb') as out_fp:
+                    generate_data_file(out_fp, index)
+
+            if index is not None:
+                if search_index_fp:
+                    index.write(search_index_fp)
+                else:
+                    index_path = (os.path.splitext(self.script_args.gui_data_file)[0] +
+                                  search_index.SEARCH_INDEX_FILE_SUFFIX)
+                    with open(index_path, 'wb') as out_fp:
+                        index.write(out_fp)
+                    LOGGER.info('Wrote search index of %d nodes to "%s".', len(index), index_path)
 
     @staticmethod
     def svc_worker(que, params):
-        """Worker thread for a service in a region.
+        """Worker thread for invoking APIs. Each work item is an operation of a service in a region.
 
-        :param Queue que: APIs to invoke
+        :param Queue que: (service, region, operation) tuples to invoke
         :param dict params: parameters to use for invoking API
         """
-        svc_name = params['svc_name']
-        region = params['region']
-        storage = params['store']
         while True:
+            target = que.get()
             try:
-                svc_op = que.get()
-                if svc_op is None:
+                if target is None:
                     break
-                if storage.has_exceptions(svc_name, svc_op):
-                    continue
-
-                # this is the way botocore does it. See botocore/__init__.py
-                py_op = botocore.xform_name(svc_op)
-                LOGGER.debug('[%s][%s] Invoking API "%s". Python name "%s".',
-                             region,
-                             svc_name,
-                             svc_op,
-                             py_op)
-
-                if not params['dry_run']:
-                    if params['client'].can_paginate(py_op):
-                        paginator = params['client'].get_paginator(py_op)
-                        response = paginator.paginate().build_full_result()
-                    else:
-                        response = getattr(params['client'], py_op)()
-                    storage.add_response(svc_name, region, svc_op, response)
-            except Exception as e:
-                storage.add_exception(svc_name, region, svc_op, e)
-                LOGGER.exception(
-                    'Unknown error while invoking API for service "%s" in region "%s".',
-                    svc_name,
-                    region)
+                ApiInvoker.invoke_target(target, params)
             finally:
                 que.task_done()
 
+    @staticmethod
+    def invoke_target(target, params):
+        """Invoke a single API and store its response or exception.
+
+        :param tuple target: (service, region, operation) to invoke
+        :param dict params: parameters to use for invoking API
+        """
+        if params['stop'].is_set():
+            return
+        storage = params['store']
+        progress_bar = params['progress_bar']
+        tracer = params['tracer']
+        svc_name, region, svc_op = target
+        outcome = tracing.OK
+        try:
+            progress_bar.start_target(svc_name, region)
+            tracer.begin(target)
+            if storage.is_skipped(svc_name, region, svc_op):
+                outcome = tracing.SKIPPED
+                return
+
+            # this is the way botocore does it. See botocore/__init__.py
+            py_op = botocore.xform_name(svc_op)
+            LOGGER.debug('[%s][%s] Invoking API "%s". Python name "%s".',
+                         region,
+                         svc_name,
+                         svc_op,
+                         py_op)
+
+            if not params['dry_run']:
+                client_start = time.time()
+                client = params['get_client'](svc_name, region)
+                tracer.client_created(time.time() - client_start)
+                tracer.instrument_client(client)
+                rate_controller = params['rate_controller']
+                attempt = 0
+                while True:
+                    try:
+                        with rate_controller.slot(svc_name, region):
+                            ApiInvoker.call_api(client, py_op, target, params)
+                        rate_controller.on_success(svc_name, region)
+                        break
+                    except Exception as e:
+                        if errors.classify(e) != errors.RETRY:
+                            raise
+                        throttled = throttle.is_throttling_error(e)
+                        if throttled:
+                            rate_controller.on_throttle(svc_name, region)
+                            tracer.throttled()
+                        if attempt >= errors.get_max_retries(e):
+                            raise
+                    if params['stream_pages']:
+                        storage.remove_response(svc_name, region, svc_op)
+                    backoff = throttle.get_backoff(attempt)
+                    attempt += 1
+                    tracer.retried()
+                    LOGGER.debug('[%s][%s] API "%s" %s. Retry %d in %.2f seconds.',
+                                 region,
+                                 svc_name,
+                                 svc_op,
+                                 'throttled' if throttled else 'failed',
+                                 attempt,
+                                 backoff)
+                    time.sleep(backoff)
+        except Exception as e:
+            if params['stream_pages']:
+                storage.remove_response(svc_name, region, svc_op)
+            outcome = errors.classify(e)
+            if outcome == errors.STOP:
+                # every remaining call would fail the same way, so stop rather than record them
+                if not params['stop'].is_set():
+                    LOGGER.error('AWS credentials expired. Stopping. Resume the scan with new '
+                                 'credentials by using --resume with the store directory.')
+                    params['stop'].set()
+                return
+            if outcome == errors.RETRY:
+                # out of retries. Other regions may well be fine.
+                outcome = errors.SKIP_TARGET
+            storage.add_exception(svc_name, region, svc_op, e, outcome)
+            if outcome == errors.SKIP_REGION:
+                LOGGER.warning('Service "%s" is not enabled in region "%s". Skipping its '
+                               'remaining APIs there.', svc_name, region)
+            LOGGER.exception(
+                'Unknown error while invoking API for service "%s" in region "%s".',
+                svc_name,
+                region)
+        finally:
+            tracer.end(outcome)
+            try:
+                progress_bar.finish_target(svc_name, region)
+            except progress.LifetimeError:
+                params['stop'].set()
+
+    @staticmethod
+    def call_api(client, py_op, target, params):
+        """Call an API and store its response.
+
+        :param botocore.client.BaseClient client: client for the service in the region
+        :param str py_op: Python name of the operation
+        :param tuple target: (service, region, operation) to invoke
+        :param dict params: parameters to use for invoking API
+        """
+        svc_name, region, svc_op = target
+        storage = params['store']
+        if client.can_paginate(py_op):
+            paginator = client.get_paginator(py_op)
+            if params['stream_pages']:
+                ApiInvoker.stream_pages(paginator, target, params)
+            else:
+                response = paginator.paginate().build_full_result()
+                storage.add_response(svc_name, region, svc_op, response)
+        else:
+            response = getattr(client, py_op)()
+            storage.add_response(svc_name, region, svc_op, response)
+
+    @staticmethod
+    def stream_pages(paginator, target, params):
+        """Store each page of a paginated response as soon as it arrives instead of building the
+        full result first. Pages are requested with the largest page size the operation allows.
+
+        :param botocore.paginate.Paginator paginator: paginator for the operation
+        :param tuple target: (service, region, operation) to invoke
+        :param dict params: parameters to use for invoking API
+        """
+        svc_name, region, svc_op = target
+        storage = params['store']
+        pagination_config = {}
+        page_size = params['get_max_page_size'](svc_name, svc_op)
+        if page_size:
+            pagination_config['PageSize'] = page_size
+        page_iterator = paginator.paginate(PaginationConfig=pagination_config)
+        result_keys = [result_key.expression for result_key in page_iterator.result_keys or []]
+        for page in page_iterator:
+            storage.add_response_page(svc_name, region, svc_op, page, result_keys)
+        storage.finish_response_pages(svc_name, region, svc_op, page_iterator.non_aggregate_part)
+
 #XXX: borrowed from opinel because their threading module is failing to load. Pretty much the example in the Queue docs
-def thread_work(targets, function, params=None):
+def thread_work(targets, function, params=None, max_threads=config.MAX_THREADS):
     """Thread worker creator.
 
     :param list targets: changing parameters
     :param function function: callback function
     :param dict params: static parameters
+    :param int max_threads: maximum number of worker threads
     """
     que = Queue(maxsize=0)
-    thread_count = min(config.MAX_THREADS, len(targets))
+    thread_count = min(max_threads, len(targets))
     if thread_count > 0:
         for _ in range(thread_count):
             worker = Thread(target=function, args=(que, params))
@@ -0,0 +1,276 @@
+"""Serve live metrics of a scan for Prometheus (or anything reading its text format) to scrape.
+
+Metrics are collected through the same hooks as the call trace (see tracing.py). Every worker thread
+counts into its own counters, so invoking APIs never waits on a lock. A scrape sums the counters of all
+threads and reads the store's size.
+"""
+
+import BaseHTTPServer
+import bisect
+import collections
+import logging
+import SocketServer
+import threading
+import time
+
+import config
+import tracing
+
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# registered once per client
+_HANDLER_ID = 'aws_inventory-metrics'
+
+GLOBAL_REGION_LABEL = 'global'
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in labels) + '}'
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class _ThreadCounters(object):
+    """Counters of one worker thread. Only that thread writes them."""
+
+    __slots__ = ('counts', 'busy', 'target', 'request_start')
+
+    def __init__(self):
+        self.counts = collections.defaultdict(int)  # {(metric, labels...): value}
+        self.busy = False
+        self.target = None  # (service, region) being invoked
+        self.request_start = None
+
+class Metrics(tracing.NullTracer):
+    """Count calls, latencies, and bytes per service and region."""
+
+    def __init__(self, get_store_stats=None, buckets=config.METRICS_LATENCY_BUCKETS):
+        """
+        :param function get_store_stats: gets the store's size. See ResultStore.get_stats
+        :param tuple buckets: upper bounds, in seconds, of the request latency histogram buckets
+        """
+        self.get_store_stats = get_store_stats
+        self.buckets = buckets
+        self.worker_count = 0
+        self.target_count = 0
+        self._local = threading.local()
+        self._threads = []  # [_ThreadCounters]
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _counters(self):
+        counters = getattr(self._local, 'counters', None)
+        if counters is None:
+            counters = self._local.counters = _ThreadCounters()
+            # once per thread
+            with self._lock:
+                self._threads.append(counters)
+        return counters
+
+    ## hooks called while invoking. See tracing.NullTracer ##
+
+    def begin(self, target):
+        counters = self._counters()
+        counters.busy = True
+        counters.target = (target[0], target[1] or GLOBAL_REGION_LABEL)
+
+    def instrument_client(self, client):
+        events = client.meta.events
+        events.register_first('before-call.*.*',
+                              self._before_call,
+                              unique_id=_HANDLER_ID + '-before')
+        events.register('after-call.*.*', self._after_call, unique_id=_HANDLER_ID + '-after')
+        events.register('after-call-error.*.*',
+                        self._after_call_error,
+                        unique_id=_HANDLER_ID + '-error')
+
+    def _before_call(self, **kwargs):
+        self._counters().request_start = time.time()
+
+    def _observe_request(self, counters):
+        if counters.request_start is None or counters.target is None:
+            return
+        seconds = time.time() - counters.request_start
+        counters.request_start = None
+        service = counters.target[0]
+        counters.counts[('latency_bucket', service, bisect.bisect_left(self.buckets, seconds))] += 1
+        counters.counts[('latency_sum', service)] += seconds
+
+    def _after_call(self, http_response=None, **kwargs):
+        counters = self._counters()
+        self._observe_request(counters)
+        if counters.target is not None:
+            try:
+                counters.counts[('received_bytes',) + counters.target] += \
+                    len(http_response.content or '')
+            except Exception:
+                pass
+
+    def _after_call_error(self, **kwargs):
+        self._observe_request(self._counters())
+
+    def retried(self):
+        counters = self._counters()
+        counters.counts[('retried',) + counters.target] += 1
+
+    def throttled(self):
+        counters = self._counters()
+        counters.counts[('throttled',) + counters.target] += 1
+
+    def end(self, outcome):
+        counters = self._counters()
+        if outcome == tracing.OK:
+            counters.counts[('completed',) + counters.target] += 1
+        elif outcome != tracing.SKIPPED:
+            counters.counts[('failed',) + counters.target] += 1
+        counters.busy = False
+        counters.target = None
+
+    ## exposition ##
+
+    def _sum_counts(self):
+        totals = collections.defaultdict(int)
+        busy = 0
+        for counters in list(self._threads):
+            # items() copies the dict in one step, so a thread adding a key cannot break iterating
+            for key, value in counters.counts.items():
+                totals[key] += value
+            busy += counters.busy
+        return totals, busy
+
+    def render(self):
+        """Render the metrics in the Prometheus text format.
+
+        :rtype: str
+        :return: metrics
+        """
+        totals, busy = self._sum_counts()
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            for sample_name, labels, value in samples:
+                lines.append('{}{} {}'.format(sample_name, _format_labels(labels), _format_value(value)))
+
+        def by_service_region(kind, name):
+            return sorted((name, (('service', key[1]), ('region', key[2])), value)
+                          for key, value in totals.items() if key[0] == kind)
+
+        add_metric('aws_inventory_calls_completed_total', 'counter',
+                   'Operations invoked successfully.',
+                   by_service_region('completed', 'aws_inventory_calls_completed_total'))
+        add_metric('aws_inventory_calls_failed_total', 'counter',
+                   'Operations which failed after any retries.',
+                   by_service_region('failed', 'aws_inventory_calls_failed_total'))
+        add_metric('aws_inventory_calls_throttled_total', 'counter',
+                   'API calls which were throttled.',
+                   by_service_region('throttled', 'aws_inventory_calls_throttled_total'))
+        add_metric('aws_inventory_calls_retried_total', 'counter',
+                   'API calls which were retried.',
+                   by_service_region('retried', 'aws_inventory_calls_retried_total'))
+        add_metric('aws_inventory_received_bytes_total', 'counter',
+                   'Bytes of API response bodies received.',
+                   by_service_region('received_bytes', 'aws_inventory_received_bytes_total'))
+
+        # histogram buckets are cumulative
+        samples = []
+        services = sorted(set(key[1] for key in totals if key[0] == 'latency_sum'))
+        for service in services:
+            cumulative = 0
+            for i, upper_bound in enumerate(self.buckets + (float('inf'),)):
+                cumulative += totals.get(('latency_bucket', service, i), 0)
+                samples.append(('aws_inventory_request_duration_seconds_bucket',
+                                (('service', service),
+                                 ('le', '+Inf' if i == len(self.buckets) else repr(upper_bound))),
+                                cumulative))
+            samples.append(('aws_inventory_request_duration_seconds_sum',
+                            (('service', service),),
+                            totals[('latency_sum', service)]))
+            samples.append(('aws_inventory_request_duration_seconds_count',
+                            (('service', service),),
+                            cumulative))
+        add_metric('aws_inventory_request_duration_seconds', 'histogram',
+                   'Latency of API requests, including each page.',
+                   samples)
+
+        add_metric('aws_inventory_targets', 'gauge',
+                   'Operations to invoke across services and regions.',
+                   [('aws_inventory_targets', (), self.target_count)])
+        add_metric('aws_inventory_workers', 'gauge',
+                   'Workers invoking APIs.',
+                   [('aws_inventory_workers', (), self.worker_count)])
+        add_metric('aws_inventory_workers_busy', 'gauge',
+                   'Workers in the middle of invoking an API.',
+                   [('aws_inventory_workers_busy', (), busy)])
+        add_metric('aws_inventory_worker_utilization', 'gauge',
+                   'Fraction of workers busy.',
+                   [('aws_inventory_worker_utilization',
+                     (),
+                     float(busy) / self.worker_count if self.worker_count else 0.0)])
+
+        if self.get_store_stats:
+            store_stats = self.get_store_stats()
+            add_metric('aws_inventory_store_responses', 'gauge',
+                       'Responses held by the result store.',
+                       [('aws_inventory_store_responses', (), store_stats['responses'])])
+            # in memory there are no files to measure. See aws_inventory_received_bytes_total
+            if store_stats['bytes'] is not None:
+                add_metric('aws_inventory_store_bytes', 'gauge',
+                           'Size on disk of the result store.',
+                           [('aws_inventory_store_bytes',
+                             (('backend', store_stats['backend']),),
+                             store_stats['bytes'])])
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, address=config.METRICS_ADDRESS):
+        """Serve metrics over HTTP from a background thread.
+
+        :param int port: port to listen on, or 0 for any free port
+        :param str address: address to listen on
+        :rtype: int
+        :return: port listened on
+        """
+        self._server = _MetricsServer((address, port), _MetricsHandler)
+        self._server.metrics = self
+        server_thread = threading.Thread(target=self._server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        port = self._server.server_address[1]
+        LOGGER.info('Serving metrics on http://%s:%d/metrics.', address, port)
+        return port
+
+    def shutdown(self):
+        """Stop serving metrics."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+class _MetricsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOGGER.debug('Metrics request from %s: %s', self.client_address[0], format % args)
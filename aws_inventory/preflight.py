@@ -0,0 +1,203 @@
+"""Find the regions enabled for an account before invoking APIs in them.
+
+Regions which are not enabled (e.g., opt-in regions) or cannot be reached would make every operation
+in them fail slowly, through connect timeouts and retries. Instead, one cheap call per region is made
+up front, in parallel, and the result is cached for the credentials for a while.
+
+Since STS answers with the same error codes for a disabled region and for invalid credentials, the
+credentials are first checked against the global STS endpoint, which is always enabled.
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+import botocore.config
+import botocore.exceptions
+import botocore.session
+
+import config
+import errors
+
+
+LOGGER = logging.getLogger(__name__)
+
+# region states
+ENABLED = 'enabled'
+DISABLED = 'disabled'  # not enabled for the account
+UNREACHABLE = 'unreachable'  # no network connection to the region's endpoints
+
+def _create_sts_client(region, credentials, regional=True):
+    session = botocore.session.get_session()
+    # by default, STS in the older regions goes to the global endpoint, which says nothing about the
+    # region
+    session.set_config_variable('sts_regional_endpoints', 'regional' if regional else 'legacy')
+    return session.create_client(
+        'sts',
+        region_name=region,
+        aws_access_key_id=credentials['AccessKeyId'],
+        aws_secret_access_key=credentials['SecretAccessKey'],
+        aws_session_token=credentials['SessionToken'],
+        config=botocore.config.Config(
+            connect_timeout=config.REGION_PREFLIGHT_CONNECT_TIMEOUT,
+            read_timeout=config.REGION_PREFLIGHT_READ_TIMEOUT,
+            retries={'max_attempts': 1}
+        )
+    )
+
+def check_credentials(credentials):
+    """Check the credentials are valid by getting the caller identity from the global STS endpoint.
+
+    :param dict credentials: AWS credentials
+    :rtype: bool
+    :return: False if the credentials were rejected. True otherwise, including when it could not be
+        told (e.g., no network connection).
+    """
+    client = _create_sts_client(config.REGION_PREFLIGHT_CREDENTIALS_REGION, credentials, regional=False)
+    try:
+        client.get_caller_identity()
+    except (botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError) as e:
+        LOGGER.debug('Unable to check the credentials: %s', e)
+    except botocore.exceptions.ClientError as e:
+        if errors.classify(e) == errors.SKIP_REGION:
+            LOGGER.debug('Credentials were rejected: %s', e)
+            return False
+        LOGGER.debug('Unexpected error checking the credentials: %s', e)
+    return True
+
+def probe_region(region, credentials):
+    """Check whether a region is enabled for the account by getting the caller identity from the
+    region's STS endpoint. The credentials must be valid for the result to mean anything.
+
+    :param str region: region name
+    :param dict credentials: AWS credentials
+    :rtype: str
+    :return: region state
+    """
+    client = _create_sts_client(region, credentials)
+    try:
+        client.get_caller_identity()
+    except (botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError) as e:
+        LOGGER.debug('[%s] Region is unreachable: %s', region, e)
+        return UNREACHABLE
+    except botocore.exceptions.ClientError as e:
+        if errors.classify(e) == errors.SKIP_REGION:
+            LOGGER.debug('[%s] Region is not enabled: %s', region, e)
+            return DISABLED
+        # anything else (e.g., throttling) does not show the region is unusable
+        LOGGER.debug('[%s] Unexpected error probing region: %s', region, e)
+    return ENABLED
+
+def get_cache_key(credentials):
+    """Key identifying the account and credentials. The secret key is not used so that nothing about
+    it ends up on disk.
+
+    :param dict credentials: AWS credentials
+    :rtype: str
+    :return: hex digest
+    """
+    return hashlib.sha1(credentials['AccessKeyId']).hexdigest()
+
+def _load_cache(cache_file):
+    try:
+        with open(cache_file, 'rb') as in_fp:
+            return json.load(in_fp)
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            LOGGER.warning('Unable to read region cache "%s": %s', cache_file, e)
+    except ValueError as e:
+        LOGGER.warning('Ignoring corrupt region cache "%s": %s', cache_file, e)
+    return {}
+
+def _save_cache(cache_dir, cache_file, region_states):
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_file = '{}.{:d}.tmp'.format(cache_file, os.getpid())
+        with open(tmp_file, 'wb') as out_fp:
+            json.dump(region_states, out_fp, indent=2, sort_keys=True)
+        if os.name == 'nt' and os.path.exists(cache_file):
+            os.remove(cache_file)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError) as e:
+        LOGGER.warning('Unable to write region cache in "%s": %s', cache_dir, e)
+
+def get_region_states(regions, credentials, cache_dir=config.CACHE_DIR, ttl=config.REGION_PREFLIGHT_TTL):
+    """Get the state of regions for the account. Regions missing from the cache, or whose cached state
+    is older than the TTL, are probed in parallel. If the credentials are rejected, no region is
+    probed and the states are unknown.
+
+    :param iterable regions: region names
+    :param dict credentials: AWS credentials
+    :param str cache_dir: directory of the cache, or None to disable the cache
+    :param int ttl: number of seconds a cached state is valid
+    :rtype: dict
+    :return: {region: state}. Regions whose state is unknown are missing.
+    """
+    cache_file = None
+    cached = {}
+    if cache_dir:
+        cache_file = os.path.join(
+            cache_dir,
+            config.REGION_PREFLIGHT_CACHE_FILENAME_TEMPLATE.substitute(key=get_cache_key(credentials))
+        )
+        cached = _load_cache(cache_file)
+
+    now = time.time()
+    region_states = {}
+    to_probe = []
+    for region in sorted(regions):
+        entry = cached.get(region)
+        # unreachable regions are always probed again since the network may have changed
+        if entry and entry['state'] != UNREACHABLE and now - entry['checked'] < ttl:
+            region_states[region] = entry['state']
+        else:
+            to_probe.append(region)
+
+    if to_probe:
+        if not check_credentials(credentials):
+            # every region would look disabled
+            LOGGER.error('The credentials were rejected by STS. Not checking which regions are '
+                         'enabled.')
+            return region_states
+        LOGGER.info('Checking %d region(s) are enabled for the account.', len(to_probe))
+        pool = ThreadPool(min(len(to_probe), config.REGION_PREFLIGHT_MAX_THREADS))
+        try:
+            states = pool.map(lambda region: probe_region(region, credentials), to_probe)
+        finally:
+            pool.close()
+            pool.join()
+        for region, state in zip(to_probe, states):
+            region_states[region] = state
+            cached[region] = {'state': state, 'checked': now}
+        if all(state == DISABLED for state in states):
+            # not plausible since some regions cannot be disabled. More likely, the credentials were
+            # revoked or expired in the meantime, so the states are not cached.
+            LOGGER.warning('Every region checked appears disabled. Not caching their states.')
+        elif cache_file:
+            _save_cache(cache_dir, cache_file, cached)
+    return region_states
+
+def prune_regions(svc_descriptors, region_states):
+    """Remove regions which are not enabled from the service descriptors. Global services are kept.
+
+    :param dict svc_descriptors: dict describing operations from a service and available regions
+    :param dict region_states: {region: state}
+    :rtype: int
+    :return: number of operations to invoke after pruning
+    """
+    skipped = sorted(region for region, state in region_states.items() if state != ENABLED)
+    for region in skipped:
+        LOGGER.warning('[%s] Skipping region. It is %s.', region, region_states[region])
+
+    ops_count = 0
+    for svc_name, descriptor in svc_descriptors.items():
+        if None not in descriptor['regions']:
+            descriptor['regions'] = frozenset(region for region in descriptor['regions']
+                                              if region_states.get(region, ENABLED) == ENABLED)
+        ops_count += len(descriptor['ops']) * len(descriptor['regions'])
+    return ops_count
@@ -1,112 +1,242 @@
-"""Small GUI for displaying resource discovery progress to the user."""
+"""Report resource discovery progress to the user.
+
+A progress reporter counts targets (an operation of a service in a region) as workers start and finish
+them, and runs the work. The reporters here need no GUI, so a scan can run unattended. The Tk GUI is
+in progress_gui.py and only imported when requested.
+"""
 
 import collections
+import datetime
+import logging
+import sys
 import threading
-import Tkinter as tk
-import tkMessageBox
-import ttk
+import time
+
+import config
+
+
+LOGGER = logging.getLogger(__name__)
 
+# kinds of progress reporters
+GUI = 'gui'
+TERMINAL = 'terminal'
+LOG = 'log'
+NONE = 'none'
+REPORTERS = (GUI, TERMINAL, LOG, NONE)
 
 class LifetimeError(Exception):
     """Progress was interrupted (i.e., window closed or cancel button was pressed)."""
     pass
 
-class GuiProgressBar(ttk.Frame):
-    def __init__(self, title, work_count, work_func, *func_args):
-        ttk.Frame.__init__(self, relief='ridge', borderwidth=2)
+ProgressStats = collections.namedtuple('ProgressStats', [
+    'done',  # number of targets finished
+    'total',  # number of targets
+    'in_flight',  # number of targets started, but not finished
+    'rate',  # targets finished per second, recently
+    'eta',  # estimated seconds until all targets finish, or None
+    'elapsed'  # seconds since the work started
+])
+
+def format_duration(seconds):
+    """
+    :param float seconds: duration
+    :rtype: str
+    :return: duration as H:MM:SS, or "?" if unknown
+    """
+    if seconds is None:
+        return '?'
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+class ProgressReporter(object):
+    """Count progress without displaying it. Subclasses display it every report interval."""
+
+    report_interval = None  # seconds between reports, or None to never report
+
+    def __init__(self, work_count):
         self.work_count = work_count
-        self.worker_task = threading.Thread(target=work_func, args=func_args)
+        self.done = 0
+        self.in_flight = 0
         self.pending_stop = False
-        self.master.title(title)
-        self.master.protocol('WM_DELETE_WINDOW', self._confirm_quit)
-        self.pack(fill='both', expand=1)
-        self.widget_space = self._create_widgets()
-
-    def _create_widgets(self):
-        # storage for widgets so we don't pollute GUI app instance namespace
-        widget_space = collections.namedtuple('WidgetSpace', [
-            'button_text',
-            'button',
-            'label_frame',
-            'label_text',
-            'label',
-            'progress_bar',
-            'status_label_text',
-            'status_label'
-        ])
-
-        button_text = tk.StringVar(value='Start')
-        button = ttk.Button(self, textvariable=button_text, command=self._start)
-        button.pack()
-
-        label_frame = ttk.LabelFrame(self, text='Service:Region')
-        label_frame.pack(fill='x')
-
-        label_text = tk.StringVar()
-        label = ttk.Label(label_frame, anchor='w', textvariable=label_text)
-        label.pack(fill='x')
-
-
-        #XXX: add small fraction to max so progress bar doesn't wrap when work finishes
-        progress_bar = ttk.Progressbar(
-            self,
-            orient='horizontal',
-            length=self.master.winfo_screenwidth()/5,
-            mode='determinate',
-            maximum=self.work_count+1e-10
-        )
-        progress_bar.pack(fill='both')
-
-        status_label_text = tk.StringVar(value='0 / {}'.format(self.work_count))
-        status_label = ttk.Label(self, anchor='w', textvariable=status_label_text)
-        status_label.pack(fill='x')
-
-        return widget_space(button_text,
-                            button,
-                            label_frame,
-                            label_text,
-                            label,
-                            progress_bar,
-                            status_label_text,
-                            status_label)
-
-    def _confirm_quit(self):
-        if tkMessageBox.askyesno(message='Quit?'):
-            self.pending_stop = True
-            self.master.destroy()
-
-    def _confirm_cancel(self):
-        if tkMessageBox.askyesno(message='Cancel?'):
-            self.pending_stop = True
-            self.widget_space.button_text.set('Canceled')
-            self.widget_space.button.state(['disabled'])
-
-    def _start(self):
-        self.widget_space.button_text.set('Cancel')
-        self.widget_space.button['command'] = self._confirm_cancel
-        self.worker_task.start()
+        self.start_time = None
+        self.current_target = None  # (service, region) most recently started
+        self._lock = threading.Lock()
+        self._samples = collections.deque()  # (time, done) for computing recent rate
+        self._finished = threading.Event()
+
+    def start_target(self, svc_name, region):
+        """Record that a worker started invoking an operation.
+
+        :param str svc_name: service name
+        :param str region: region name
+        """
+        with self._lock:
+            self.in_flight += 1
+            self.current_target = (svc_name, region)
+
+    def finish_target(self, svc_name, region):
+        """Record that a worker finished invoking an operation.
+
+        :param str svc_name: service name
+        :param str region: region name
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.done += 1
+        if self.pending_stop:
+            raise LifetimeError('User initiated stop.')
+
+    def set_target_counts(self, target_counts):
+        """Record how many targets will be invoked for each service in each region.
+
+        :param dict target_counts: {(service, region): count}
+        """
+        pass
 
     def update_progress(self, delta):
-        """Update progress bar.
+        """Count targets which needed no invoking (e.g., completed by an earlier run).
 
-        :param float delta: increment progress by some amount"""
+        :param int delta: number of targets
+        """
         if self.pending_stop:
             raise LifetimeError('User initiated stop.')
-        self.widget_space.progress_bar.step(delta)
-        self.widget_space.status_label_text.set('{} / {}'.format(
-            int(self.widget_space.progress_bar['value']),
-            self.work_count
-        ))
+        with self._lock:
+            self.done += delta
 
-    def update_svc_text(self, svc_name, region):
-        """Update text in status area of GUI.
+    def request_stop(self):
+        """Ask workers to stop. They do once they finish their current target."""
+        self.pending_stop = True
 
-        :param str svc_name: service name
-        :param str region: region name
+    def get_stats(self):
         """
-        self.widget_space.label_text.set('{}:{}'.format(svc_name, region))
+        :rtype: ProgressStats
+        :return: progress so far
+        """
+        now = time.time()
+        with self._lock:
+            done = self.done
+            in_flight = self.in_flight
+        elapsed = now - self.start_time if self.start_time else 0
+
+        # rate over a recent window so the ETA follows throttling and slow services
+        self._samples.append((now, done))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= config.PROGRESS_RATE_WINDOW:
+            self._samples.popleft()
+        first_time, first_done = self._samples[0]
+        if now - first_time > 0:
+            rate = (done - first_done) / (now - first_time)
+        elif elapsed:
+            rate = done / elapsed
+        else:
+            rate = 0.0
+        eta = (self.work_count - done) / rate if rate else None
+        return ProgressStats(done, self.work_count, in_flight, rate, eta, elapsed)
+
+    def report(self, stats):
+        """Display progress.
+
+        :param ProgressStats stats: progress so far
+        """
+        pass
 
     def finish_work(self):
-        """Update GUI when work is complete."""
-        self.widget_space.button.state(['disabled'])
-        self.widget_space.button_text.set('Finished')
+        """Record that all work is complete."""
+        self._finished.set()
+
+    def _report_periodically(self):
+        while not self._finished.wait(self.report_interval):
+            self.report(self.get_stats())
+
+    def run(self, work_func, *func_args):
+        """Run the work and wait for it to finish. Interrupting (i.e., Ctrl+C) asks workers to stop
+        rather than abandoning them, so responses so far are kept and can be written.
+
+        :param function work_func: function doing the work
+        :param func_args: arguments to the function
+        """
+        self.start_time = time.time()
+        worker_task = threading.Thread(target=work_func, args=func_args)
+        worker_task.start()
+        reporter_task = None
+        if self.report_interval:
+            reporter_task = threading.Thread(target=self._report_periodically)
+            reporter_task.daemon = True
+            reporter_task.start()
+        while worker_task.is_alive():
+            try:
+                # joining with a timeout lets the main thread see KeyboardInterrupt
+                worker_task.join(0.5)
+            except KeyboardInterrupt:
+                LOGGER.warning('Interrupted. Stopping once calls in flight finish.')
+                self.request_stop()
+        self._finished.set()
+        if reporter_task:
+            reporter_task.join()
+        self.report(self.get_stats())
+
+class TerminalProgressReporter(ProgressReporter):
+    """Redraw a progress bar on one line of the terminal."""
+
+    report_interval = config.PROGRESS_TERMINAL_INTERVAL
+    bar_width = 30
+
+    def __init__(self, work_count, out_fp=sys.stderr):
+        super(TerminalProgressReporter, self).__init__(work_count)
+        self.out_fp = out_fp
+        self._line_length = 0
+
+    def report(self, stats):
+        fraction = float(stats.done) / stats.total if stats.total else 1.0
+        filled = int(round(fraction * self.bar_width))
+        line = '[{}{}] {:d}/{:d} {:.0%} {:.1f} calls/s ETA {} in flight {:d}'.format(
+            '#' * filled,
+            ' ' * (self.bar_width - filled),
+            stats.done,
+            stats.total,
+            fraction,
+            stats.rate,
+            format_duration(stats.eta),
+            stats.in_flight
+        )
+        if self.current_target:
+            line += ' {}:{}'.format(*self.current_target)
+        # pad to overwrite the rest of a longer previous line
+        self.out_fp.write('\r' + line.ljust(self._line_length))
+        self._line_length = len(line)
+        if self._finished.is_set():
+            self.out_fp.write('\n')
+        self.out_fp.flush()
+
+class LogProgressReporter(ProgressReporter):
+    """Log a line of progress every so often. Suits output collected by a scheduler."""
+
+    report_interval = config.PROGRESS_LOG_INTERVAL
+
+    def report(self, stats):
+        LOGGER.info('Progress: %d/%d operations, %.1f calls/s, ETA %s, %d in flight, %s elapsed.',
+                    stats.done,
+                    stats.total,
+                    stats.rate,
+                    format_duration(stats.eta),
+                    stats.in_flight,
+                    format_duration(stats.elapsed))
+
+def create_reporter(kind, title, work_count):
+    """Create a progress reporter.
+
+    :param str kind: kind of reporter
+    :param str title: title of the GUI window
+    :param int work_count: number of targets
+    :rtype: ProgressReporter
+    :return: progress reporter
+    """
+    if kind == GUI:
+        # Tk is slow to import and may not be installed, so it is only imported when wanted
+        import progress_gui
+        return progress_gui.GuiProgressBar(title, work_count)
+    elif kind == TERMINAL:
+        return TerminalProgressReporter(work_count)
+    elif kind == LOG:
+        return LogProgressReporter(work_count)
+    elif kind == NONE:
+        return ProgressReporter(work_count)
+    raise ValueError('Unknown progress reporter "{}".'.format(kind))
@@ -0,0 +1,258 @@
+"""Small GUI for displaying resource discovery progress to the user.
+
+Tk is not thread-safe, so worker threads never touch widgets. They put progress events on a queue
+which the Tk main loop drains on a timer. All events since the last refresh are coalesced into one
+update of the widgets, however many calls finished in between.
+"""
+
+import collections
+import Queue
+import threading
+import time
+import Tkinter as tk
+import tkMessageBox
+import ttk
+
+import config
+import progress
+
+
+# progress events
+STARTED = 'started'  # (STARTED, service, region)
+FINISHED = 'finished'  # (FINISHED, service, region)
+TARGET_COUNTS = 'target_counts'  # (TARGET_COUNTS, {(service, region): count})
+WORK_FINISHED = 'work_finished'  # (WORK_FINISHED,)
+
+GLOBAL_REGION_TEXT = 'global'
+
+ProgressUpdate = collections.namedtuple('ProgressUpdate', [
+    'finished',  # {(service, region): number of targets finished}
+    'last_started',  # (service, region) most recently started, or None
+    'target_counts',  # {(service, region): number of targets}, or None
+    'work_finished'  # whether all work is complete
+])
+
+def coalesce(events):
+    """Combine progress events into one update.
+
+    :param list events: progress events, oldest first
+    :rtype: ProgressUpdate
+    :return: update
+    """
+    finished = collections.Counter()
+    last_started = None
+    target_counts = None
+    work_finished = False
+    for event in events:
+        if event[0] == STARTED:
+            last_started = event[1:]
+        elif event[0] == FINISHED:
+            finished[event[1:]] += 1
+        elif event[0] == TARGET_COUNTS:
+            target_counts = event[1]
+        elif event[0] == WORK_FINISHED:
+            work_finished = True
+    return ProgressUpdate(finished, last_started, target_counts, work_finished)
+
+class GuiProgressBar(progress.ProgressReporter, ttk.Frame):
+    def __init__(self, title, work_count):
+        progress.ProgressReporter.__init__(self, work_count)
+        ttk.Frame.__init__(self, relief='ridge', borderwidth=2)
+        self.worker_task = None
+        self._events = Queue.Queue()
+        self._refresh_id = None
+        self._svc_counts = {}  # {svc: [finished, total]}
+        self._region_counts = {}  # {region text: [finished, total]}
+        self.master.title(title)
+        self.master.protocol('WM_DELETE_WINDOW', self._confirm_quit)
+        self.pack(fill='both', expand=1)
+        self.widget_space = self._create_widgets()
+
+    def _create_widgets(self):
+        # storage for widgets so we don't pollute GUI app instance namespace
+        widget_space = collections.namedtuple('WidgetSpace', [
+            'button_text',
+            'button',
+            'label_frame',
+            'label_text',
+            'label',
+            'progress_bar',
+            'status_label_text',
+            'status_label',
+            'svc_tree',
+            'region_tree'
+        ])
+
+        button_text = tk.StringVar(value='Start')
+        button = ttk.Button(self, textvariable=button_text, command=self._start)
+        button.pack()
+
+        label_frame = ttk.LabelFrame(self, text='Service:Region')
+        label_frame.pack(fill='x')
+
+        label_text = tk.StringVar()
+        label = ttk.Label(label_frame, anchor='w', textvariable=label_text)
+        label.pack(fill='x')
+
+
+        #XXX: add small fraction to max so progress bar doesn't wrap when work finishes
+        progress_bar = ttk.Progressbar(
+            self,
+            orient='horizontal',
+            length=self.master.winfo_screenwidth()/5,
+            mode='determinate',
+            maximum=self.work_count+1e-10
+        )
+        progress_bar.pack(fill='both')
+
+        status_label_text = tk.StringVar(value='0 / {}'.format(self.work_count))
+        status_label = ttk.Label(self, anchor='w', textvariable=status_label_text)
+        status_label.pack(fill='x')
+
+        # completion per service and per region
+        trees_frame = ttk.Frame(self)
+        trees_frame.pack(fill='both', expand=1)
+        svc_tree = self._create_tree(trees_frame, 'Service')
+        region_tree = self._create_tree(trees_frame, 'Region')
+
+        return widget_space(button_text,
+                            button,
+                            label_frame,
+                            label_text,
+                            label,
+                            progress_bar,
+                            status_label_text,
+                            status_label,
+                            svc_tree,
+                            region_tree)
+
+    @staticmethod
+    def _create_tree(parent, heading):
+        tree = ttk.Treeview(parent, columns=('done',), height=8)
+        tree.heading('#0', text=heading)
+        tree.heading('done', text='Done')
+        tree.column('done', width=90, anchor='e', stretch=False)
+        scrollbar = ttk.Scrollbar(parent, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side='left', fill='both', expand=1)
+        scrollbar.pack(side='left', fill='y')
+        return tree
+
+    def _confirm_quit(self):
+        if tkMessageBox.askyesno(message='Quit?'):
+            self.request_stop()
+            if self._refresh_id:
+                self.after_cancel(self._refresh_id)
+                self._refresh_id = None
+            self.master.destroy()
+
+    def _confirm_cancel(self):
+        if tkMessageBox.askyesno(message='Cancel?'):
+            self.request_stop()
+            self.widget_space.button_text.set('Canceled')
+            self.widget_space.button.state(['disabled'])
+
+    def _start(self):
+        self.widget_space.button_text.set('Cancel')
+        self.widget_space.button['command'] = self._confirm_cancel
+        self.start_time = time.time()
+        self.worker_task.start()
+        self._refresh_id = self.after(int(config.PROGRESS_GUI_INTERVAL * 1000), self._refresh)
+
+    def run(self, work_func, *func_args):
+        """Show the GUI and wait for it to close. Work starts when the user presses the start
+        button.
+
+        :param function work_func: function doing the work
+        :param func_args: arguments to the function
+        """
+        self.worker_task = threading.Thread(target=work_func, args=func_args)
+        self.mainloop()
+
+    ## called from worker threads. Only queue events. ##
+
+    def start_target(self, svc_name, region):
+        progress.ProgressReporter.start_target(self, svc_name, region)
+        self._events.put((STARTED, svc_name, region))
+
+    def finish_target(self, svc_name, region):
+        try:
+            progress.ProgressReporter.finish_target(self, svc_name, region)
+        finally:
+            self._events.put((FINISHED, svc_name, region))
+
+    def set_target_counts(self, target_counts):
+        self._events.put((TARGET_COUNTS, target_counts))
+
+    def finish_work(self):
+        """Update GUI when work is complete."""
+        progress.ProgressReporter.finish_work(self)
+        self._events.put((WORK_FINISHED,))
+
+    ## called from the Tk main loop ##
+
+    def _refresh(self):
+        """Drain the event queue and update the widgets once."""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except Queue.Empty:
+                break
+        update = coalesce(events)
+
+        if update.target_counts is not None:
+            self._set_target_counts(update.target_counts)
+        if update.last_started:
+            self.widget_space.label_text.set('{}:{}'.format(*update.last_started))
+        for (svc_name, region), count in update.finished.items():
+            self._add_finished(self.widget_space.svc_tree, self._svc_counts, svc_name, count)
+            self._add_finished(self.widget_space.region_tree,
+                               self._region_counts,
+                               region or GLOBAL_REGION_TEXT,
+                               count)
+
+        stats = self.get_stats()
+        self.widget_space.progress_bar['value'] = stats.done
+        self.widget_space.status_label_text.set(
+            '{} / {}    {:.1f} calls/s    ETA {}    in flight {}'.format(
+                stats.done,
+                stats.total,
+                stats.rate,
+                progress.format_duration(stats.eta),
+                stats.in_flight
+            )
+        )
+
+        if update.work_finished:
+            self.widget_space.button.state(['disabled'])
+            self.widget_space.button_text.set('Finished')
+            self._refresh_id = None
+        else:
+            self._refresh_id = self.after(int(config.PROGRESS_GUI_INTERVAL * 1000), self._refresh)
+
+    def _set_target_counts(self, target_counts):
+        for tree, counts in ((self.widget_space.svc_tree, self._svc_counts),
+                             (self.widget_space.region_tree, self._region_counts)):
+            tree.delete(*tree.get_children())
+            counts.clear()
+        for (svc_name, region), count in target_counts.items():
+            self._svc_counts.setdefault(svc_name, [0, 0])[1] += count
+            self._region_counts.setdefault(region or GLOBAL_REGION_TEXT, [0, 0])[1] += count
+        for tree, counts in ((self.widget_space.svc_tree, self._svc_counts),
+                             (self.widget_space.region_tree, self._region_counts)):
+            for name in sorted(counts):
+                tree.insert('', 'end', iid=name, text=name, values=(self._format_count(counts[name]),))
+
+    def _add_finished(self, tree, counts, name, count):
+        name_counts = counts.get(name)
+        if name_counts is None:
+            # not counted up front
+            name_counts = counts[name] = [0, 0]
+            tree.insert('', 'end', iid=name, text=name)
+        name_counts[0] += count
+        tree.item(name, values=(self._format_count(name_counts),))
+
+    @staticmethod
+    def _format_count(name_counts):
+        return '{} / {}'.format(*name_counts)
@@ -0,0 +1,140 @@
+"""Search index of the GUI data, so the GUI can search a large inventory without visiting every node.
+
+The index is built while the GUI data file is written, and written next to it. Nodes are numbered in
+the order they are written. A node is identified by its parent and its position among the parent's
+children, from which the GUI finds its path in the tree. Each token of the text of a node maps to the
+numbers of the nodes with that token. Service, region, and operation names map to their nodes, for
+queries scoped to them (e.g., "service:ec2 region:us-east-1 vpc").
+
+To keep the file small, numbers are written as differences: each parent as the distance back from
+its node, and the nodes of a token as the difference from the previous one.
+
+The GUI tokenizes queries the same way (see gui/src/search-worker.js).
+"""
+
+import array
+import collections
+import functools
+import itertools
+import json
+import re
+
+
+SEARCH_INDEX_FILE_SUFFIX = '.index.json'
+
+# start of the search index file, identifying the format
+SEARCH_INDEX_HEADER = (('format', 'aws-inventory-search-index'), ('format_version', 1))
+
+SERVICE = 'service'
+REGION = 'region'
+OPERATION = 'operation'
+SCOPES = (SERVICE, REGION, OPERATION)
+# name of the region of global services, which have none (e.g., "region:global iam")
+GLOBAL_REGION_NAME = 'global'
+
+# longer tokens (e.g., base64 blobs) are split
+MAX_TOKEN_LENGTH = 64
+# runs of anything but ASCII punctuation and whitespace, so non-ASCII letters are part of a token
+TOKEN_RE = re.compile(ur'[^\s!-/:-@\[-`{-~]{1,%d}' % MAX_TOKEN_LENGTH, re.UNICODE)
+
+# node numbers written per call to write
+_WRITE_BATCH = 4096
+# tokens of this many texts are kept, since many nodes have the same text (e.g., "Tenancy = default")
+_TOKEN_CACHE_SIZE = 50000
+
+def tokenize(text):
+    """
+    :param basestring text: text of a node
+    :rtype: set
+    :return: lowercase tokens of the text
+    """
+    if isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    return set(TOKEN_RE.findall(text.lower()))
+
+def _write_numbers(fp, numbers):
+    for start in xrange(0, len(numbers), _WRITE_BATCH):
+        if start:
+            fp.write(',')
+        fp.write(','.join(map(str, numbers[start:start + _WRITE_BATCH])))
+
+def _differences(numbers):
+    """
+    :param array.array numbers: ascending numbers
+    :rtype: array.array
+    :return: the first number, then the difference of each number from the one before it
+    """
+    return array.array('i', (number - previous for previous, number in
+                             itertools.izip(itertools.chain((0,), numbers), numbers)))
+
+class SearchIndex(object):
+    """Tokens of the text of each GUI data node."""
+
+    def __init__(self):
+        self.parents = array.array('i')
+        self.positions = array.array('i')
+        self.postings = collections.defaultdict(functools.partial(array.array, 'i'))  # {token: nodes}
+        self.scopes = dict((scope, {}) for scope in SCOPES)  # {scope: {name: [node numbers]}}
+        self._token_cache = {}  # {text: tokens}
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add_node(self, parent, position, text=None):
+        """Add a node.
+
+        :param int parent: number of the parent node, or None for a root node
+        :param int position: position of the node among the children of its parent
+        :param basestring text: text to search the node by, if any
+        :rtype: int
+        :return: number of the node
+        """
+        node = len(self.parents)
+        self.parents.append(-1 if parent is None else parent)
+        self.positions.append(position)
+        if text:
+            tokens = self._token_cache.get(text)
+            if tokens is None:
+                if len(self._token_cache) >= _TOKEN_CACHE_SIZE:
+                    self._token_cache.clear()
+                tokens = self._token_cache[text] = tuple(tokenize(text))
+            postings = self.postings
+            for token in tokens:
+                postings[token].append(node)
+        return node
+
+    def add_scope(self, scope, name, node):
+        """Make a node the scope of a name, e.g., the node of a region for "region:us-east-1".
+
+        :param str scope: one of SCOPES
+        :param str name: name of the service, region, or operation. None for the region of a global
+            service.
+        :param int node: number of the node
+        """
+        if name is None:
+            name = GLOBAL_REGION_NAME
+        self.scopes[scope].setdefault(name.lower(), []).append(node)
+
+    def write(self, fp):
+        """Write the index as JSON, starting with SEARCH_INDEX_HEADER. Postings are written one
+        token at a time.
+
+        :param file fp: file to write to
+        """
+        for key, val in SEARCH_INDEX_HEADER:
+            fp.write('{' if key == SEARCH_INDEX_HEADER[0][0] else ', ')
+            fp.write('{}: {}'.format(json.dumps(key), json.dumps(val)))
+        fp.write(', "parents": [')
+        # distance back to the parent, or 0 for a root node
+        _write_numbers(fp, array.array('i', (node - parent if parent >= 0 else 0
+                                             for node, parent in enumerate(self.parents))))
+        fp.write('], "positions": [')
+        _write_numbers(fp, self.positions)
+        fp.write('], "scopes": ')
+        json.dump(self.scopes, fp, sort_keys=True)
+        fp.write(', "tokens": {')
+        for i, (token, nodes) in enumerate(self.postings.iteritems()):
+            fp.write('{}{}: ['.format(', ' if i else '', json.dumps(token)))
+            _write_numbers(fp, _differences(nodes))
+            fp.write(']')
+        fp.write('}}')
@@ -0,0 +1,249 @@
+"""Append-only storage of responses on disk.
+
+Records are appended, one JSON document per line, to segment files in a directory. A new segment is
+started once the current one reaches a size limit. Every record also gets a line in an index file
+giving its kind, key, segment, offset, and length, so a record can be read back without scanning the
+segments. Nothing is ever rewritten: replacing or removing a response appends a newer record.
+
+Exceptions are recorded too, so the directory is a journal of every operation that completed. A scan
+which stopped early can be resumed from it.
+"""
+
+import errno
+import json
+import logging
+import os
+import threading
+
+from botocore.utils import merge_dicts
+
+import codec
+import config
+import store
+
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'index.ndjson'
+SEGMENT_FILENAME_TEMPLATE = 'segment-{:05d}.ndjson'
+
+# record kinds
+RESPONSE = 'response'  # complete response
+FIRST_PAGE = 'first_page'  # first page of a paginated response
+PAGE = 'page'  # subsequent page of a paginated response
+PAGES_END = 'pages_end'  # last page of a paginated response was stored
+SHARED = 'shared'  # response with the values of another response record, and its own metadata
+REMOVE = 'remove'  # response was removed
+EXCEPTION = 'exception'  # exception while invoking an operation
+
+class SegmentError(Exception):
+    """Generic error for reading or writing segments."""
+    pass
+
+class SegmentBackend(object):
+    """Response storage appending records to segment files on disk."""
+
+    def __init__(self, directory, segment_max_bytes=config.SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._readers = {}  # {segment number: file}
+        self._segment = 0  # segment being appended to
+        self.bytes_written = 0  # total size of the segments
+        # latest records of each response
+        self._entries = {}  # {(svc, region, svc_op): [(kind, segment, offset, length), ...]}
+        self._exceptions = {}  # {(svc, region, svc_op): (segment, offset, length)}
+
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self._load_index()
+
+        self._segment_fp = self._open_for_append(self._segment_path(self._segment))
+        self._index_fp = self._open_for_append(os.path.join(directory, INDEX_FILENAME))
+
+    @staticmethod
+    def _open_for_append(path):
+        append_fp = open(path, 'ab')
+        append_fp.seek(0, os.SEEK_END)
+        return append_fp
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, SEGMENT_FILENAME_TEMPLATE.format(segment))
+
+    def _load_index(self):
+        """Read the index of an existing directory. A record which was not completely written,
+        because the process was killed for example, is ignored along with everything after it."""
+        index_path = os.path.join(self.directory, INDEX_FILENAME)
+        if not os.path.exists(index_path):
+            return
+        segment_sizes = {}
+        valid_bytes = 0
+        with open(index_path, 'rb') as index_fp:
+            for line in index_fp:
+                try:
+                    kind, service, region, svc_op, segment, offset, length = json.loads(line)
+                except ValueError:
+                    break
+                if segment not in segment_sizes:
+                    try:
+                        segment_sizes[segment] = os.path.getsize(self._segment_path(segment))
+                    except OSError:
+                        segment_sizes[segment] = 0
+                if offset + length > segment_sizes[segment]:
+                    break
+                valid_bytes += len(line)
+                self._segment = max(self._segment, segment)
+                self._apply(kind, service, region, svc_op, segment, offset, length)
+        with open(index_path, 'ab') as index_fp:
+            index_fp.truncate(valid_bytes)
+        self.bytes_written = sum(segment_sizes.values())
+
+    def _apply(self, kind, service, region, svc_op, segment, offset, length):
+        key = (service, region, svc_op)
+        if kind in (RESPONSE, SHARED):
+            self._entries[key] = [(kind, segment, offset, length)]
+        elif kind == FIRST_PAGE:
+            self._entries[key] = [(kind, segment, offset, length)]
+        elif kind in (PAGE, PAGES_END):
+            self._entries.setdefault(key, []).append((kind, segment, offset, length))
+        elif kind == REMOVE:
+            self._entries.pop(key, None)
+        elif kind == EXCEPTION:
+            self._exceptions[key] = (segment, offset, length)
+        else:
+            raise SegmentError('Unknown record kind "{}".'.format(kind))
+
+    def _append(self, kind, service, region, svc_op, body):
+        data = codec.encode(body) + '\n'
+        with self._lock:
+            if self._segment_fp.tell() and self._segment_fp.tell() + len(data) > self.segment_max_bytes:
+                self._segment_fp.close()
+                self._segment += 1
+                self._segment_fp = self._open_for_append(self._segment_path(self._segment))
+            offset = self._segment_fp.tell()
+            self._segment_fp.write(data)
+            self._segment_fp.flush()
+            self.bytes_written += len(data)
+            self._index(kind, service, region, svc_op, self._segment, offset, len(data))
+
+    def _index(self, kind, service, region, svc_op, segment, offset, length):
+        # called with the lock held
+        self._index_fp.write(json.dumps([kind, service, region, svc_op, segment, offset, length]) + '\n')
+        self._index_fp.flush()
+        self._apply(kind, service, region, svc_op, segment, offset, length)
+
+    def _read(self, segment, offset, length):
+        reader = self._readers.get(segment)
+        if reader is None:
+            reader = self._readers[segment] = open(self._segment_path(segment), 'rb')
+        reader.seek(offset)
+        return codec.decode(reader.read(length))
+
+    def put_response(self, service, region, svc_op, resp):
+        self._append(RESPONSE, service, region, svc_op, resp)
+
+    def put_page(self, service, region, svc_op, page, result_keys, page_number):
+        self._append(FIRST_PAGE if page_number == 1 else PAGE,
+                     service,
+                     region,
+                     svc_op,
+                     {'page': page, 'result_keys': result_keys})
+
+    def finish_pages(self, service, region, svc_op, non_aggregate_part):
+        self._append(PAGES_END, service, region, svc_op, non_aggregate_part)
+
+    def share_response(self, service, region, svc_op, resp, first):
+        # only the location of the record of the first response, and the ResponseMetadata. Records
+        #   are never rewritten, so the location stays valid even if the first response is replaced.
+        with self._lock:
+            entries = self._entries.get(first)
+            location = list(entries[0][1:]) if entries and entries[0][0] == RESPONSE else None
+        if location is None:
+            # the first response was paginated
+            self.put_response(service, region, svc_op, resp)
+            return
+        record = {'response': location}
+        if isinstance(resp, dict) and 'ResponseMetadata' in resp:
+            record['ResponseMetadata'] = resp['ResponseMetadata']
+        self._append(SHARED, service, region, svc_op, record)
+
+    def remove_response(self, service, region, svc_op):
+        if (service, region, svc_op) in self._entries:
+            self._append(REMOVE, service, region, svc_op, None)
+
+    def put_exception(self, service, region, svc_op, exc):
+        self._append(EXCEPTION, service, region, svc_op, exc)
+
+    def _build(self, entries):
+        if entries[0][0] == RESPONSE:
+            return self._read(*entries[0][1:])
+        if entries[0][0] == SHARED:
+            record = self._read(*entries[0][1:])
+            return store.share_values(self._read(*record['response']), record)
+        if entries[-1][0] != PAGES_END:
+            # pagination did not finish
+            return None
+        resp = {}
+        for entry in entries[:-1]:
+            record = self._read(*entry[1:])
+            store.merge_page(resp, record['page'], record['result_keys'])
+        merge_dicts(resp, self._read(*entries[-1][1:]))
+        return resp
+
+    def get_response(self, service, region, svc_op):
+        with self._lock:
+            entries = self._entries.get((service, region, svc_op))
+            if not entries:
+                return None
+            return self._build(entries)
+
+    def iter_responses(self):
+        """Iterate over stored responses, ordered by service, region, and operation. Only one
+        response at a time is read from disk.
+
+        :rtype: iterator
+        :return: (service, region, operation, response) tuples
+        """
+        for key in sorted(self._entries, key=lambda k: (k[0], k[1] or '', k[2])):
+            resp = self.get_response(*key)
+            if resp is not None:
+                yield key + (resp,)
+
+    def iter_keys(self):
+        """Iterate over the keys of complete responses, without reading them.
+
+        :rtype: iterator
+        :return: (service, region, operation) tuples
+        """
+        for key, entries in self._entries.items():
+            if entries[0][0] in (RESPONSE, SHARED) or entries[-1][0] == PAGES_END:
+                yield key
+
+    def iter_exceptions(self):
+        """Iterate over stored exceptions.
+
+        :rtype: iterator
+        :return: (service, region, operation, exception) tuples
+        """
+        for key, location in self._exceptions.items():
+            with self._lock:
+                exc = self._read(*location)
+            yield key + (exc,)
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        :return: number of responses, and size in bytes of the segments
+        """
+        return {'backend': 'disk', 'responses': len(self._entries), 'bytes': self.bytes_written}
+
+    def close(self):
+        with self._lock:
+            self._segment_fp.close()
+            self._index_fp.close()
+            for reader in self._readers.itervalues():
+                reader.close()
+            self._readers = {}
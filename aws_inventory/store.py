@@ -1,22 +1,41 @@
 """Data persistence for responses and any exceptions while invoking operations."""
 
+import base64
+import cPickle
 import datetime
+import itertools
 import json
 import logging
+import operator
 import pickle
 import string
 import sys
+import threading
 import time
 import uuid
+from json.encoder import encode_basestring_ascii
+from StringIO import StringIO
 
 import botocore
+from botocore.utils import merge_dicts, set_value_from_jmespath
+import jmespath
 
+import codec
 import config
+import dumpfile
+import errors
+import search_index
 import version
 
 
 LOGGER = logging.getLogger(__name__)
 
+# protocol for pickles written one piece at a time
+PICKLE_PROTOCOL = 2
+
+# first line of the chunked GUI data file
+CHUNKED_DATA_HEADER = {'format': 'aws-inventory-chunked', 'format_version': 1}
+
 class ResponseEncoder(json.JSONEncoder):
     """Encode responses from operations in order to serialize to JSON."""
 
@@ -25,30 +44,702 @@ class ResponseEncoder(json.JSONEncoder):
             return o.isoformat()
         return super(ResponseEncoder, self).default(o)
 
+def _encode_binary(obj):
+    """Replace binary strings which are not valid UTF-8 with their base64 encoding, like the AWS CLI
+    outputs blobs."""
+    if isinstance(obj, dict):
+        return dict((key, _encode_binary(val)) for key, val in obj.iteritems())
+    elif isinstance(obj, (list, tuple)):
+        return [_encode_binary(val) for val in obj]
+    elif isinstance(obj, str):
+        try:
+            obj.decode('utf-8')
+        except UnicodeDecodeError:
+            return base64.b64encode(obj)
+    return obj
+
+def dumps_response(resp):
+    """Serialize a response to JSON.
+
+    :param resp: response from invoking an API
+    :rtype: str
+    :return: response in JSON format
+    """
+    try:
+        return json.dumps(resp, cls=ResponseEncoder)
+    except UnicodeDecodeError:
+        # a binary value (e.g., CloudTrail API ListPublicKeys)
+        return json.dumps(_encode_binary(resp), cls=ResponseEncoder)
+
+_result_key_expressions = {}  # {result key: compiled JMESPath expression}
+
+def _compile_result_key(result_key):
+    """Compile a result key once. Every page of an operation has the same result keys.
+
+    :param str result_key: JMESPath expression
+    :rtype: jmespath.parser.ParsedResult
+    """
+    expression = _result_key_expressions.get(result_key)
+    if expression is None:
+        expression = _result_key_expressions[result_key] = jmespath.compile(result_key)
+    return expression
+
+def merge_page(result, page, result_keys):
+    """Merge the result keys of a page into a result. This incrementally builds the same result as
+    botocore's PageIterator.build_full_result.
+
+    :param dict result: result being built
+    :param dict page: page of a paginated response
+    :param list result_keys: JMESPath expressions of the keys aggregated across pages
+    """
+    for result_key in result_keys:
+        result_expression = _compile_result_key(result_key)
+        result_value = result_expression.search(page)
+        if result_value is None:
+            continue
+        existing_value = result_expression.search(result)
+        if existing_value is None:
+            set_value_from_jmespath(result, result_key, result_value)
+        elif isinstance(result_value, list):
+            existing_value.extend(result_value)
+        elif isinstance(result_value, (int, float, basestring)):
+            set_value_from_jmespath(result, result_key, existing_value + result_value)
+
+class MemoryBackend(object):
+    """Response storage in a nested dict."""
+
+    def __init__(self):
+        self.responses = {}  # {svc: {region: {svc_op: response}}}
+
+    def put_response(self, service, region, svc_op, resp):
+        svc_store = self.responses.setdefault(service, {})
+        svc_store.setdefault(region, {})[svc_op] = resp
+
+    def put_page(self, service, region, svc_op, page, result_keys, page_number):
+        if page_number == 1:
+            self.put_response(service, region, svc_op, {})
+        merge_page(self.responses[service][region][svc_op], page, result_keys)
+
+    def finish_pages(self, service, region, svc_op, non_aggregate_part):
+        merge_dicts(self.responses[service][region][svc_op], non_aggregate_part)
+
+    def share_response(self, service, region, svc_op, resp, first):
+        # the values of the first response, so they are stored once
+        self.put_response(service, region, svc_op, share_values(self.get_response(*first), resp))
+
+    def remove_response(self, service, region, svc_op):
+        self.responses.get(service, {}).get(region, {}).pop(svc_op, None)
+
+    def get_response(self, service, region, svc_op):
+        return self.responses.get(service, {}).get(region, {}).get(svc_op)
+
+    def put_exception(self, service, region, svc_op, exc):
+        # exceptions are only kept by the result store
+        pass
+
+    def iter_keys(self):
+        for service, svc_store in self.responses.items():
+            for region, region_store in svc_store.items():
+                for svc_op in region_store:
+                    yield service, region, svc_op
+
+    def iter_exceptions(self):
+        return iter(())
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        :return: number of responses, and size in bytes (None since nothing is on disk)
+        """
+        # values() copies, so responses being added while counting are fine
+        return {'backend': 'memory',
+                'responses': sum(len(region_store)
+                                 for svc_store in self.responses.values()
+                                 for region_store in svc_store.values()),
+                'bytes': None}
+
+    def iter_responses(self):
+        """Iterate over stored responses, grouped by service and region.
+
+        :rtype: iterator
+        :return: (service, region, operation, response) tuples
+        """
+        for service, svc_store in self.responses.items():
+            for region, region_store in svc_store.items():
+                for svc_op, resp in region_store.items():
+                    yield service, region, svc_op, resp
+
+    def close(self):
+        pass
+
+def _compact_string(val, always_intern=False):
+    """
+    :param basestring val: string
+    :param bool always_intern: whether to intern the string whatever its length
+    :rtype: basestring
+    :return: ASCII text as a str, which takes a quarter of the memory of a unicode string. It is
+        interned if short, so repeated values (e.g., states, instance types) are stored once.
+    """
+    if type(val) is unicode:
+        try:
+            val = val.encode('ascii')
+        except UnicodeEncodeError:
+            return val
+    if type(val) is str and (always_intern or len(val) <= config.INTERN_MAX_LENGTH):
+        return intern(val)
+    return val
+
+def normalize_response(resp, keep_metadata=False):
+    """Compact a response before it is stored: the ResponseMetadata is summarized unless it is kept,
+    keys and short strings are interned, ASCII text is stored as str, and tuples become lists, as
+    they are serialized. Values are visited without recursion, so responses of any depth can be
+    normalized.
+
+    :param resp: response, or part of one
+    :param bool keep_metadata: whether to keep the full ResponseMetadata
+    :return: normalized copy of the response. Other values (e.g., datetimes) are shared with it.
+    """
+    if not keep_metadata and isinstance(resp, dict) and \
+            isinstance(resp.get('ResponseMetadata'), dict):
+        metadata = resp['ResponseMetadata']
+        resp = dict(resp)
+        resp['ResponseMetadata'] = dict((key, metadata[key])
+                                        for key in config.RESPONSE_METADATA_SUMMARY_KEYS
+                                        if key in metadata)
+    root = [resp]
+    stack = [(root, 0)]  # (container, key) of containers to normalize
+    while stack:
+        parent, slot = stack.pop()
+        val = parent[slot]
+        if isinstance(val, dict):
+            compact = {}
+            for key, item in val.iteritems():
+                if isinstance(key, basestring):
+                    key = _compact_string(key, True)
+                if isinstance(item, basestring):
+                    item = _compact_string(item)
+                elif isinstance(item, (dict, list, tuple)):
+                    stack.append((compact, key))
+                compact[key] = item
+        elif isinstance(val, (list, tuple)):
+            compact = [_compact_string(item) if isinstance(item, basestring) else item
+                       for item in val]
+            stack.extend((compact, i) for i, item in enumerate(compact)
+                         if isinstance(item, (dict, list, tuple)))
+        else:
+            compact = _compact_string(val) if isinstance(val, basestring) else val
+        parent[slot] = compact
+    return root[0]
+
+def share_values(first, resp):
+    """Share the values of a response with another one with the same content.
+
+    :param first: response stored first
+    :param resp: response with the same content, apart from its ResponseMetadata
+    :return: a response with the values of the first response and the ResponseMetadata, if any, of
+        the other one. Only the top level is copied.
+    """
+    if not isinstance(first, dict):
+        return first
+    shared = without_metadata(first)
+    shared = dict(shared) if shared is first else shared
+    if isinstance(resp, dict) and 'ResponseMetadata' in resp:
+        shared['ResponseMetadata'] = resp['ResponseMetadata']
+    return shared
+
+def _get_fingerprint(resp):
+    """
+    :param resp: normalized response
+    :rtype: str
+    :return: fingerprint of the response without its ResponseMetadata, or None if it is nested too
+        deeply to encode
+    """
+    try:
+        return codec.fingerprint(without_metadata(resp))
+    except RuntimeError:
+        return None
+
+def without_metadata(resp):
+    """
+    :param resp: response
+    :return: the response without its ResponseMetadata, which differs on every call
+    """
+    if isinstance(resp, dict) and 'ResponseMetadata' in resp:
+        return dict((key, val) for key, val in resp.iteritems() if key != 'ResponseMetadata')
+    return resp
+
+def _pickle_fragment(obj):
+    """Pickle an object so it can be embedded in a larger pickle. The protocol header and the STOP
+    opcode are stripped. Memo entries of a fragment are only referred to within the fragment.
+
+    :param obj: object to pickle
+    :rtype: str
+    :return: pickle opcodes pushing the object on the unpickler stack
+    """
+    return pickle.dumps(obj, PICKLE_PROTOCOL)[2:-1]
+
+# keys of each kind of GUI data node, in the order they were first set. json.dump wrote them in the
+#   order of a dict with those keys, which is kept so the data file is unchanged.
+_LEAF_KEYS = ('text',)
+_CONTAINER_KEYS = ('text', 'children')
+_SERVICE_KEYS = ('text', 'children', 'type', 'state')
+_REGION_KEYS = ('text', 'children', 'type', 'state', 'a_attr')
+_OPERATION_KEYS = ('text', 'children', 'type')
+_HIDDEN_OPERATION_KEYS = ('text', 'children', 'type', 'state')
+_METADATA_KEYS = ('text', 'children', 'type')
+_TYPED_LEAF_KEYS = ('text', 'type')
+
+_OPENED_STATE = '{"opened": true}'
+_HIDDEN_STATE = '{"hidden": true}'
+
+_RESPONSE_ENCODER = ResponseEncoder()
+
+def _node_templates(keys):
+    """Build the templates of a node's JSON. Children are written between the two parts.
+
+    :param tuple keys: keys of the node, in the order they were first set
+    :rtype: tuple
+    :return: templates of the JSON before and after the children, formatted with a dict of the
+        JSON of each value other than the children
+    """
+    parts = ['{}: %({})s'.format(json.dumps(key), key) if key != 'children' else None
+             for key in dict.fromkeys(keys)]
+    if None not in parts:
+        return '{' + ', '.join(parts) + '}', ''
+    i = parts.index(None)
+    head = ', '.join(parts[:i] + ['"children": ['])
+    tail = ''.join(', ' + part for part in parts[i + 1:])
+    return '{' + head, ']' + tail + '}'
+
+_LEAF = _node_templates(_LEAF_KEYS)
+_CONTAINER = _node_templates(_CONTAINER_KEYS)
+_SERVICE = _node_templates(_SERVICE_KEYS)
+_REGION = _node_templates(_REGION_KEYS)
+_OPERATION = _node_templates(_OPERATION_KEYS)
+_HIDDEN_OPERATION = _node_templates(_HIDDEN_OPERATION_KEYS)
+_METADATA = _node_templates(_METADATA_KEYS)
+_TYPED_LEAF = _node_templates(_TYPED_LEAF_KEYS)
+
+def _is_container(obj):
+    return isinstance(obj, (dict, list, tuple)) and len(obj) > 0
+
+def _iter_children(obj):
+    return obj.iteritems() if isinstance(obj, dict) else enumerate(obj)
+
+def _encode_text(obj):
+    """Encode the text of a node.
+
+    :param obj: text, or the value of a list element
+    :rtype: str
+    :return: JSON
+    """
+    if isinstance(obj, basestring):
+        try:
+            return encode_basestring_ascii(obj)
+        except UnicodeDecodeError:
+            # binary
+            return encode_basestring_ascii(repr(obj))
+    elif obj is None:
+        return 'null'
+    elif obj is True:
+        return 'true'
+    elif obj is False:
+        return 'false'
+    elif isinstance(obj, (int, long)):
+        return str(obj)
+    elif isinstance(obj, (dict, list, tuple)):
+        # an empty container has no children
+        return '[]'
+    return _RESPONSE_ENCODER.encode(obj)
+
+def _format_leaf_text(key, val):
+    try:
+        return u'{} = {}'.format(key, val)
+    except UnicodeDecodeError:
+        # key or value is probably binary. For example, CloudTrail API ListPublicKeys
+        return u'{} = {!r}'.format(key, val)
+
+def _search_text(obj):
+    """Get the text of a node as the GUI shows it, to add to the search index.
+
+    :param obj: text, or the value of a list element
+    :rtype: basestring
+    """
+    if isinstance(obj, str):
+        try:
+            obj.decode('utf-8')
+        except UnicodeDecodeError:
+            # binary
+            return repr(obj)
+    elif not isinstance(obj, unicode):
+        return _encode_text(obj)
+    return obj
+
+def _add_to_index(index, parent, position, text, scope=None):
+    """Add a node to the search index, if there is one and the parent of the node is in it.
+
+    :param SearchIndex index: search index, or None
+    :param int parent: number of the parent node, or None if it is not in the index
+    :param int position: position of the node among the children of its parent
+    :param text: text of the node
+    :param str scope: scope the node is named by the text in (see search_index.SCOPES), if any
+    :rtype: int
+    :return: number of the node, or None
+    """
+    if index is None or parent is None:
+        return None
+    node = index.add_node(parent, position, _search_text(text))
+    if scope:
+        index.add_scope(scope, text, node)
+    return node
+
+def _count_non_empty(resp):
+    """Count the parts of a response which have anything in them. Response metadata is not counted.
+
+    :param resp: response with children
+    :rtype: int
+    :return: number of non-empty parts
+    """
+    if isinstance(resp, dict):
+        return sum(1 for key, val in resp.iteritems()
+                   if key != 'ResponseMetadata' and _is_container(val))
+    return sum(1 for val in resp if _is_container(val))
+
+def _write_operation_children(write, resp, index=None, parent=None):
+    """Write the jsTree nodes of a response, one value at a time. Nodes are visited with a stack
+    rather than recursion, so deep responses cannot reach the recursion limit.
+
+    :param function write: writes a string of the data file
+    :param resp: response with children
+    :param SearchIndex index: search index to add the nodes to, if any. Response metadata is not
+        added.
+    :param int parent: number of the operation node in the search index
+    """
+    # each frame is [children iterator, whether the parent is a dict, children written, tail,
+    #   number of the parent in the search index]
+    stack = [[_iter_children(resp), isinstance(resp, dict), 0, '', parent]]
+    while stack:
+        frame = stack[-1]
+        try:
+            key, val = next(frame[0])
+        except StopIteration:
+            stack.pop()
+            write(frame[3])
+            continue
+        if frame[2]:
+            write(', ')
+        frame[2] += 1
+        in_dict = frame[1]
+        if _is_container(val):
+            text = key if in_dict else '[{:d}]'.format(key)
+            if len(stack) == 1 and text == 'ResponseMetadata':
+                head, tail = _METADATA
+                write(head % {'text': _encode_text(text), 'type': '"response_metadata"'})
+                node = None
+            else:
+                head, tail = _CONTAINER
+                write(head % {'text': _encode_text(text)})
+                node = _add_to_index(index, frame[4], frame[2] - 1, text)
+            stack.append([_iter_children(val), isinstance(val, dict), 0, tail, node])
+        else:
+            text = _format_leaf_text(key, val) if in_dict else val
+            if len(stack) == 1 and text == 'ResponseMetadata':
+                write(_TYPED_LEAF[0] % {'text': _encode_text(text), 'type': '"response_metadata"'})
+            else:
+                write(_LEAF[0] % {'text': _encode_text(text)})
+                _add_to_index(index, frame[4], frame[2] - 1, text)
+
+def _count_region(region_store):
+    """Count the non-empty parts of the responses of each operation in a region.
+
+    :param dict region_store: responses in the region, {svc_op: response}
+    :rtype: tuple
+    :return: {svc_op: number of non-empty parts} of operations with a response which has children,
+        and the number of those operations to hide since they have nothing in them
+    """
+    counts = dict((svc_op, _count_non_empty(resp))
+                  for svc_op, resp in region_store.iteritems() if _is_container(resp))
+    return counts, sum(1 for count in counts.itervalues() if not count)
+
+def _write_service_node(write, service, svc_store, index=None, node=None):
+    """Write the jsTree node of a service. Nodes are written as they are visited, and counts of
+    non-empty responses and hidden operations are computed from the top level of each response, so
+    no node structure is built in memory.
+
+    :param function write: writes a string of the data file
+    :param str service: service name
+    :param dict svc_store: responses of the service, {region: {svc_op: response}}
+    :param SearchIndex index: search index to add the nodes to, if any
+    :param int node: number of the service node in the search index
+    """
+    head, tail = _SERVICE
+    write(head % {'text': _encode_text(service), 'type': '"service"', 'state': _OPENED_STATE})
+    for i, (region, region_store) in enumerate(svc_store.iteritems()):
+        if i:
+            write(', ')
+        counts, num_hidden_operations = _count_region(region_store)
+        region_head, region_tail = _REGION
+        write(region_head % {
+            'text': _encode_text(region),
+            'type': '"region"',
+            'state': _OPENED_STATE,
+            'a_attr': json.dumps({'title': '{:d} hidden operations'.format(num_hidden_operations)})
+        })
+        region_node = _add_to_index(index, node, i, region, search_index.REGION)
+        for j, (svc_op, resp) in enumerate(region_store.iteritems()):
+            if j:
+                write(', ')
+            if svc_op not in counts:
+                # no response
+                write(_TYPED_LEAF[0] % {'text': _encode_text(_format_leaf_text(svc_op, resp)),
+                                        'type': '"operation"'})
+                _add_to_index(index, region_node, j, _format_leaf_text(svc_op, resp))
+                continue
+            # add count of non empty response to operation name
+            if counts[svc_op]:
+                op_head, op_tail = _OPERATION
+                text = '{} ({:d})'.format(svc_op, counts[svc_op])
+            else:
+                op_head, op_tail = _HIDDEN_OPERATION
+                text = svc_op
+            write(op_head % {'text': _encode_text(text),
+                             'type': '"operation"',
+                             'state': _HIDDEN_STATE})
+            op_node = _add_to_index(index, region_node, j, svc_op, search_index.OPERATION)
+            _write_operation_children(write, resp, index, op_node)
+            write(op_tail)
+        write(region_tail)
+    write(tail)
+
+def _write_service_chunks(fp, service, svc_store, index=None, node=None):
+    """Write the response of each operation of a service as a chunk of the chunked GUI data file.
+
+    :param file fp: file to write to
+    :param str service: service name
+    :param dict svc_store: responses of the service, {region: {svc_op: response}}
+    :param SearchIndex index: search index to add the nodes to, if any
+    :param int node: number of the service node in the search index
+    :rtype: dict
+    :return: jsTree node of the service, down to its operations. Operations with a response to
+        show refer to its chunk, to be loaded when they are opened.
+    """
+    region_nodes = []
+    for i, (region, region_store) in enumerate(svc_store.iteritems()):
+        counts, num_hidden_operations = _count_region(region_store)
+        region_node = _add_to_index(index, node, i, region, search_index.REGION)
+        operation_nodes = []
+        for j, (svc_op, resp) in enumerate(region_store.iteritems()):
+            if svc_op not in counts:
+                # no response
+                operation_nodes.append({'text': _format_leaf_text(svc_op, resp), 'type': 'operation'})
+                _add_to_index(index, region_node, j, _format_leaf_text(svc_op, resp))
+                continue
+            op_node = _add_to_index(index, region_node, j, svc_op, search_index.OPERATION)
+            offset = fp.tell()
+            fp.write('[')
+            _write_operation_children(fp.write, resp, index, op_node)
+            fp.write(']')
+            operation_node = {'text': svc_op,
+                              'type': 'operation',
+                              'children': True,
+                              'data': {'chunk': [offset, fp.tell() - offset]}}
+            fp.write('\n')
+            if counts[svc_op]:
+                operation_node['text'] = '{} ({:d})'.format(svc_op, counts[svc_op])
+            else:
+                operation_node['state'] = {'hidden': True}
+            operation_nodes.append(operation_node)
+        region_nodes.append({
+            'text': region,
+            'type': 'region',
+            'state': {'opened': True},
+            'a_attr': {'title': '{:d} hidden operations'.format(num_hidden_operations)},
+            'children': operation_nodes
+        })
+    return {'text': service, 'type': 'service', 'state': {'opened': True}, 'children': region_nodes}
+
 class ResultStore(object):
     """Storage and serialization for responses and exceptions."""
 
-    def __init__(self, profile):
+    def __init__(self, profile, backend=None, keep_response_metadata=False):
+        """
+        :param str profile: name of the AWS profile
+        :param object backend: storage for responses. Kept in memory by default.
+        :param bool keep_response_metadata: whether to store the full ResponseMetadata of each
+            response instead of a summary
+        """
         self.profile = profile
-        self._response_store = {}  # {svc: {region: {svc_op: response}}}
+        self.backend = backend or MemoryBackend()
+        self.keep_response_metadata = keep_response_metadata
         self._exception_store = {}  # {svc: {svc_op: {region: exception}}}
+        self._skipped_operations = set()  # {(svc, svc_op)}
+        self._skipped_service_regions = set()  # {(svc, region)}
+        self.page_counts = {}  # {svc: {region: {svc_op: count}}}
+        # responses with the same content (without ResponseMetadata) are stored once
+        self._lock = threading.Lock()
+        self._first_responses = {}  # {fingerprint: (svc, region, svc_op) first stored with it}
+        self._fingerprints = {}  # {first (svc, region, svc_op): fingerprint}
+        self._same_as = {}  # {(svc, region, svc_op): first (svc, region, svc_op) with its response}
         self.run_date = time.strftime('%Y-%m-%d %H:%M:%S %Z')
         self.commandline = ' '.join(sys.argv)
         self.version = version.__version__
 
+        # rebuild from a backend holding results of an earlier run
+        for service, region, svc_op, exc in self.backend.iter_exceptions():
+            self._exception_store.setdefault(service, {}).setdefault(svc_op, {})[region] = \
+                exc['exception']
+            self._skip(service, region, svc_op, exc['outcome'])
+        # responses stored after resuming are shared with those stored before
+        for service, region, svc_op, resp in self.backend.iter_responses():
+            fingerprint = _get_fingerprint(resp)
+            if fingerprint is not None:
+                self._add_fingerprint((service, region, svc_op), fingerprint)
+
     def add_response(self, service, region, svc_op, resp):
         """Add a response to the store for a given service for an operation in a region. Replace
         existing values.
 
+        The response is normalized first (see :func:`normalize_response`). A response with the same
+        content as one already stored (e.g., the same global resources listed in every region) is
+        not stored again. Instead, the operation shares the values of the response stored first,
+        and keeps its own ResponseMetadata.
+
         :param str service: service name
         :param str region: region name
         :param str svc_op: service operation name
         :param dict resp: response from invoking an API
         """
-        svc_store = self._response_store.setdefault(service, {})
-        svc_store.setdefault(region, {})[svc_op] = resp
+        key = (service, region, svc_op)
+        resp = normalize_response(resp, self.keep_response_metadata)
+        fingerprint = _get_fingerprint(resp)
+        with self._lock:
+            self._forget_shared(key)
+            first = None if fingerprint is None else self._add_fingerprint(key, fingerprint)
+            if first is None:
+                self.backend.put_response(service, region, svc_op, resp)
+            else:
+                self.backend.share_response(service, region, svc_op, resp, first)
+
+    def _add_fingerprint(self, key, fingerprint):
+        """Record the fingerprint of the response of an operation. Called with the lock held, or
+        before any other thread uses the store.
+
+        :param tuple key: (svc, region, svc_op)
+        :param str fingerprint: fingerprint of the response without its ResponseMetadata
+        :rtype: tuple
+        :return: (svc, region, svc_op) of the first operation with the same response, or None if
+            this is the first
+        """
+        first = self._first_responses.setdefault(fingerprint, key)
+        if first != key:
+            self._same_as[key] = first
+            return first
+        self._fingerprints[key] = fingerprint
+        return None
+
+    def _forget_shared(self, key):
+        """Stop sharing the response of an operation which is being replaced or removed. If other
+        operations shared it, the first of them keeps it. Called with the lock held.
+
+        :param tuple key: (svc, region, svc_op)
+        """
+        if self._same_as.pop(key, None) is not None:
+            return
+        fingerprint = self._fingerprints.pop(key, None)
+        if fingerprint is None:
+            return
+        del self._first_responses[fingerprint]
+        sharing = sorted(other for other, first in self._same_as.iteritems() if first == key)
+        if not sharing:
+            return
+        new_first = sharing[0]
+        del self._same_as[new_first]
+        self._first_responses[fingerprint] = new_first
+        self._fingerprints[new_first] = fingerprint
+        for other in sharing[1:]:
+            self._same_as[other] = new_first
+
+    def get_shared_responses(self):
+        """
+        :rtype: dict
+        :return: {(svc, region, svc_op): (svc, region, svc_op) of the first operation with the same
+            response}
+        """
+        with self._lock:
+            return dict(self._same_as)
+
+    def add_response_page(self, service, region, svc_op, page, result_keys):
+        """Add a page of a paginated response to the store. Only the values aggregated across pages
+        are kept. The page is handed to the backend as soon as it arrives, so pages are never held
+        until the last one.
+
+        :param str service: service name
+        :param str region: region name
+        :param str svc_op: service operation name
+        :param dict page: page of a paginated response
+        :param list result_keys: JMESPath expressions of the keys aggregated across pages
+        """
+        region_counts = self.page_counts.setdefault(service, {}).setdefault(region, {})
+        # first page replaces any existing response
+        region_counts[svc_op] = region_counts.get(svc_op, 0) + 1
+        if region_counts[svc_op] == 1:
+            with self._lock:
+                self._forget_shared((service, region, svc_op))
+        page_part = {}
+        merge_page(page_part, page, result_keys)
+        page_part = normalize_response(page_part, self.keep_response_metadata)
+        self.backend.put_page(service, region, svc_op, page_part, result_keys, region_counts[svc_op])
+
+    def finish_response_pages(self, service, region, svc_op, non_aggregate_part):
+        """Complete a paginated response after its last page was added.
 
-    def add_exception(self, service, region, svc_op, exc):
+        :param str service: service name
+        :param str region: region name
+        :param str svc_op: service operation name
+        :param dict non_aggregate_part: response values which are not aggregated across pages
+        """
+        region_counts = self.page_counts.setdefault(service, {}).setdefault(region, {})
+        non_aggregate_part = normalize_response(non_aggregate_part, self.keep_response_metadata)
+        if region_counts.get(svc_op):
+            self.backend.finish_pages(service, region, svc_op, non_aggregate_part)
+        else:
+            region_counts[svc_op] = 0
+            resp = {}
+            merge_dicts(resp, non_aggregate_part)
+            with self._lock:
+                self._forget_shared((service, region, svc_op))
+            self.backend.put_response(service, region, svc_op, resp)
+        LOGGER.debug('[%s][%s] Stored %d page(s) for API "%s".',
+                     region,
+                     service,
+                     region_counts[svc_op],
+                     svc_op)
+
+    def remove_response(self, service, region, svc_op):
+        """Remove the response, if any, for a given service for an operation in a region. Used to
+        drop a partially stored paginated response.
+
+        :param str service: service name
+        :param str region: region name
+        :param str svc_op: service operation name
+        """
+        with self._lock:
+            self._forget_shared((service, region, svc_op))
+        self.backend.remove_response(service, region, svc_op)
+        self.page_counts.get(service, {}).get(region, {}).pop(svc_op, None)
+
+    def get_response(self, service, region, svc_op):
+        """Get the response for a given service for an operation in a region.
+
+        :param str service: service name
+        :param str region: region name
+        :param str svc_op: service operation name
+        :rtype: dict
+        :return: response, or None if there is no response
+        """
+        return self.backend.get_response(service, region, svc_op)
+
+    def add_exception(self, service, region, svc_op, exc, outcome=errors.SKIP_OPERATION):
         """Add an exception to the store for a given service for an operation in a region. Replace
         existing values.
 
@@ -56,22 +747,77 @@ class ResultStore(object):
         :param str region: region name
         :param str svc_op: service operation name
         :param dict exc: exception from invoking an API
+        :param str outcome: classification of the exception. See errors.py
         """
         svc_store = self._exception_store.setdefault(service, {})
         svc_store.setdefault(svc_op, {})[region] = str(exc)
+        self._skip(service, region, svc_op, outcome)
+        self.backend.put_exception(service, region, svc_op, {'exception': str(exc),
+                                                             'outcome': outcome})
+
+    def _skip(self, service, region, svc_op, outcome):
+        if outcome == errors.SKIP_OPERATION:
+            self._skipped_operations.add((service, svc_op))
+        elif outcome == errors.SKIP_REGION:
+            # error codes like AuthFailure are often specific to the service
+            self._skipped_service_regions.add((service, region))
 
     def has_exceptions(self, service, svc_op):
-        """Check whether a service operation has any exceptions.
+        """Check whether a service operation has any exceptions which mean it should not be invoked
+        again in any region.
 
         :param str service: service name
         :param str svc_op: service operation name
         :rtype: bool
         :return: whether there are exceptions
         """
-        try:
-            return len(self._exception_store[service][svc_op]) > 0
-        except KeyError:
-            return False
+        return (service, svc_op) in self._skipped_operations
+
+    def is_skipped(self, service, region, svc_op):
+        """Check whether earlier exceptions mean an operation in a region should not be invoked.
+
+        :param str service: service name
+        :param str region: region name
+        :param str svc_op: service operation name
+        :rtype: bool
+        :return: whether to skip the operation
+        """
+        return ((service, region) in self._skipped_service_regions or
+                (service, svc_op) in self._skipped_operations)
+
+    def get_stats(self):
+        """Get the size of the store. Safe to call while responses are being added.
+
+        :rtype: dict
+        :return: backend name, number of responses, and size in bytes on disk (None in memory)
+        """
+        return self.backend.get_stats()
+
+    def get_completed_targets(self):
+        """Get the operations which already have a response or an exception.
+
+        :rtype: set
+        :return: (service, region, operation) tuples
+        """
+        completed = set(self.backend.iter_keys())
+        for service, svc_store in self._exception_store.items():
+            for svc_op, region_store in svc_store.items():
+                for region in region_store:
+                    completed.add((service, region, svc_op))
+        return completed
+
+    def _iter_service_stores(self):
+        """Iterate over the responses of one service at a time.
+
+        :rtype: iterator
+        :return: (service, {region: {svc_op: response}}) tuples
+        """
+        for service, entries in itertools.groupby(self.backend.iter_responses(),
+                                                  operator.itemgetter(0)):
+            svc_store = {}
+            for _, region, svc_op, resp in entries:
+                svc_store.setdefault(region, {})[svc_op] = resp
+            yield service, svc_store
 
     def get_response_store(self):
         """Serialize response store to JSON.
@@ -79,16 +825,64 @@ class ResultStore(object):
         :rtype: str
         :return: serialized response store in JSON format
         """
+        out_fp = StringIO()
+        out_fp.name = '<memory file>'
+        self.write_response_store(out_fp)
+        return out_fp.getvalue()
+
+    def write_response_store(self, fp):
+        """Serialize response store to JSON, one response at a time.
+
+        :param file fp: file to write to
+        """
         LOGGER.debug('Building the response store.')
-        return json.dumps(self._response_store, cls=ResponseEncoder)
+        group_key = operator.itemgetter(0)
+        fp.write('{')
+        for i, (service, svc_entries) in enumerate(
+                itertools.groupby(self.backend.iter_responses(), group_key)):
+            fp.write('{}{}: {{'.format(', ' if i else '', json.dumps(service)))
+            for j, (region, region_entries) in enumerate(
+                    itertools.groupby(svc_entries, operator.itemgetter(1))):
+                fp.write('{}{}: {{'.format(', ' if j else '', json.dumps(region)))
+                for k, (_, _, svc_op, resp) in enumerate(region_entries):
+                    fp.write('{}{}: {}'.format(', ' if k else '',
+                                               json.dumps(svc_op),
+                                               dumps_response(resp)))
+                fp.write('}')
+            fp.write('}')
+        fp.write('}')
 
     def dump_response_store(self, fp):
-        """Pickle the response store.
+        """Pickle the response store, as a nested dict, {svc: {region: {svc_op: response}}}.
+
+        Responses kept in memory are pickled as they are, so operations sharing a response (see
+        :meth:`add_response`) refer to the same values when unpickled, each with its own
+        ResponseMetadata. Responses stored on disk are written one at a time instead, rather than
+        read into memory first, so each is written in full. The indexed dump keeps them shared
+        either way.
 
         :param file fp: file to write to
         """
         LOGGER.debug('Writing the response store to file "%s".', fp.name)
-        pickle.dump(self._response_store, fp)
+        if isinstance(self.backend, MemoryBackend):
+            cPickle.dump(self.backend.responses, fp, PICKLE_PROTOCOL)
+            return
+        fp.write(pickle.PROTO + chr(PICKLE_PROTOCOL))
+        fp.write(pickle.EMPTY_DICT)
+        for service, svc_entries in itertools.groupby(self.backend.iter_responses(),
+                                                      operator.itemgetter(0)):
+            fp.write(_pickle_fragment(service))
+            fp.write(pickle.EMPTY_DICT)
+            for region, region_entries in itertools.groupby(svc_entries, operator.itemgetter(1)):
+                fp.write(_pickle_fragment(region))
+                fp.write(pickle.EMPTY_DICT)
+                for _, _, svc_op, resp in region_entries:
+                    fp.write(_pickle_fragment(svc_op))
+                    fp.write(_pickle_fragment(resp))
+                    fp.write(pickle.SETITEM)
+                fp.write(pickle.SETITEM)
+            fp.write(pickle.SETITEM)
+        fp.write(pickle.STOP)
 
     def dump_exception_store(self, fp):
         """Pickle the exception store.
@@ -98,10 +892,40 @@ class ResultStore(object):
         LOGGER.debug('Writing the exception store to file "%s".', fp.name)
         pickle.dump(self._exception_store, fp)
 
-    def generate_data_file(self, fp):
-        """Generate the data file for consumption by the data GUI.
+    def dump_indexed_response_store(self, fp):
+        """Write the response store as an indexed dump, one response at a time. Unlike the pickle,
+        single responses can be read back from it (see dumpfile.py).
+
+        :param file fp: file to write to
+        """
+        LOGGER.debug('Writing the indexed response store to file "%s".', fp.name)
+        writer = dumpfile.DumpWriter(fp, dumpfile.RESPONSES, deduplicate=True)
+        for service, region, svc_op, resp in self.backend.iter_responses():
+            writer.add(service, region, svc_op, resp)
+        writer.close()
+
+    def dump_indexed_exception_store(self, fp):
+        """Write the exception store as an indexed dump.
+
+        :param file fp: file to write to
+        """
+        LOGGER.debug('Writing the indexed exception store to file "%s".', fp.name)
+        writer = dumpfile.DumpWriter(fp, dumpfile.EXCEPTIONS)
+        for service, region, svc_op, exc in dumpfile.iter_nested(self._exception_store,
+                                                                 dumpfile.EXCEPTIONS):
+            writer.add(service, region, svc_op, exc)
+        writer.close()
+
+    def generate_data_file(self, fp, index=None):
+        """Generate the data file for consumption by the data GUI. Nodes of the data model are
+        written as the responses are visited, rather than being built in memory first.
+
+        Responses shared by several operations (see :meth:`add_response`) are written in full for
+        each of them. jsTree nodes cannot refer to other nodes, and the GUI in gui/dist reads them as
+        they are.
 
         :param file fp: file to write to
+        :param SearchIndex index: search index to add the nodes to, if any
         """
         # format of data file for jsTree
         #[
@@ -113,75 +937,59 @@ class ResultStore(object):
         #    ]
         #  }
         #]
-        def build_children(obj):
-            children = []
-            if isinstance(obj, dict):
-                for key, val in obj.items():
-                    child = build_children(val)
-                    if isinstance(child, (dict, list, tuple)) and child:
-                        children.append({'text': key, 'children': child})
-                    else:
-                        # leaf node
-                        try:
-                            children.append({'text': u'{} = {}'.format(key, val)})
-                        except UnicodeDecodeError:
-                            # key or value is probably binary. For example, CloudTrail API ListPublicKeys
-                            children.append({'text': u'{} = {!r}'.format(key, val)})
-            elif isinstance(obj, (list, tuple)):
-                for i, val in enumerate(obj):
-                    child = build_children(val)
-                    if isinstance(child, (dict, list, tuple)) and child:
-                        children.append({'text': '[{:d}]'.format(i), 'children': child})
-                    else:
-                        # leaf node
-                        children.append({'text': child})
-            else:
-                return obj
-            return children
-        LOGGER.debug('Building the GUI data model.')
-        data = build_children({'[inventory]': self._response_store})
-
-        # assign types to nodes so jsTree can handle them appropriately
-
-        data[0]['type'] = 'root'
-        data[0]['state'] = {'opened': True}
-        for service in data[0]['children']:
-            service['type'] = 'service'
-            service['state'] = {'opened': True}
-            for region in service['children']:
-                region['type'] = 'region'
-                region['state'] = {'opened': True}
-                num_hidden_operations = 0
-                for operation in region['children']:
-                    operation['type'] = 'operation'
-
-                    # add count of non empty response to operation name
-
-                    try:
-                        num_non_empty_responses = 0
-                        for response in operation['children']:
-                            try:
-                                if response['text'] == 'ResponseMetadata':
-                                    response['type'] = 'response_metadata'
-                                    continue  # ignore metadata nodes in count
-                                num_non_empty_responses += 1 if response['children'] else 0
-                            except KeyError:
-                                # an empty response
-                                pass
-                        if num_non_empty_responses:
-                            operation['text'] += ' ({:d})'.format(num_non_empty_responses)
-                        else:
-                            num_hidden_operations += 1
-                            operation['state'] = {"hidden": True}
-                    except KeyError:
-                        # no response
-                        pass
-                region['a_attr'] = {'title': '{:d} hidden operations'.format(num_hidden_operations)}
-
-        out_obj = {'run_date': self.run_date,
-                   'commandline': self.commandline,
-                   'version': self.version,
-                   'botocore_version': botocore.__version__,
-                   'responses': data}
         LOGGER.debug('Writing the GUI data model to file "%s".', fp.name)
-        json.dump(out_obj, fp, cls=ResponseEncoder)
+        header = json.dumps({'run_date': self.run_date,
+                             'commandline': self.commandline,
+                             'version': self.version,
+                             'botocore_version': botocore.__version__})
+        fp.write(header[:-1])
+        fp.write(', "responses": [{"text": "[inventory]", "type": "root", '
+                 '"state": {"opened": true}, "children": [')
+        root = index.add_node(None, 0) if index is not None else None
+        for i, (service, svc_store) in enumerate(self._iter_service_stores()):
+            if i:
+                fp.write(', ')
+            _write_service_node(fp.write, service, svc_store, index,
+                                _add_to_index(index, root, i, service, search_index.SERVICE))
+        fp.write(']}]}')
+
+    def generate_chunked_data_file(self, fp, index=None):
+        """Generate the GUI data file in a format the GUI loads lazily, for large inventories. The
+        file is newline-delimited JSON:
+
+        * a header identifying the format
+        * a chunk for each operation with a response to show: the jsTree nodes of the response
+        * a manifest: the run details, and the jsTree nodes of services, regions, and operations.
+          Operation nodes give the offset and length of their chunk.
+        * a trailer giving the offset and length of the manifest
+
+        The GUI reads the trailer and manifest to show the services, and reads a chunk only when its
+        operation is opened. Chunks are written one operation at a time, so only the manifest is
+        kept in memory.
+
+        :param file fp: file to write to, opened in binary mode since offsets are in bytes
+        :param SearchIndex index: search index to add the nodes to, if any
+        """
+        LOGGER.debug('Writing the chunked GUI data model to file "%s".', fp.name)
+        fp.write(json.dumps(CHUNKED_DATA_HEADER) + '\n')
+        root = index.add_node(None, 0) if index is not None else None
+        service_nodes = [
+            _write_service_chunks(fp, service, svc_store, index,
+                                  _add_to_index(index, root, i, service, search_index.SERVICE))
+            for i, (service, svc_store) in enumerate(self._iter_service_stores())
+        ]
+        manifest = json.dumps({'run_date': self.run_date,
+                               'commandline': self.commandline,
+                               'version': self.version,
+                               'botocore_version': botocore.__version__,
+                               'responses': [{'text': '[inventory]',
+                                              'type': 'root',
+                                              'state': {'opened': True},
+                                              'children': service_nodes}]})
+        offset = fp.tell()
+        fp.write(manifest + '\n')
+        fp.write(json.dumps({'manifest': [offset, len(manifest)]}) + '\n')
+
+    def close(self):
+        """Release resources held by the backend."""
+        self.backend.close()
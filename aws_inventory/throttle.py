@@ -0,0 +1,129 @@
+"""Adapt the number of concurrent API calls to how much throttling each service endpoint does."""
+
+import contextlib
+import logging
+import random
+import threading
+import time
+
+import botocore.exceptions
+
+import config
+
+
+LOGGER = logging.getLogger(__name__)
+
+def is_throttling_error(exc):
+    """
+    :param Exception exc: exception from invoking an API
+    :rtype: bool
+    :return: whether the exception is due to the API call being throttled
+    """
+    if isinstance(exc, botocore.exceptions.ClientError):
+        return exc.response.get('Error', {}).get('Code') in config.THROTTLING_ERROR_CODES
+    return False
+
+def get_backoff(attempt):
+    """Get how long to wait before retrying a call. Exponential backoff with full jitter.
+
+    :param int attempt: number of retries so far
+    :rtype: float
+    :return: seconds to wait
+    """
+    return random.uniform(0, min(config.THROTTLE_BACKOFF_CAP,
+                                 config.THROTTLE_BACKOFF_BASE * 2 ** attempt))
+
+class _Limiter(object):
+    """Concurrency limit of a service in a region."""
+
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.last_decrease = 0
+        self.condition = threading.Condition()
+
+class RateController(object):
+    """Limit concurrent calls per service and region with additive increase, multiplicative decrease
+    (AIMD). Each successful call raises a limit by about one per limit's worth of calls. A throttled
+    call halves it, at most once per decrease interval since calls in flight tend to be throttled
+    together.
+    """
+
+    def __init__(self,
+                 initial_limit=config.THROTTLE_INITIAL_CONCURRENCY,
+                 max_limit=config.THROTTLE_MAX_CONCURRENCY,
+                 min_limit=1):
+        self.initial_limit = min(initial_limit, max_limit)
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self._limiters = {}  # {(svc, region): _Limiter}
+        self._lock = threading.Lock()
+        self.throttle_counts = {}  # {(svc, region): count}
+
+    def _get_limiter(self, service, region):
+        key = (service, region)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.setdefault(key, _Limiter(self.initial_limit))
+        return limiter
+
+    def get_limit(self, service, region):
+        """
+        :param str service: service name
+        :param str region: region name
+        :rtype: int
+        :return: current concurrency limit
+        """
+        return int(self._get_limiter(service, region).limit)
+
+    @contextlib.contextmanager
+    def slot(self, service, region):
+        """Wait until a call to a service in a region is allowed, and hold the slot for the call.
+
+        :param str service: service name
+        :param str region: region name
+        """
+        limiter = self._get_limiter(service, region)
+        with limiter.condition:
+            while limiter.in_flight >= int(limiter.limit):
+                limiter.condition.wait()
+            limiter.in_flight += 1
+        try:
+            yield
+        finally:
+            with limiter.condition:
+                limiter.in_flight -= 1
+                limiter.condition.notify()
+
+    def on_success(self, service, region):
+        """Record a call which was not throttled.
+
+        :param str service: service name
+        :param str region: region name
+        """
+        limiter = self._get_limiter(service, region)
+        with limiter.condition:
+            if limiter.limit < self.max_limit:
+                old_limit = int(limiter.limit)
+                limiter.limit = min(self.max_limit, limiter.limit + 1.0 / limiter.limit)
+                if int(limiter.limit) > old_limit:
+                    limiter.condition.notify()
+
+    def on_throttle(self, service, region):
+        """Record a throttled call.
+
+        :param str service: service name
+        :param str region: region name
+        """
+        limiter = self._get_limiter(service, region)
+        with limiter.condition:
+            self.throttle_counts[(service, region)] = self.throttle_counts.get((service, region), 0) + 1
+            now = time.time()
+            if now - limiter.last_decrease >= config.THROTTLE_DECREASE_INTERVAL:
+                limiter.last_decrease = now
+                limiter.limit = max(self.min_limit, limiter.limit / 2)
+                LOGGER.debug('[%s][%s] Throttled. Concurrency limit lowered to %d.',
+                             region,
+                             service,
+                             int(limiter.limit))
@@ -0,0 +1,345 @@
+"""Record where scan time goes, call by call.
+
+Each target (an operation of a service in a region) gets a record of how long it waited in the queue,
+how long getting its client took, how many times it was retried, and the latency, size, and number of
+items of every API request it made, including each page of a paginated response. Requests are timed
+through botocore's before-call and after-call events, so nothing is parsed twice.
+
+Records are written as a Chrome trace-event JSON file, which can be opened in chrome://tracing or
+Perfetto, and as a summary table of the slowest services, regions, and operations.
+"""
+
+import collections
+import json
+import logging
+import os.path
+import threading
+import time
+
+import config
+
+
+LOGGER = logging.getLogger(__name__)
+
+# registered once per client
+_HANDLER_ID = 'aws_inventory-trace'
+
+# outcomes of a target other than exceptions. See errors.py for those.
+OK = 'ok'
+SKIPPED = 'skipped'
+
+TRACE_FILE_SUFFIX = '.trace.json'
+SUMMARY_FILE_SUFFIX = '.trace.txt'
+
+class CallRecord(object):
+    """Timing of invoking one target."""
+
+    __slots__ = ('service', 'region', 'svc_op', 'thread', 'queue_wait', 'start', 'end',
+                 'client_seconds', 'retries', 'requests', 'outcome')
+
+    def __init__(self, service, region, svc_op, thread, queue_wait, start):
+        self.service = service
+        self.region = region
+        self.svc_op = svc_op
+        self.thread = thread
+        self.queue_wait = queue_wait
+        self.start = start
+        self.end = None
+        self.client_seconds = 0.0
+        self.retries = 0
+        self.requests = []  # [start, end, response bytes, item count]
+        self.outcome = None
+
+    @property
+    def seconds(self):
+        return (self.end or self.start) - self.start
+
+    @property
+    def response_bytes(self):
+        return sum(request[2] for request in self.requests)
+
+    @property
+    def item_count(self):
+        return sum(request[3] for request in self.requests)
+
+def count_items(parsed):
+    """Count the resources in a response (i.e., the entries of its lists).
+
+    :param dict parsed: response, or a page of one
+    :rtype: int
+    :return: number of items
+    """
+    return sum(len(val) for key, val in parsed.iteritems()
+               if key != 'ResponseMetadata' and isinstance(val, list))
+
+class NullTracer(object):
+    """Record nothing. Used when tracing is off so invoking needs no checks."""
+
+    def start(self):
+        pass
+
+    def begin(self, target):
+        pass
+
+    def instrument_client(self, client):
+        pass
+
+    def client_created(self, seconds):
+        pass
+
+    def retried(self):
+        pass
+
+    def throttled(self):
+        pass
+
+    def end(self, outcome):
+        pass
+
+class TracerGroup(NullTracer):
+    """Pass hooks on to several tracers (e.g., the call trace and live metrics)."""
+
+    def __init__(self, tracers):
+        self.tracers = tracers
+
+    def start(self):
+        for tracer in self.tracers:
+            tracer.start()
+
+    def begin(self, target):
+        for tracer in self.tracers:
+            tracer.begin(target)
+
+    def instrument_client(self, client):
+        for tracer in self.tracers:
+            tracer.instrument_client(client)
+
+    def client_created(self, seconds):
+        for tracer in self.tracers:
+            tracer.client_created(seconds)
+
+    def retried(self):
+        for tracer in self.tracers:
+            tracer.retried()
+
+    def throttled(self):
+        for tracer in self.tracers:
+            tracer.throttled()
+
+    def end(self, outcome):
+        for tracer in self.tracers:
+            tracer.end(outcome)
+
+class Tracer(NullTracer):
+    """Record every target invoked."""
+
+    def __init__(self):
+        self.records = []
+        self.start_time = None
+        self._local = threading.local()
+        self._threads = {}  # {thread ident: small number for the trace}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Record when targets were queued. They are all queued at once before workers start."""
+        self.start_time = time.time()
+
+    def _thread_number(self):
+        ident = threading.current_thread().ident
+        number = self._threads.get(ident)
+        if number is None:
+            with self._lock:
+                number = self._threads.setdefault(ident, len(self._threads) + 1)
+        return number
+
+    def begin(self, target):
+        """Start recording a target on the current thread.
+
+        :param tuple target: (service, region, operation)
+        """
+        now = time.time()
+        record = CallRecord(target[0],
+                            target[1],
+                            target[2],
+                            self._thread_number(),
+                            now - (self.start_time or now),
+                            now)
+        self._local.record = record
+        self._local.request = None
+
+    def instrument_client(self, client):
+        """Time the requests a client makes. Registering again is a no-op.
+
+        :param botocore.client.BaseClient client: client
+        """
+        events = client.meta.events
+        # first, since a before-call handler returning a response skips the ones after it
+        events.register_first('before-call.*.*',
+                              self._before_call,
+                              unique_id=_HANDLER_ID + '-before')
+        events.register('after-call.*.*', self._after_call, unique_id=_HANDLER_ID + '-after')
+        events.register('after-call-error.*.*',
+                        self._after_call_error,
+                        unique_id=_HANDLER_ID + '-error')
+
+    def _before_call(self, **kwargs):
+        record = getattr(self._local, 'record', None)
+        if record is not None:
+            self._local.request = [time.time(), None, 0, 0]
+            record.requests.append(self._local.request)
+
+    def _after_call(self, http_response=None, parsed=None, **kwargs):
+        request = getattr(self._local, 'request', None)
+        if request is not None:
+            request[1] = time.time()
+            try:
+                request[2] = len(http_response.content or '')
+            except Exception:
+                pass
+            if isinstance(parsed, dict):
+                request[3] = count_items(parsed)
+            self._local.request = None
+
+    def _after_call_error(self, **kwargs):
+        request = getattr(self._local, 'request', None)
+        if request is not None:
+            request[1] = time.time()
+            self._local.request = None
+
+    def client_created(self, seconds):
+        """
+        :param float seconds: time taken to get the client of the current target
+        """
+        self._local.record.client_seconds = seconds
+
+    def retried(self):
+        """Count a retry of the current target."""
+        self._local.record.retries += 1
+
+    def end(self, outcome):
+        """Finish recording the current target.
+
+        :param str outcome: "ok", "skipped", or how an exception was classified
+        """
+        record = self._local.record
+        record.end = time.time()
+        record.outcome = outcome
+        self._local.record = None
+        # list.append is atomic, so the hot path takes no lock
+        self.records.append(record)
+
+    def write_trace(self, fp):
+        """Write records as Chrome trace events.
+
+        :param file fp: output file
+        """
+        to_us = lambda seconds: int(round((seconds - self.start_time) * 1e6))
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': 'aws_inventory'}}]
+        for number in sorted(self._threads.values()):
+            events.append({'name': 'thread_name',
+                           'ph': 'M',
+                           'pid': 1,
+                           'tid': number,
+                           'args': {'name': 'worker {:d}'.format(number)}})
+        for record in self.records:
+            events.append({'name': record.svc_op,
+                           'cat': record.service,
+                           'ph': 'X',
+                           'pid': 1,
+                           'tid': record.thread,
+                           'ts': to_us(record.start),
+                           'dur': int(round(record.seconds * 1e6)),
+                           'args': {'service': record.service,
+                                    'region': record.region,
+                                    'outcome': record.outcome,
+                                    'queue_wait_ms': round(record.queue_wait * 1e3, 3),
+                                    'client_ms': round(record.client_seconds * 1e3, 3),
+                                    'retries': record.retries,
+                                    'requests': len(record.requests),
+                                    'response_bytes': record.response_bytes,
+                                    'items': record.item_count}})
+            for i, (start, end, response_bytes, items) in enumerate(record.requests):
+                events.append({'name': 'request {:d}'.format(i + 1),
+                               'cat': record.service,
+                               'ph': 'X',
+                               'pid': 1,
+                               'tid': record.thread,
+                               'ts': to_us(start),
+                               'dur': int(round(((end or start) - start) * 1e6)),
+                               'args': {'response_bytes': response_bytes, 'items': items}})
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp)
+
+    def summarize(self, key_func):
+        """Total the records by some key.
+
+        :param function key_func: gets the key of a record
+        :rtype: list
+        :return: (key, calls, seconds, max seconds, retries, bytes, items) tuples, slowest first
+        """
+        totals = collections.OrderedDict()
+        for record in self.records:
+            total = totals.setdefault(key_func(record), [0, 0.0, 0.0, 0, 0, 0])
+            total[0] += 1
+            total[1] += record.seconds
+            total[2] = max(total[2], record.seconds)
+            total[3] += record.retries
+            total[4] += record.response_bytes
+            total[5] += record.item_count
+        return sorted(((key,) + tuple(total) for key, total in totals.items()),
+                      key=lambda row: row[2],
+                      reverse=True)
+
+    def write_summary(self, fp, top=config.TRACE_SUMMARY_TOP):
+        """Write tables of the slowest services, regions, and operations.
+
+        :param file fp: output file
+        :param int top: number of rows per table
+        """
+        wall_seconds = max([record.end for record in self.records] or [self.start_time]) - \
+            self.start_time
+        fp.write('{:d} target(s) in {:.1f} s. {:d} request(s), {:d} retries, {:d} bytes.\n'.format(
+            len(self.records),
+            wall_seconds,
+            sum(len(record.requests) for record in self.records),
+            sum(record.retries for record in self.records),
+            sum(record.response_bytes for record in self.records)))
+        queue_waits = sorted(record.queue_wait for record in self.records)
+        client_seconds = sum(record.client_seconds for record in self.records)
+        if queue_waits:
+            fp.write('Queue wait: median {:.1f} s, max {:.1f} s. Client creation: {:.1f} s.\n'.format(
+                queue_waits[len(queue_waits) // 2],
+                queue_waits[-1],
+                client_seconds))
+
+        tables = (('Service', lambda record: record.service),
+                  ('Region', lambda record: record.region or 'global'),
+                  ('Operation', lambda record: '{}.{}'.format(record.service, record.svc_op)))
+        row_format = '{:<50} {:>7} {:>10} {:>10} {:>10} {:>8} {:>12} {:>9}\n'
+        for heading, key_func in tables:
+            fp.write('\n')
+            fp.write(row_format.format(heading, 'calls', 'total s', 'mean ms', 'max ms', 'retries',
+                                       'bytes', 'items'))
+            for key, calls, seconds, max_seconds, retries, response_bytes, items in \
+                    self.summarize(key_func)[:top]:
+                fp.write(row_format.format(key,
+                                           calls,
+                                           '{:.2f}'.format(seconds),
+                                           '{:.1f}'.format(seconds / calls * 1e3),
+                                           '{:.1f}'.format(max_seconds * 1e3),
+                                           retries,
+                                           response_bytes,
+                                           items))
+
+    def write(self, base_path):
+        """Write the trace and summary next to another file (i.e., the GUI data file).
+
+        :param str base_path: path of the other file
+        """
+        base = os.path.splitext(base_path)[0]
+        trace_path = base + TRACE_FILE_SUFFIX
+        summary_path = base + SUMMARY_FILE_SUFFIX
+        with open(trace_path, 'w') as out_fp:
+            self.write_trace(out_fp)
+        with open(summary_path, 'w') as out_fp:
+            self.write_summary(out_fp)
+        LOGGER.info('Wrote call trace to "%s" and summary to "%s".', trace_path, summary_path)
@@ -5,11 +5,13 @@ import { LinkContainer } from 'react-router-bootstrap';
 import { HashRouter, Redirect, Route, Switch } from 'react-router-dom';
 import 'jstree/dist/themes/default/style.min.css';
 
+import { isChunkedFile, readChunk, readManifest } from './chunked-data';
 import { JS_TREE_CONF } from './config.js';
 import AwsIFileInput from './file-input';
 import AwsIHomeArea from './home-area';
 import AwsIHelpArea from './help-area';
 import AwsIInventoryArea from './inventory-area';
+import SearchIndex, { isSearchIndexFile } from './search-index';
 import './App.css';
 
 
@@ -22,34 +24,72 @@ class App extends Component {
       version: undefined,
       botocoreVersion: undefined,
       showHelp: false,
-      treeConf: undefined
+      treeConf: undefined,
+      loadChildren: undefined,
+      searchIndex: undefined
     };
     this.awsInvData = undefined;
   }
 
   handleFileSelect = (evt) => {
-    const file = evt.target.files[0];
-    const reader = new FileReader();
-    reader.onload = () => {
-      let parsed = JSON.parse(reader.result);
-      this.handleAwsInvData(parsed);
-    };
-    reader.readAsText(file);
+    // the data file, and optionally the search index written next to it
+    const files = Array.from(evt.target.files);
+    Promise.all(files.map(isSearchIndexFile)).then((isIndex) => {
+      const file = files.find((f, i) => !isIndex[i]);
+      const indexFile = files.find((f, i) => isIndex[i]);
+      if (!file) {
+        console.log('No data file selected.');
+        return;
+      }
+      isChunkedFile(file).then((chunked) => {
+        const searchIndex = this.createSearchIndex(file, indexFile, chunked);
+        if (chunked) {
+          // only the manifest is read now. Responses are read when their operations are opened.
+          readManifest(file).then((manifest) => {
+            this.handleAwsInvData(manifest, (node) => readChunk(file, node.data.chunk), searchIndex);
+          });
+        }
+        else {
+          const reader = new FileReader();
+          reader.onload = () => {
+            let parsed = JSON.parse(reader.result);
+            this.handleAwsInvData(parsed, undefined, searchIndex);
+          };
+          reader.readAsText(file);
+        }
+      });
+    });
   };
 
-  handleAwsInvData = (data) => {
+  createSearchIndex(file, indexFile, chunked) {
+    if (this.state.searchIndex) {
+      this.state.searchIndex.terminate();
+    }
+    try {
+      return new SearchIndex(file, indexFile, chunked);
+    }
+    catch (err) {
+      // searching falls back to visiting the loaded nodes
+      console.log(`Unable to start search worker: ${err}`);
+      return undefined;
+    }
+  }
+
+  handleAwsInvData = (data, loadChildren, searchIndex) => {
     this.setState({
       runDate: data.run_date,
       commandLine: data.commandline,
       version: data.version,
       botocoreVersion: data.botocore_version,
       treeConf: this.buildJsTreeConf(data.responses),
+      loadChildren: loadChildren,
+      searchIndex: searchIndex
     });
   };
 
   buildJsTreeConf(responses) {
     const extra_conf = {
-      core: {data: responses}
+      core: {...JS_TREE_CONF.core, data: responses}
     }
     return {...JS_TREE_CONF, ...extra_conf};
   }
@@ -75,7 +115,7 @@ class App extends Component {
 
   renderInventoryContent = () => {
     return (
-      this.state.treeConf === undefined ? <Redirect to="/" /> : <AwsIInventoryArea treeConf={this.state.treeConf} />
+      this.state.treeConf === undefined ? <Redirect to="/" /> : <AwsIInventoryArea treeConf={this.state.treeConf} loadChildren={this.state.loadChildren} searchIndex={this.state.searchIndex} />
     );
   };
 
@@ -0,0 +1,48 @@
+/*
+Read the chunked data file lazily. The file is newline-delimited JSON: a header, a chunk of tree
+nodes for each operation, a manifest with the tree down to the operations, and a trailer giving the
+offset and length of the manifest. Only the slices needed are read, so the size of the file does not
+matter until an operation is opened.
+*/
+
+const CHUNKED_FORMAT = 'aws-inventory-chunked';
+// the header and the trailer are each shorter than this
+const EDGE_BYTES = 256;
+
+function readText(blob) {
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve(reader.result);
+    reader.onerror = () => reject(reader.error);
+    reader.readAsText(blob);
+  });
+}
+
+function readJson(file, offset, length) {
+  return readText(file.slice(offset, offset + length)).then(JSON.parse);
+}
+
+export function isChunkedFile(file) {
+  return readText(file.slice(0, EDGE_BYTES)).then((text) => {
+    try {
+      return JSON.parse(text.split('\n')[0]).format === CHUNKED_FORMAT;
+    }
+    catch (e) {
+      // a JSON data file
+      return false;
+    }
+  });
+}
+
+export function readManifest(file) {
+  return readText(file.slice(Math.max(0, file.size - EDGE_BYTES))).then((text) => {
+    const lines = text.split('\n').filter((line) => line);
+    const [offset, length] = JSON.parse(lines[lines.length - 1]).manifest;
+    return readJson(file, offset, length);
+  });
+}
+
+export function readChunk(file, chunk) {
+  const [offset, length] = chunk;
+  return readJson(file, offset, length);
+}
@@ -1,6 +1,9 @@
 import $ from 'jquery';
 
 
+// milliseconds to wait after typing in the search box before searching
+export const SEARCH_DEBOUNCE_MS = 250;
+
 export const JS_TREE_CONF = {
     "core" : {
         "themes": {"icons": true, "responsive": true},
@@ -7,10 +7,11 @@ export default class AwsIFileInput extends Component {
   render() {
     return (
       <div className="container">
-        <ControlLabel>Select data file (from commandline tool).</ControlLabel>
+        <ControlLabel>Select data file (from commandline tool), and its search index (*.index.json) if there is one.</ControlLabel>
         <FormControl
           type="file"
-          accept=".json, application/json"
+          accept=".json, .ndjson, application/json"
+          multiple
           onChange={this.props.onFileSelect}
           id="file"
         />
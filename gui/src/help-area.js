@@ -25,8 +25,11 @@ export default class AwsIHelpArea extends Component {
             <ListGroupItem><kbd>Home</kbd>: focus root node</ListGroupItem>
             <ListGroupItem><kbd>End</kbd>: focus deepest expanded node</ListGroupItem>
             <ListGroupItem><kbd>←</kbd> <kbd>→</kbd> <kbd>↑</kbd> <kbd>↓</kbd>: move/expand/collapse nodes</ListGroupItem>
+            <ListGroupItem><kbd>Enter</kbd>: expand/collapse node</ListGroupItem>
             <ListGroupItem>Operations with no response data are hidden. Hover over region nodes to see number of hidden operations.</ListGroupItem>
             <ListGroupItem>The number in parentesis after operations is the number of non-empty responses.</ListGroupItem>
+            <ListGroupItem>Search matches whole words in the text of nodes, and the start of the last word. Narrow it with <code>service:</code>, <code>region:</code>, and <code>operation:</code>, e.g., <code>service:ec2 region:us-east-1 sg-</code>. Select the search index (*.index.json) along with the data file to search without reading every response first.</ListGroupItem>
+            <ListGroupItem>Only the rows in view are drawn, so whole subtrees can be expanded. To use jsTree instead, select "Classic tree" under Options.</ListGroupItem>
           </ListGroup>
         </Modal.Body>
       </Modal>
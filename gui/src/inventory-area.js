@@ -1,8 +1,10 @@
 import PropTypes from 'prop-types';
 import React, { Component } from 'react';
 
+import { SEARCH_DEBOUNCE_MS } from './config.js';
 import AwsIInventoryToolbar from './inventory-toolbar';
 import ReactJsTree from './react-js-tree';
+import VirtualTree from './virtual-tree';
 
 
 export default class AwsIInventoryArea extends Component {
@@ -13,18 +15,26 @@ export default class AwsIInventoryArea extends Component {
     */
     this.state = {
       searchString: undefined,
-      preferences: {showExtraNodes: false},
+      preferences: {showExtraNodes: false, classicTree: false},
     };
   }
 
+  componentWillUnmount() {
+    clearTimeout(this.searchTimer);
+  }
+
   handleSearch = (evt) => {
-    this.setState({searchString: evt.target.value});
+    // search once typing pauses, rather than on every keystroke
+    const searchString = evt.target.value;
+    clearTimeout(this.searchTimer);
+    this.searchTimer = setTimeout(() => this.setState({searchString: searchString}), SEARCH_DEBOUNCE_MS);
   }
   
   handleSelect = (key, evt) => {
     switch (key) {
       case 'showExtraNodes':
-        this.setState({preferences: {[key]: !this.state.preferences[key]}});
+      case 'classicTree':
+        this.setState({preferences: {...this.state.preferences, [key]: !this.state.preferences[key]}});
         break;
       default:
         console.log(`Unrecognized option "${key}".`);
@@ -33,6 +43,9 @@ export default class AwsIInventoryArea extends Component {
 
   render() {
     if (this.props.treeConf && this.props.treeConf.core.data.length) {
+      // jsTree creates DOM elements for every open node, so only the virtual tree copes with
+      // expanding large subtrees
+      const Tree = this.state.preferences.classicTree ? ReactJsTree : VirtualTree;
       return (
         <div>
           <AwsIInventoryToolbar
@@ -40,8 +53,10 @@ export default class AwsIInventoryArea extends Component {
             onSearch={this.handleSearch}
             preferences={this.state.preferences}
           />
-          <ReactJsTree
+          <Tree
             treeConf={this.props.treeConf}
+            loadChildren={this.props.loadChildren}
+            searchIndex={this.props.searchIndex}
             searchString={this.state.searchString}
             preferences={this.state.preferences}
           />
@@ -55,5 +70,7 @@ export default class AwsIInventoryArea extends Component {
 }
 
 AwsIInventoryArea.propTypes = {
-  treeConf: PropTypes.object
+  treeConf: PropTypes.object,
+  loadChildren: PropTypes.func,
+  searchIndex: PropTypes.object
 };
\ No newline at end of file
@@ -18,6 +18,13 @@ export default class AwsIToolbar extends Component {
               {this.props.preferences.showExtraNodes ? <span><Glyphicon glyph="ok" /> </span>: null}
               Show extra nodes (metadata and empty)
             </MenuItem>
+            <MenuItem
+              eventKey="classicTree"
+              onSelect={this.props.onSelect}
+            >
+              {this.props.preferences.classicTree ? <span><Glyphicon glyph="ok" /> </span>: null}
+              Classic tree (slow for large inventories)
+            </MenuItem>
           </DropdownButton>
           <AwsISearch onChange={this.props.onSearch} />
         </ButtonGroup>
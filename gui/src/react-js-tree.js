@@ -75,6 +75,23 @@ export default class ReactJsTree extends Component {
   }
   
   renderJsTree(treeConf) {
+    const loadChildren = this.props.loadChildren;
+    if (loadChildren) {
+      /* nodes with "children: true" are loaded when they are first opened */
+      const nodes = treeConf.core.data;
+      const data = function (node, callback) {
+        if (node.id === '#') {
+          callback.call(this, nodes);
+        }
+        else {
+          loadChildren(node).then((children) => callback.call(this, children), (err) => {
+            console.log(`Unable to load children of "${node.text}": ${err}`);
+            callback.call(this, []);
+          });
+        }
+      };
+      treeConf = {...treeConf, core: {...treeConf.core, data: data}};
+    }
     this.$el.on('open_node.jstree', this.handleOpenNode).on('ready.jstree', (evt, data) => {
       this.setState({ready: true});
     }).jstree(treeConf);
@@ -101,5 +118,6 @@ export default class ReactJsTree extends Component {
 
 ReactJsTree.propTypes = {
   treeConf: PropTypes.object,
+  loadChildren: PropTypes.func,
   preferences: PropTypes.object
 };
\ No newline at end of file
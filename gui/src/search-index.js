@@ -0,0 +1,77 @@
+import { searchWorker } from './search-worker';
+
+
+/*
+Search the data in a Web Worker, so typing in the search box never waits for a search. The worker
+is started from a blob of its source, since the GUI is opened from file:// and cannot load worker
+scripts from there.
+*/
+
+const SEARCH_INDEX_FORMAT = '"format": "aws-inventory-search-index"';
+
+export function isSearchIndexFile(file) {
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve(reader.result.indexOf(SEARCH_INDEX_FORMAT) !== -1);
+    reader.onerror = () => reject(reader.error);
+    reader.readAsText(file.slice(0, 256));
+  });
+}
+
+export default class SearchIndex {
+  constructor(dataFile, indexFile, chunked) {
+    /*
+    dataFile: data file the GUI opened
+    indexFile: search index written next to it, if selected. Otherwise, the worker builds the index
+      from the data file.
+    chunked: whether the data file is in the chunked format
+    */
+    this.pending = new Map();  // id -> {resolve, reject}
+    this.nextId = 0;
+    this.url = URL.createObjectURL(new Blob([`(${searchWorker.toString()})();`], {type: 'application/javascript'}));
+    this.worker = new Worker(this.url);
+    this.worker.onmessage = this.handleMessage;
+    this.worker.postMessage({type: 'load', dataFile: dataFile, indexFile: indexFile, chunked: chunked});
+  }
+
+  search(query) {
+    /* resolves with {paths, truncated}: paths of matching nodes, at most 1000 */
+
+    return new Promise((resolve, reject) => {
+      const id = this.nextId++;
+      this.pending.set(id, {resolve: resolve, reject: reject});
+      this.worker.postMessage({type: 'search', id: id, query: query});
+    });
+  }
+
+  handleMessage = (evt) => {
+    const message = evt.data;
+    switch (message.type) {
+      case 'ready':
+        console.log(`Search index of ${message.nodes} nodes ready.`);
+        break;
+      case 'results':
+        this.pending.get(message.id).resolve({paths: message.paths, truncated: message.truncated});
+        this.pending.delete(message.id);
+        break;
+      case 'error':
+        if (this.pending.has(message.id)) {
+          this.pending.get(message.id).reject(new Error(message.message));
+          this.pending.delete(message.id);
+        }
+        else {
+          console.log(`Unable to load search index: ${message.message}`);
+        }
+        break;
+      default:
+        console.log(`Unrecognized message "${message.type}" from search worker.`);
+    }
+  };
+
+  terminate() {
+    this.worker.terminate();
+    URL.revokeObjectURL(this.url);
+    this.pending.forEach((callbacks) => callbacks.reject(new Error('Search index closed')));
+    this.pending.clear();
+  }
+}
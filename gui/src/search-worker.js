@@ -0,0 +1,299 @@
+/* eslint-disable no-restricted-globals */
+/* global FileReaderSync */
+
+/*
+Body of the search Web Worker. It runs from the source of this function (see search-index.js), so
+it must not refer to anything outside of it, including helpers Babel adds for newer syntax.
+
+The worker loads the search index written next to the data file (see aws_inventory/search_index.py),
+or builds the same index from the data file itself when there is none, then answers queries with
+the paths of the matching nodes. A path is the position of each node from the root down.
+*/
+export function searchWorker() {
+  var MAX_TOKEN_LENGTH = 64;
+  // runs of anything but ASCII punctuation and whitespace, as aws_inventory/search_index.py
+  var TOKEN_RE = new RegExp('[^\\s!-/:-@\\[-`{-~]{1,' + MAX_TOKEN_LENGTH + '}', 'g');
+  var SCOPE_RE = /^(service|region|operation):(.+)$/i;
+  var SCOPES = ['service', 'region', 'operation'];
+  // name of the region of global services, whose node text is null, as aws_inventory/search_index.py
+  var GLOBAL_REGION_NAME = 'global';
+  var MAX_RESULTS = 1000;
+
+  var index = null;
+
+  function getOwn(obj, key) {
+    // not inherited properties, since keys are tokens and names (e.g., "constructor")
+    return Object.prototype.hasOwnProperty.call(obj, key) ? obj[key] : undefined;
+  }
+
+  function tokenize(text) {
+    return String(text).toLowerCase().match(TOKEN_RE) || [];
+  }
+
+  function readText(file, chunk) {
+    var reader = new FileReaderSync();
+    return reader.readAsText(chunk ? file.slice(chunk[0], chunk[0] + chunk[1]) : file);
+  }
+
+  function loadIndex(file) {
+    /* the file has parents as distances back and postings as differences */
+
+    var raw = JSON.parse(readText(file));
+    var parents = new Int32Array(raw.parents.length);
+    for (var i = 0; i < parents.length; i++) {
+      parents[i] = raw.parents[i] ? i - raw.parents[i] : -1;
+    }
+    return {
+      parents: parents,
+      positions: raw.positions,
+      scopes: raw.scopes,
+      tokens: raw.tokens,
+      differences: true,
+      sortedTokens: null
+    };
+  }
+
+  function buildIndex(file, chunked) {
+    /* index the nodes of the data file as aws_inventory/search_index.py does */
+
+    var roots;
+    if (chunked) {
+      var edge = readText(file, [Math.max(0, file.size - 256), 256]).split('\n').filter(function (line) {
+        return line;
+      });
+      roots = JSON.parse(readText(file, JSON.parse(edge[edge.length - 1]).manifest)).responses;
+    }
+    else {
+      roots = JSON.parse(readText(file)).responses;
+    }
+    var parents = [];
+    var positions = [];
+    var scopes = {service: {}, region: {}, operation: {}};
+    var tokens = Object.create(null);
+    var stack = [];
+    for (var i = roots.length - 1; i >= 0; i--) {
+      stack.push({node: roots[i], parent: -1, position: i, depth: 0});
+    }
+    while (stack.length) {
+      var entry = stack.pop();
+      var node = entry.node;
+      if (node.type === 'response_metadata') {
+        continue;
+      }
+      var number = parents.length;
+      parents.push(entry.parent);
+      positions.push(entry.position);
+      if (entry.depth > 0) {
+        var seen = Object.create(null);
+        var nodeTokens = tokenize(node.text);
+        for (var j = 0; j < nodeTokens.length; j++) {
+          var token = nodeTokens[j];
+          if (!seen[token]) {
+            seen[token] = true;
+            (tokens[token] || (tokens[token] = [])).push(number);  // tokens has no prototype
+          }
+        }
+        var scope = SCOPES[entry.depth - 1];
+        if (scope && (scope !== 'operation' || node.children)) {
+          // without the number of non-empty responses
+          var name = node.text === null ? GLOBAL_REGION_NAME :
+            String(node.text).replace(/ \(\d+\)$/, '').toLowerCase();
+          (getOwn(scopes[scope], name) || (scopes[scope][name] = [])).push(number);
+        }
+      }
+      var children = node.children;
+      if (children === true && node.data && node.data.chunk) {
+        // read the chunk only to index it
+        children = JSON.parse(readText(file, node.data.chunk));
+      }
+      if (Array.isArray(children)) {
+        for (var k = children.length - 1; k >= 0; k--) {
+          stack.push({node: children[k], parent: number, position: k, depth: entry.depth + 1});
+        }
+      }
+    }
+    return {
+      parents: parents,
+      positions: positions,
+      scopes: scopes,
+      tokens: tokens,
+      differences: false,
+      sortedTokens: null
+    };
+  }
+
+  function getPostings(token) {
+    /* ascending numbers of the nodes with the token */
+
+    var nodes = getOwn(index.tokens, token);
+    if (!nodes) {
+      return [];
+    }
+    if (index.differences && !nodes.decoded) {
+      for (var i = 1; i < nodes.length; i++) {
+        nodes[i] += nodes[i - 1];
+      }
+      nodes.decoded = true;
+    }
+    return nodes;
+  }
+
+  function getPrefixPostings(prefix) {
+    /* nodes with any token starting with the prefix */
+
+    if (!index.sortedTokens) {
+      index.sortedTokens = Object.keys(index.tokens).sort();
+    }
+    var sorted = index.sortedTokens;
+    var low = 0;
+    var high = sorted.length;
+    while (low < high) {
+      var middle = (low + high) >> 1;
+      if (sorted[middle] < prefix) {
+        low = middle + 1;
+      }
+      else {
+        high = middle;
+      }
+    }
+    var found = [];
+    for (var i = low; i < sorted.length && sorted[i].lastIndexOf(prefix, 0) === 0; i++) {
+      var nodes = getPostings(sorted[i]);
+      for (var j = 0; j < nodes.length; j++) {
+        found.push(nodes[j]);
+      }
+    }
+    found.sort(function (a, b) {
+      return a - b;
+    });
+    return found.filter(function (node, i) {
+      return i === 0 || node !== found[i - 1];
+    });
+  }
+
+  function intersect(a, b) {
+    var both = [];
+    var i = 0;
+    var j = 0;
+    while (i < a.length && j < b.length) {
+      if (a[i] < b[j]) {
+        i++;
+      }
+      else if (a[i] > b[j]) {
+        j++;
+      }
+      else {
+        both.push(a[i]);
+        i++;
+        j++;
+      }
+    }
+    return both;
+  }
+
+  function parseQuery(query) {
+    /* "service:ec2 region:us-east-1 vpc-12" -> scopes and tokens. The last token may be
+    incomplete while typing, so it matches as a prefix unless the query ends with a space. */
+
+    var scopes = {};
+    var tokens = [];
+    var terms = query.trim().split(/\s+/);
+    var prefix = !/\s$/.test(query);
+    for (var i = 0; i < terms.length; i++) {
+      var match = SCOPE_RE.exec(terms[i]);
+      if (match) {
+        scopes[match[1].toLowerCase()] = match[2].toLowerCase();
+        if (i === terms.length - 1) {
+          prefix = false;
+        }
+      }
+      else {
+        tokens.push.apply(tokens, tokenize(terms[i]));
+      }
+    }
+    return {scopes: scopes, tokens: tokens, prefix: prefix};
+  }
+
+  function isInScope(node, scopeNodes) {
+    /* whether the node or one of its ancestors is in each scope */
+
+    for (var i = 0; i < scopeNodes.length; i++) {
+      var ancestor = node;
+      while (ancestor !== -1 && !scopeNodes[i][ancestor]) {
+        ancestor = index.parents[ancestor];
+      }
+      if (ancestor === -1) {
+        return false;
+      }
+    }
+    return true;
+  }
+
+  function getPath(node) {
+    var path = [];
+    for (; node !== -1; node = index.parents[node]) {
+      path.push(index.positions[node]);
+    }
+    return path.reverse();
+  }
+
+  function search(query) {
+    var parsed = parseQuery(query);
+    var candidates = null;
+    for (var i = 0; i < parsed.tokens.length && (!candidates || candidates.length); i++) {
+      var last = i === parsed.tokens.length - 1;
+      var postings = last && parsed.prefix ? getPrefixPostings(parsed.tokens[i]) : getPostings(parsed.tokens[i]);
+      candidates = candidates ? intersect(candidates, postings) : postings;
+    }
+
+    var scopeNodes = [];
+    for (var j = 0; j < SCOPES.length; j++) {
+      var name = parsed.scopes[SCOPES[j]];
+      if (name !== undefined) {
+        var nodes = getOwn(index.scopes[SCOPES[j]], name) || [];
+        var set = Object.create(null);
+        for (var k = 0; k < nodes.length; k++) {
+          set[nodes[k]] = true;
+        }
+        scopeNodes.push(set);
+        if (!parsed.tokens.length) {
+          // only scopes: the nodes of the narrowest one
+          candidates = nodes;
+        }
+      }
+    }
+
+    var paths = [];
+    var truncated = false;
+    for (var n = 0; candidates && n < candidates.length; n++) {
+      if (isInScope(candidates[n], scopeNodes)) {
+        if (paths.length === MAX_RESULTS) {
+          truncated = true;
+          break;
+        }
+        paths.push(getPath(candidates[n]));
+      }
+    }
+    return {paths: paths, truncated: truncated};
+  }
+
+  self.onmessage = function (evt) {
+    var message = evt.data;
+    try {
+      if (message.type === 'load') {
+        index = message.indexFile ? loadIndex(message.indexFile) : buildIndex(message.dataFile, message.chunked);
+        self.postMessage({type: 'ready', nodes: index.parents.length});
+      }
+      else if (message.type === 'search') {
+        if (!index) {
+          throw new Error('No search index');
+        }
+        var results = search(message.query);
+        self.postMessage({type: 'results', id: message.id, paths: results.paths, truncated: results.truncated});
+      }
+    }
+    catch (err) {
+      self.postMessage({type: 'error', id: message.id, message: String(err)});
+    }
+  };
+}
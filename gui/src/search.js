@@ -15,7 +15,7 @@ export default class AwsISearch extends Component {
       <InputGroup>
         <FormControl
           type="text"
-          placeholder="Search"
+          placeholder="Search, e.g. service:ec2 region:us-east-1 sg-"
           inputRef={input => this.inputRef = input}
           onChange={this.props.onChange}
         />
@@ -0,0 +1,484 @@
+import PropTypes from 'prop-types';
+import React, { Component } from 'react';
+import { Glyphicon, MenuItem } from 'react-bootstrap';
+
+
+/*
+Tree view which only creates DOM elements for the rows in view, so expanding a subtree of any size
+is cheap. It takes the same configuration and data as jsTree. The open state of nodes is kept
+outside the data, and the visible rows are a flat list rebuilt when nodes are opened or closed.
+*/
+
+const ROW_HEIGHT = 24;  // pixels
+const INDENT = 24;  // pixels per level
+const OVERSCAN = 20;  // rows rendered above and below the viewport
+const DEFAULT_ICON = 'glyphicon glyphicon-folder-close';
+
+function hasChildren(node) {
+  // "children: true" means the children are loaded when the node is opened
+  return node.children === true || (Array.isArray(node.children) && node.children.length > 0);
+}
+
+function getChildren(node) {
+  return Array.isArray(node.children) ? node.children : [];
+}
+
+function pushAll(stack, nodes) {
+  // not stack.push(...nodes), which fails for very many nodes
+  for (let i = 0; i < nodes.length; i++) {
+    stack.push(nodes[i]);
+  }
+}
+
+function getType(node) {
+  /* nodes without children are leaves, except response metadata, as in ReactJsTree */
+
+  if (node.type === 'response_metadata') {
+    return node.type;
+  }
+  return hasChildren(node) ? node.type || 'default' : 'leaf';
+}
+
+export default class VirtualTree extends Component {
+  constructor(props) {
+    super(props);
+    this.state = {
+      rows: [],
+      scrollTop: 0,
+      viewHeight: 0,
+      focused: undefined,
+      contextMenu: undefined
+    };
+
+    this.opened = new Set();
+    this.loading = new Map();  // node -> promise of loading its children
+    this.matches = new Set();
+    this.parents = new Map();  // node -> parent, for nodes which have been shown
+
+    // context menu items of the jsTree configuration, by key
+    this.actions = {
+      toggle_siblings: this.toggleChildren,
+      toggle_children: this.toggleDescendants
+    };
+  }
+
+  componentDidMount() {
+    /* open what the data says is opened, as jsTree does */
+
+    const stack = [];
+    pushAll(stack, this.props.treeConf.core.data);
+    while (stack.length) {
+      const node = stack.pop();
+      if (node.state && node.state.opened && hasChildren(node)) {
+        this.opened.add(node);
+        pushAll(stack, getChildren(node));
+      }
+    }
+    if (this.props.searchString) {
+      this.search(this.props.searchString);
+    }
+    else {
+      this.updateRows();
+    }
+    this.handleResize();
+    window.addEventListener('resize', this.handleResize);
+    document.addEventListener('mousedown', this.handleDocumentMouseDown);
+  }
+
+  componentDidUpdate(prevProps) {
+    if (this.props.searchString !== prevProps.searchString) {
+      this.search(this.props.searchString);
+    }
+    else if (this.props.preferences.showExtraNodes !== prevProps.preferences.showExtraNodes) {
+      this.updateRows();
+    }
+  }
+
+  componentWillUnmount() {
+    window.removeEventListener('resize', this.handleResize);
+    document.removeEventListener('mousedown', this.handleDocumentMouseDown);
+  }
+
+  isShown(node) {
+    if (this.props.preferences.showExtraNodes) {
+      return true;
+    }
+    return !(node.state && node.state.hidden) && node.type !== 'response_metadata';
+  }
+
+  updateRows() {
+    /* flatten the opened part of the tree into the rows to show */
+
+    const rows = [];
+    const stack = [];
+    const roots = this.props.treeConf.core.data;
+    for (let i = roots.length - 1; i >= 0; i--) {
+      stack.push({node: roots[i], depth: 0});
+    }
+    while (stack.length) {
+      const row = stack.pop();
+      if (!this.isShown(row.node)) {
+        continue;
+      }
+      rows.push(row);
+      if (this.opened.has(row.node)) {
+        const children = getChildren(row.node);
+        for (let i = children.length - 1; i >= 0; i--) {
+          this.parents.set(children[i], row.node);
+          stack.push({node: children[i], depth: row.depth + 1});
+        }
+      }
+    }
+    this.setState({rows: rows});
+  }
+
+  load(node) {
+    /* resolve once the children of the node are loaded */
+
+    if (node.children !== true) {
+      return Promise.resolve();
+    }
+    if (!this.props.loadChildren) {
+      node.children = [];
+      return Promise.resolve();
+    }
+    if (!this.loading.has(node)) {
+      this.loading.set(node, this.props.loadChildren(node).then((children) => {
+        node.children = children;
+      }, (err) => {
+        console.log(`Unable to load children of "${node.text}": ${err}`);
+        node.children = [];
+      }).then(() => {
+        this.loading.delete(node);
+      }));
+      this.setState({rows: this.state.rows});
+    }
+    return this.loading.get(node);
+  }
+
+  open(node) {
+    return this.load(node).then(() => {
+      if (hasChildren(node)) {
+        this.opened.add(node);
+      }
+      this.updateRows();
+    });
+  }
+
+  close(node) {
+    this.opened.delete(node);
+    this.updateRows();
+  }
+
+  toggle(node) {
+    if (this.opened.has(node)) {
+      this.close(node);
+      return Promise.resolve();
+    }
+    return this.open(node);
+  }
+
+  openAll(node) {
+    /* open the node and all of its descendants, loading them where needed */
+
+    const pending = [];
+    const stack = [node];
+    while (stack.length) {
+      const descendant = stack.pop();
+      if (descendant.children === true) {
+        pending.push(this.load(descendant).then(() => this.openAll(descendant)));
+      }
+      else if (hasChildren(descendant)) {
+        this.opened.add(descendant);
+        pushAll(stack, getChildren(descendant));
+      }
+    }
+    this.updateRows();
+    return Promise.all(pending);
+  }
+
+  closeAll(node) {
+    const stack = [node];
+    while (stack.length) {
+      const descendant = stack.pop();
+      this.opened.delete(descendant);
+      pushAll(stack, getChildren(descendant));
+    }
+    this.updateRows();
+  }
+
+  toggleChildren = (node) => {
+    return this.open(node).then(() => Promise.all(getChildren(node).map((child) => this.toggle(child))));
+  };
+
+  toggleDescendants = (node) => {
+    if (this.opened.has(node)) {
+      this.closeAll(node);
+      return Promise.resolve();
+    }
+    return this.openAll(node);
+  };
+
+  search(searchString) {
+    /* mark the nodes found, and open their ancestors */
+
+    if (searchString && this.props.searchIndex) {
+      this.props.searchIndex.search(searchString).then((results) => {
+        // unless the search string changed while searching
+        if (searchString === this.props.searchString) {
+          if (results.truncated) {
+            console.log(`Showing the first ${results.paths.length} nodes found.`);
+          }
+          return this.showPaths(results.paths);
+        }
+      }, (err) => {
+        console.log(`Unable to use search index: ${err}`);
+        this.scan(searchString);
+      });
+    }
+    else {
+      this.scan(searchString);
+    }
+  }
+
+  showPaths(paths) {
+    /* mark the nodes at paths from the root, loading any which are not loaded yet */
+
+    const nodes = paths.map((path) => path.slice(1).reduce(
+      // a node is missing if the index is not of this data file
+      (promise, position) => promise.then((node) => node && this.load(node).then(() => {
+        const child = getChildren(node)[position];
+        this.parents.set(child, node);
+        return child;
+      })),
+      Promise.resolve(this.props.treeConf.core.data[path[0]])
+    ));
+    return Promise.all(nodes).then((found) => {
+      this.matches = new Set(found.filter((node) => node));
+      this.openAncestors();
+    });
+  }
+
+  openAncestors() {
+    this.matches.forEach((node) => {
+      for (let parent = this.parents.get(node); parent; parent = this.parents.get(parent)) {
+        this.opened.add(parent);
+      }
+    });
+    this.updateRows();
+  }
+
+  scan(searchString) {
+    /* mark nodes whose text contains the search string, visiting every loaded node */
+
+    this.matches = new Set();
+    if (searchString) {
+      const needle = searchString.toLowerCase();
+      const stack = [];
+      pushAll(stack, this.props.treeConf.core.data);
+      while (stack.length) {
+        const node = stack.pop();
+        if (String(node.text).toLowerCase().includes(needle)) {
+          this.matches.add(node);
+        }
+        const children = getChildren(node);
+        for (let i = 0; i < children.length; i++) {
+          this.parents.set(children[i], node);
+          stack.push(children[i]);
+        }
+      }
+    }
+    this.openAncestors();
+  }
+
+  focus(index) {
+    /* focus a row, scrolling it into view */
+
+    const rows = this.state.rows;
+    if (!rows.length) {
+      return;
+    }
+    index = Math.max(0, Math.min(rows.length - 1, index));
+    const top = index * ROW_HEIGHT;
+    if (top < this.el.scrollTop) {
+      this.el.scrollTop = top;
+    }
+    else if (top + ROW_HEIGHT > this.el.scrollTop + this.el.clientHeight) {
+      this.el.scrollTop = top + ROW_HEIGHT - this.el.clientHeight;
+    }
+    this.setState({focused: rows[index].node});
+  }
+
+  handleResize = () => {
+    this.setState({viewHeight: this.el.clientHeight});
+  };
+
+  handleScroll = () => {
+    this.setState({scrollTop: this.el.scrollTop});
+  };
+
+  handleKeyDown = (evt) => {
+    const rows = this.state.rows;
+    const focused = this.state.focused;
+    const index = focused === undefined ? -1 : rows.findIndex((row) => row.node === focused);
+    switch (evt.key) {
+      case 'ArrowDown':
+        this.focus(index + 1);
+        break;
+      case 'ArrowUp':
+        this.focus(index - 1);
+        break;
+      case 'ArrowRight':
+        if (index >= 0 && hasChildren(focused)) {
+          if (this.opened.has(focused)) {
+            this.focus(index + 1);
+          }
+          else {
+            this.open(focused);
+          }
+        }
+        break;
+      case 'ArrowLeft':
+        if (index >= 0) {
+          if (this.opened.has(focused)) {
+            this.close(focused);
+          }
+          else if (this.parents.has(focused)) {
+            const parent = this.parents.get(focused);
+            this.focus(rows.findIndex((row) => row.node === parent));
+          }
+        }
+        break;
+      case 'Home':
+        this.focus(0);
+        break;
+      case 'End':
+        this.focus(rows.length - 1);
+        break;
+      case 'Enter':
+        if (index >= 0) {
+          this.toggle(focused);
+        }
+        break;
+      case 'Escape':
+        this.setState({contextMenu: undefined});
+        break;
+      default:
+        return;
+    }
+    evt.preventDefault();
+  };
+
+  handleDocumentMouseDown = (evt) => {
+    if (this.state.contextMenu && !(this.menuEl && this.menuEl.contains(evt.target))) {
+      this.setState({contextMenu: undefined});
+    }
+  };
+
+  handleContextMenu(evt, node) {
+    evt.preventDefault();
+    this.setState({focused: node, contextMenu: {node: node, x: evt.clientX, y: evt.clientY}});
+  }
+
+  handleMenuSelect = (key) => {
+    const node = this.state.contextMenu.node;
+    this.setState({contextMenu: undefined});
+    this.actions[key](node);
+  };
+
+  renderRow(row, index) {
+    const node = row.node;
+    const typeConf = this.props.treeConf.types[getType(node)] || {};
+    let toggle = null;
+    if (this.loading.has(node)) {
+      toggle = <Glyphicon glyph="refresh" />;
+    }
+    else if (hasChildren(node)) {
+      toggle = (
+        <Glyphicon
+          glyph={this.opened.has(node) ? 'triangle-bottom' : 'triangle-right'}
+          onClick={() => this.toggle(node)}
+        />
+      );
+    }
+    let className = 'virtual-tree-row';
+    if (node === this.state.focused) {
+      className += ' virtual-tree-focused';
+    }
+    return (
+      <div
+        key={index}
+        className={className}
+        style={{top: index * ROW_HEIGHT, height: ROW_HEIGHT, lineHeight: `${ROW_HEIGHT}px`, paddingLeft: row.depth * INDENT}}
+        onClick={() => this.setState({focused: node})}
+        onDoubleClick={() => this.toggle(node)}
+        onContextMenu={(evt) => this.handleContextMenu(evt, node)}
+      >
+        <span className="virtual-tree-toggle">{toggle}</span>
+        <span className={`virtual-tree-icon ${typeConf.icon || DEFAULT_ICON}`} />
+        <span
+          className={this.matches.has(node) ? 'virtual-tree-search' : undefined}
+          title={node.a_attr && node.a_attr.title}
+        >
+          {node.text}
+        </span>
+      </div>
+    );
+  }
+
+  renderContextMenu() {
+    const contextMenu = this.state.contextMenu;
+    if (!contextMenu) {
+      return null;
+    }
+    const items = this.props.treeConf.contextmenu.items;
+    const menuItems = [];
+    Object.keys(items).forEach((key) => {
+      menuItems.push(<MenuItem key={key} eventKey={key} onSelect={this.handleMenuSelect}>{items[key].label}</MenuItem>);
+      if (items[key].separator_after) {
+        menuItems.push(<MenuItem key={`${key}_separator`} divider />);
+      }
+    });
+    return (
+      <ul
+        ref={el => this.menuEl = el}
+        className="dropdown-menu"
+        style={{display: 'block', position: 'fixed', left: contextMenu.x, top: contextMenu.y}}
+      >
+        {menuItems}
+      </ul>
+    );
+  }
+
+  render() {
+    const rows = this.state.rows;
+    const first = Math.max(0, Math.floor(this.state.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const last = Math.min(rows.length, Math.ceil((this.state.scrollTop + this.state.viewHeight) / ROW_HEIGHT) + OVERSCAN);
+    const rendered = [];
+    for (let i = first; i < last; i++) {
+      rendered.push(this.renderRow(rows[i], i));
+    }
+    return (
+      <div
+        ref={el => this.el = el}
+        className="virtual-tree"
+        tabIndex={0}
+        onScroll={this.handleScroll}
+        onKeyDown={this.handleKeyDown}
+      >
+        <div style={{position: 'relative', height: rows.length * ROW_HEIGHT}}>
+          {rendered}
+        </div>
+        {this.renderContextMenu()}
+      </div>
+    );
+  }
+}
+
+VirtualTree.propTypes = {
+  treeConf: PropTypes.object,
+  loadChildren: PropTypes.func,
+  searchIndex: PropTypes.object,
+  searchString: PropTypes.string,
+  preferences: PropTypes.object
+};
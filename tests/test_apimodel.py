@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import aws_inventory.apimodel
+import aws_inventory.config
+
+
+TEST_API_MODEL = {'test-service': {'regions': frozenset(['test-region']), 'ops': ['ListThings']}}
+
+class TestApiModelCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.build_count = 0
+        self._build = aws_inventory.apimodel._build
+
+        def build(boto_session, svc_names):
+            self.build_count += 1
+            return TEST_API_MODEL
+        aws_inventory.apimodel._build = build
+
+    def tearDown(self):
+        aws_inventory.apimodel._build = self._build
+        shutil.rmtree(self.cache_dir)
+
+    def test_model_is_built_once(self):
+        self.assertEqual(aws_inventory.apimodel.build_api_model(self.cache_dir), TEST_API_MODEL)
+        self.assertEqual(aws_inventory.apimodel.build_api_model(self.cache_dir), TEST_API_MODEL)
+        self.assertEqual(self.build_count, 1)
+
+    def test_stale_model_is_removed(self):
+        other_file, stale_file = [
+            os.path.join(self.cache_dir,
+                         aws_inventory.config.API_MODEL_CACHE_FILENAME_TEMPLATE.substitute(key=key))
+            for key in ('other', 'stale')
+        ]
+        open(other_file, 'wb').close()
+        open(stale_file, 'wb').close()
+        last_used = time.time() - aws_inventory.config.API_MODEL_CACHE_TTL - 1
+        os.utime(stale_file, (last_used, last_used))
+        aws_inventory.apimodel.build_api_model(self.cache_dir)
+        # a model for other inputs (e.g., another botocore version) may still be used
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+        self.assertTrue(os.path.exists(other_file))
+        self.assertFalse(os.path.exists(stale_file))
+
+    def test_no_cache(self):
+        aws_inventory.apimodel.build_api_model(None)
+        aws_inventory.apimodel.build_api_model(None)
+        self.assertEqual(self.build_count, 2)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+if __name__ == '__main__':
+    unittest.main()
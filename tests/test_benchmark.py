@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import aws_inventory.clients
+import aws_inventory.store
+from tools import benchmark
+from tools import benchmark_store
+from tools import stub_aws
+from tools import synthetic_inventory
+
+
+class TestStubAws(unittest.TestCase):
+    def setUp(self):
+        self.data_path = os.environ.get('AWS_DATA_PATH')
+        self.work_dir = tempfile.mkdtemp()
+        self.services = stub_aws.write_models(self.work_dir, 1, 2)
+        os.environ['AWS_DATA_PATH'] = self.work_dir
+        self.stub = stub_aws.StubAws(pages=3, items_per_page=2)
+        self.endpoint_url = self.stub.start()
+
+    def tearDown(self):
+        self.stub.stop()
+        shutil.rmtree(self.work_dir)
+        if self.data_path is None:
+            os.environ.pop('AWS_DATA_PATH', None)
+        else:
+            os.environ['AWS_DATA_PATH'] = self.data_path
+
+    def test_pagination(self):
+        factory = aws_inventory.clients.ClientFactory(benchmark.CREDENTIALS, None, self.endpoint_url)
+        client = factory.get_client('benchsvc000', 'bench-region-0')
+        pages = list(client.get_paginator('list_things0').paginate())
+        self.assertEqual(len(pages), 3)
+        response = client.get_paginator('list_things0').paginate().build_full_result()
+        self.assertEqual([thing['ThingId'] for thing in response['Things']],
+                         ['listthings0-{:08d}'.format(i) for i in range(6)])
+        self.assertEqual(len(response['Things'][0]['Payload']), self.stub.item_bytes)
+        self.assertEqual(self.stub.get_stats()['requests'], 6)
+
+    def test_errors_are_the_same_for_every_run(self):
+        denied = [stub_aws._fraction('benchsvc000', region, 'ListThings0') < 0.5
+                  for region in stub_aws.get_region_names(20)]
+        self.assertTrue(any(denied) and not all(denied))
+        stub = stub_aws.StubAws(error_rate=0.5)
+        self.assertEqual(stub.answer('benchsvc000', 'bench-region-0', 'ListThings0', {})[0],
+                         400 if denied[0] else 200)
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.data_path = os.environ.get('AWS_DATA_PATH')
+
+    def tearDown(self):
+        if self.data_path is None:
+            os.environ.pop('AWS_DATA_PATH', None)
+        else:
+            os.environ['AWS_DATA_PATH'] = self.data_path
+
+    def test_run(self):
+        args = benchmark.parse_args(['--services', '2',
+                                     '--regions', '2',
+                                     '--ops', '3',
+                                     '--latency', '0',
+                                     '--pages', '2'])
+        results = benchmark.run(args)
+        self.assertEqual(results['operations'], 12)
+        # two pages for each of the 8 paginated operations, and one for the rest
+        self.assertEqual(results['requests'], 8 * 2 + 4)
+        self.assertTrue(results['output_bytes'] > 0)
+        self.assertTrue(results['peak_rss_mb'] > 0)
+
+class TestSyntheticInventory(unittest.TestCase):
+    def test_responses(self):
+        responses = list(synthetic_inventory.iter_responses(1000, regions=('us-east-1', 'eu-west-1')))
+        self.assertEqual(responses, list(synthetic_inventory.iter_responses(
+            1000, regions=('us-east-1', 'eu-west-1'))))
+        resource_count = 0
+        for service, region, svc_op, resp in responses:
+            list_key = [key for key in resp if key != 'ResponseMetadata'][0]
+            resource_count += len(resp[list_key])
+        self.assertEqual(resource_count, 1000)
+        self.assertEqual(len(responses), 2 * (len(synthetic_inventory.RESOURCE_KINDS) +
+                                              len(synthetic_inventory.EMPTY_OPERATIONS)))
+
+    def test_binary_values_serialize(self):
+        storage = aws_inventory.store.ResultStore('default')
+        synthetic_inventory.populate_store(storage, 100, regions=('us-east-1',))
+        public_key = storage.get_response('cloudtrail', 'us-east-1', 'ListPublicKeys')
+        self.assertTrue(public_key['PublicKeyList'])
+        self.assertIn('"PublicKeyList"', storage.get_response_store())
+
+class TestStoreBenchmark(unittest.TestCase):
+    def test_run_scale(self):
+        results = benchmark_store.run_scale(200)
+        self.assertEqual([result['step'] for result in results],
+                         ['populate', 'gui_data', 'response_store', 'response_dump', 'gui_load',
+                          'gui_chunked', 'gui_chunked_open', 'search_index', 'indexed_dump',
+                          'indexed_get', 'sqlite', 'sqlite_lookup'])
+        self.assertTrue(all(result['bytes'] > 0 for result in results[1:4]))
+
+if __name__ == '__main__':
+    unittest.main()
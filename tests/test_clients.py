@@ -0,0 +1,68 @@
+import os
+import threading
+import unittest
+
+import botocore.config
+
+import aws_inventory.clients
+import aws_inventory.config
+
+
+TEST_CREDENTIALS = {'AccessKeyId': 'test_access_key_id',
+                    'SecretAccessKey': 'test_secret_access_key',
+                    'SessionToken': None}
+
+class TestClientFactory(unittest.TestCase):
+    def setUp(self):
+        self.default_region = os.environ.pop('AWS_DEFAULT_REGION', None)
+        self.factory = aws_inventory.clients.ClientFactory(TEST_CREDENTIALS,
+                                                           botocore.config.Config())
+
+    def tearDown(self):
+        self.factory.close()
+        if self.default_region:
+            os.environ['AWS_DEFAULT_REGION'] = self.default_region
+
+    def test_clients_are_reused(self):
+        clients = []
+
+        def get_client():
+            clients.append(self.factory.get_client('sqs', 'us-east-1'))
+        threads = [threading.Thread(target=get_client) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(client) for client in clients)), 1)
+        self.assertIsNot(self.factory.get_client('sqs', 'us-west-2'), clients[0])
+        other_credentials = dict(TEST_CREDENTIALS, AccessKeyId='other_access_key_id')
+        self.assertIsNot(self.factory.get_client('sqs', 'us-east-1', other_credentials), clients[0])
+
+    def test_default_region(self):
+        client = self.factory.get_client('sqs', None)
+        self.assertEqual(client.meta.region_name, aws_inventory.config.DEFAULT_REGION)
+        self.assertIn('sqs', self.factory._default_region_services)
+
+    def test_warm_up(self):
+        keys = [('sqs', 'us-east-1'), ('sns', 'us-east-1')]
+        self.factory.warm_up(keys)
+        self.factory._warm_up_pool.join()
+        self.assertEqual(sorted(key[:2] for key in self.factory._clients), sorted(keys))
+
+    def test_warm_up_threads(self):
+        factory = aws_inventory.clients.ClientFactory(TEST_CREDENTIALS, botocore.config.Config(),
+                                                      max_threads=1)
+        factory.warm_up([('sqs', 'us-east-1'), ('sns', 'us-east-1')])
+        factory._warm_up_pool.join()
+        # as many threads as the workers invoking APIs, at most
+        self.assertEqual(factory._warm_up_pool._processes, 1)
+
+    def test_endpoint_url(self):
+        factory = aws_inventory.clients.ClientFactory(TEST_CREDENTIALS,
+                                                      botocore.config.Config(),
+                                                      endpoint_url='http://localhost:8080')
+        self.assertEqual(factory.get_client('sqs', 'us-east-1').meta.endpoint_url,
+                         'http://localhost:8080')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,21 @@
+import datetime
+import json
 import os
+import pickle
+import shutil
+import sys
+import tempfile
 import unittest
 from StringIO import StringIO
 
+import jmespath
+
+import aws_inventory.config
+import aws_inventory.dumpfile
 import aws_inventory.invoker
+import aws_inventory.segments
+import aws_inventory.store
+from tools import synthetic_inventory
 
 
 TEST_RESPONSE_STORE = {
@@ -34,15 +47,99 @@ for i in range(3, 103):
 
 TEST_EXCEPTION_STORE = {'test-service': {'test-operation1': {'test-region': 'exception'}}}
 
+# the GUI data file as it was built before nodes were streamed, to check the output is unchanged
+def reference_build_children(obj):
+    children = []
+    if isinstance(obj, dict):
+        for key, val in obj.items():
+            child = reference_build_children(val)
+            if isinstance(child, (dict, list, tuple)) and child:
+                children.append({'text': key, 'children': child})
+            else:
+                # leaf node
+                try:
+                    children.append({'text': u'{} = {}'.format(key, val)})
+                except UnicodeDecodeError:
+                    # key or value is probably binary. For example, CloudTrail API ListPublicKeys
+                    children.append({'text': u'{} = {!r}'.format(key, val)})
+    elif isinstance(obj, (list, tuple)):
+        for i, val in enumerate(obj):
+            child = reference_build_children(val)
+            if isinstance(child, (dict, list, tuple)) and child:
+                children.append({'text': '[{:d}]'.format(i), 'children': child})
+            else:
+                # leaf node
+                children.append({'text': child})
+    else:
+        return obj
+    return children
+
+def reference_build_service_node(service, svc_store):
+    """Build the jsTree node of a service.
+
+    :param str service: service name
+    :param dict svc_store: responses of the service, {region: {svc_op: response}}
+    :rtype: dict
+    :return: service node
+    """
+    service = reference_build_children({service: svc_store})[0]
+
+    # assign types to nodes so jsTree can handle them appropriately
+
+    service['type'] = 'service'
+    service['state'] = {'opened': True}
+    for region in service['children']:
+        region['type'] = 'region'
+        region['state'] = {'opened': True}
+        num_hidden_operations = 0
+        for operation in region['children']:
+            operation['type'] = 'operation'
+
+            # add count of non empty response to operation name
+
+            try:
+                num_non_empty_responses = 0
+                for response in operation['children']:
+                    try:
+                        if response['text'] == 'ResponseMetadata':
+                            response['type'] = 'response_metadata'
+                            continue  # ignore metadata nodes in count
+                        num_non_empty_responses += 1 if response['children'] else 0
+                    except KeyError:
+                        # an empty response
+                        pass
+                if num_non_empty_responses:
+                    operation['text'] += ' ({:d})'.format(num_non_empty_responses)
+                else:
+                    num_hidden_operations += 1
+                    operation['state'] = {"hidden": True}
+            except KeyError:
+                # no response
+                pass
+        region['a_attr'] = {'title': '{:d} hidden operations'.format(num_hidden_operations)}
+    return service
+
+def reference_data_file(storage):
+    out_fp = StringIO()
+    for i, (service, svc_store) in enumerate(storage._iter_service_stores()):
+        if i:
+            out_fp.write(', ')
+        json.dump(reference_build_service_node(service, svc_store),
+                  out_fp,
+                  cls=aws_inventory.store.ResponseEncoder)
+    return out_fp.getvalue()
+
+def generate_data_file(storage):
+    out_fp = StringIO()
+    out_fp.name = '<memory file>'
+    storage.generate_data_file(out_fp)
+    # only the services, without the header
+    data = out_fp.getvalue()
+    start = data.index('"children": [', data.index('"[inventory]"')) + len('"children": [')
+    return data[start:-len(']}]}')]
+
 class TestDataStore(unittest.TestCase):
-    def test_data_file_generation(self):
-        responses_dump_fp = StringIO()
-        responses_dump_fp.name = '<memory file>'
-        exceptions_dump_fp = StringIO()
-        exceptions_dump_fp.name = '<memory file>'
-        gui_data_fp = open('gui/aws_inventory_data.js', 'w')
-        #gui_data_fp = StringIO()
-        #gui_data_fp.name = '<memory file>'
+    def make_invoker(self, **kwargs):
         args_dict = {'profile': 'default',
                      'services': 'test-service',
                      'regions': 'test-region',
@@ -50,14 +147,306 @@ class TestDataStore(unittest.TestCase):
                      'mfa_serial': None,
                      'mfa_code': None,
                      'quiet': True,
+                     'verbose': False,
+                     'store_dir': None,
+                     'resume': None,
+                     'sqlite_db': None,
+                     'no_region_preflight': True,
+                     'trace': False,
+                     'metrics_port': None,
+                     'dump_format': 'pickle',
+                     'keep_response_metadata': False,
+                     'gui_data_format': 'json',
+                     'search_index': False,
+                     'stream_pages': False,
                      'dry_run': False}
+        args_dict.update(kwargs)
         args = type('TestArgs', (), args_dict)
         os.environ['AWS_ACCESS_KEY_ID'] = 'test_access_key_id'
         os.environ['AWS_SECRET_ACCESS_KEY'] = 'test_secret_access_key'
         invoker = aws_inventory.invoker.ApiInvoker(args, None, None)
-        invoker.store._response_store = TEST_RESPONSE_STORE
+        for service, svc_store in TEST_RESPONSE_STORE.items():
+            for region, region_store in svc_store.items():
+                for svc_op, resp in region_store.items():
+                    invoker.store.add_response(service, region, svc_op, resp)
         invoker.store._exception_store = TEST_EXCEPTION_STORE
-        invoker.write_results(responses_dump_fp, exceptions_dump_fp, gui_data_fp)
+        return invoker
+
+    def write_results(self, search_index_fp=None, **kwargs):
+        responses_dump_fp = StringIO()
+        responses_dump_fp.name = '<memory file>'
+        exceptions_dump_fp = StringIO()
+        exceptions_dump_fp.name = '<memory file>'
+        gui_data_fp = open('gui/aws_inventory_data.js', 'w')
+        #gui_data_fp = StringIO()
+        #gui_data_fp.name = '<memory file>'
+        invoker = self.make_invoker(**kwargs)
+        invoker.write_results(responses_dump_fp, exceptions_dump_fp, gui_data_fp, search_index_fp)
+
+    def test_data_file_generation(self):
+        self.write_results()
+
+    def test_search_index(self):
+        # only written when asked for
+        search_index_fp = StringIO()
+        self.write_results(search_index_fp)
+        self.assertEqual(search_index_fp.getvalue(), '')
+        self.write_results(search_index_fp, search_index=True)
+        self.assertTrue(search_index_fp.getvalue().startswith('{"format": '))
+
+    def test_partial_results(self):
+        directory = tempfile.mkdtemp()
+        try:
+            gui_data_file = os.path.join(directory, 'aws_inventory_data-default.json')
+            args = {'gui_data_file': gui_data_file,
+                    'responses_dump': None,
+                    'exceptions_dump': None,
+                    'search_index': False}
+            # only written when kept in memory
+            invoker = self.make_invoker(store_dir=os.path.join(directory, 'store'), **args)
+            invoker._write_partial_results()
+            invoker.store.close()
+            self.assertFalse(os.path.exists(gui_data_file))
+            invoker = self.make_invoker(**args)
+            invoker._write_partial_results()
+            self.assertTrue(os.path.exists(gui_data_file))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_merge_pages(self):
+        result = {}
+        compile_expression = jmespath.compile
+        compiled = []
+        jmespath.compile = lambda expression: (compiled.append(expression) or
+                                               compile_expression(expression))
+        aws_inventory.store._result_key_expressions.clear()
+        try:
+            for i in range(3):
+                aws_inventory.store.merge_page(result, {'Things': [i], 'Count': 1, 'Marker': i},
+                                               ['Things', 'Count'])
+        finally:
+            jmespath.compile = compile_expression
+        self.assertEqual(result, {'Things': [0, 1, 2], 'Count': 3})
+        # compiled once, not once per page
+        self.assertEqual(sorted(compiled), ['Count', 'Things'])
+
+class TestGuiDataFile(unittest.TestCase):
+    def assert_unchanged(self, storage):
+        data = generate_data_file(storage)
+        self.assertEqual(data, reference_data_file(storage))
+        json.loads('[' + data + ']')
+
+    def test_unchanged(self):
+        storage = aws_inventory.store.ResultStore('default')
+        for service, svc_store in TEST_RESPONSE_STORE.items():
+            for region, region_store in svc_store.items():
+                for svc_op, resp in region_store.items():
+                    storage.add_response(service, region, svc_op, resp)
+        storage.add_response('svc', None, 'Empty', {})
+        storage.add_response('svc', None, 'EmptyList', {'Things': [], 'ResponseMetadata': {'A': 1}})
+        storage.add_response('svc', None, 'List', [[], {}, [1, 2.5], None, True, 'ResponseMetadata',
+                                                   datetime.datetime(2018, 1, 2, 3, 4, 5)])
+        storage.add_response('svc', None, 'Nested', {'A': {'B': [{'C': u'\u00e9t\u00e9'}]},
+                                                     'When': datetime.datetime(2018, 1, 2),
+                                                     'Blob': '\xff\x00'})
+        self.assert_unchanged(storage)
+
+    def test_synthetic_inventory_unchanged(self):
+        storage = aws_inventory.store.ResultStore('default')
+        synthetic_inventory.populate_store(storage, 500)
+        self.assert_unchanged(storage)
+
+    def test_chunked(self):
+        storage = aws_inventory.store.ResultStore('default')
+        synthetic_inventory.populate_store(storage, 500, regions=('us-east-1', 'eu-west-1'))
+        storage.add_response('svc', None, 'Empty', {})
+        out_fp = StringIO()
+        out_fp.name = '<memory file>'
+        storage.generate_chunked_data_file(out_fp)
+        data = out_fp.getvalue()
+        lines = data.splitlines()
+        self.assertEqual(json.loads(lines[0]), aws_inventory.store.CHUNKED_DATA_HEADER)
+        offset, length = json.loads(lines[-1])['manifest']
+        manifest = json.loads(data[offset:offset + length])
+
+        # with every chunk loaded, the tree is the same as the one in the JSON format
+        for service in manifest['responses'][0]['children']:
+            for region in service['children']:
+                for operation in region['children']:
+                    if 'data' in operation:
+                        offset, length = operation.pop('data')['chunk']
+                        operation['children'] = json.loads(data[offset:offset + length])
+        out_fp = StringIO()
+        out_fp.name = '<memory file>'
+        storage.generate_data_file(out_fp)
+        self.assertEqual(manifest, json.loads(out_fp.getvalue()))
+
+    def test_deep_response(self):
+        storage = aws_inventory.store.ResultStore('default')
+        resp = leaf = {}
+        for _ in range(sys.getrecursionlimit() * 2):
+            leaf['Child'] = {}
+            leaf = leaf['Child']
+        leaf['Name'] = 'deep'
+        storage.add_response('svc', 'region', 'DescribeDeep', resp)
+        data = generate_data_file(storage)
+        self.assertTrue(data.endswith('{"text": "Name = deep"}' + ']}' * (sys.getrecursionlimit() * 2)
+                                      + ']}]}]}'))
+
+class TestNormalizeResponse(unittest.TestCase):
+    METADATA = {'RequestId': 'abc',
+                'HTTPStatusCode': 200,
+                'HTTPHeaders': {'x-amzn-requestid': 'abc'},
+                'RetryAttempts': 0}
+
+    def test_metadata_summarized(self):
+        resp = aws_inventory.store.normalize_response({'Things': [],
+                                                       'ResponseMetadata': self.METADATA})
+        self.assertEqual(resp['ResponseMetadata'],
+                         {'RequestId': 'abc', 'HTTPStatusCode': 200, 'RetryAttempts': 0})
+        resp = aws_inventory.store.normalize_response({'Things': [],
+                                                       'ResponseMetadata': self.METADATA},
+                                                      keep_metadata=True)
+        self.assertEqual(resp['ResponseMetadata'], self.METADATA)
+
+    def test_compact(self):
+        when = datetime.datetime(2018, 1, 2)
+        resp = aws_inventory.store.normalize_response(
+            {u'Things': [{u'Name': u'thing' + u'1', u'State': (u'running', u'\u00e9t\u00e9')},
+                         {u'Name': u'thing' + u'2', u'Created': when, u'Blob': '\xff\x00'}]})
+        self.assertEqual(resp, {'Things': [{'Name': 'thing1',
+                                            'State': ['running', u'\u00e9t\u00e9']},
+                                           {'Name': 'thing2',
+                                            'Created': when,
+                                            'Blob': '\xff\x00'}]})
+        first, second = resp['Things']
+        self.assertIs(type(first['Name']), str)
+        self.assertIs(type(first['State'][1]), unicode)
+        self.assertIs(second['Created'], when)
+        # keys and short strings are shared
+        self.assertIs(first['Name'], intern('thing1'))
+        self.assertIs([key for key in first if key == 'Name'][0],
+                      [key for key in second if key == 'Name'][0])
+        long_value = u'x' * (aws_inventory.config.INTERN_MAX_LENGTH + 1)
+        self.assertIsNot(aws_inventory.store.normalize_response([long_value])[0],
+                         intern(str(long_value)))
+
+    def test_store_keeps_metadata(self):
+        storage = aws_inventory.store.ResultStore('default', keep_response_metadata=True)
+        storage.add_response('svc', 'region', 'ListThings', {'ResponseMetadata': self.METADATA})
+        self.assertEqual(storage.get_response('svc', 'region', 'ListThings'),
+                         {'ResponseMetadata': self.METADATA})
+        storage = aws_inventory.store.ResultStore('default')
+        storage.add_response('svc', 'region', 'ListThings', {'ResponseMetadata': self.METADATA})
+        self.assertNotIn('HTTPHeaders',
+                         storage.get_response('svc', 'region', 'ListThings')['ResponseMetadata'])
+
+class TestSharedResponses(unittest.TestCase):
+    def setUp(self):
+        self.storage = aws_inventory.store.ResultStore('default')
+        for region in ('us-east-1', 'eu-west-1', 'ap-south-1'):
+            self.storage.add_response('iam', region, 'ListRoles',
+                                      {'Roles': [{'RoleName': 'admin'}],
+                                       'ResponseMetadata': {'RequestId': region}})
+        self.storage.add_response('iam', 'us-east-1', 'ListUsers', {'Users': []})
+
+    def assert_shared(self, responses):
+        first = responses[('iam', 'us-east-1', 'ListRoles')]
+        for region in ('us-east-1', 'eu-west-1', 'ap-south-1'):
+            resp = responses[('iam', region, 'ListRoles')]
+            self.assertEqual(resp, {'Roles': [{'RoleName': 'admin'}],
+                                    'ResponseMetadata': {'RequestId': region}})
+            self.assertIs(resp['Roles'], first['Roles'])
+
+    def test_stored_once(self):
+        self.assert_shared(dict((key, self.storage.get_response(*key))
+                                for key in self.storage.backend.iter_keys()))
+        self.assertEqual(self.storage.get_shared_responses(),
+                         {('iam', 'eu-west-1', 'ListRoles'): ('iam', 'us-east-1', 'ListRoles'),
+                          ('iam', 'ap-south-1', 'ListRoles'): ('iam', 'us-east-1', 'ListRoles')})
+
+    def test_replace_first(self):
+        self.storage.add_response('iam', 'us-east-1', 'ListRoles', {'Roles': []})
+        self.assertEqual(self.storage.get_shared_responses(),
+                         {('iam', 'eu-west-1', 'ListRoles'): ('iam', 'ap-south-1', 'ListRoles')})
+        self.storage.remove_response('iam', 'ap-south-1', 'ListRoles')
+        self.assertEqual(self.storage.get_shared_responses(), {})
+        self.assertEqual(self.storage.get_response('iam', 'eu-west-1', 'ListRoles'),
+                         {'Roles': [{'RoleName': 'admin'}],
+                          'ResponseMetadata': {'RequestId': 'eu-west-1'}})
+
+    def test_pickle(self):
+        out_fp = StringIO()
+        out_fp.name = '<memory file>'
+        self.storage.dump_response_store(out_fp)
+        responses = pickle.loads(out_fp.getvalue())
+        self.assert_shared(dict(((service, region, svc_op), resp)
+                                for service, svc_store in responses.items()
+                                for region, region_store in svc_store.items()
+                                for svc_op, resp in region_store.items()))
+        self.assertEqual(responses['iam']['us-east-1']['ListUsers'], {'Users': []})
+
+    def test_pickle_from_store_directory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            storage = aws_inventory.store.ResultStore(
+                'default', aws_inventory.segments.SegmentBackend(directory))
+            for service, region, svc_op, resp in self.storage.backend.iter_responses():
+                storage.add_response(service, region, svc_op, resp)
+            out_fp = StringIO()
+            out_fp.name = '<memory file>'
+            storage.dump_response_store(out_fp)
+            storage.close()
+            # written one at a time, in full
+            self.assertEqual(pickle.loads(out_fp.getvalue()), self.storage.backend.responses)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_resume(self):
+        directory = tempfile.mkdtemp()
+        try:
+            resp = {'Roles': [{'RoleName': 'admin'}], 'ResponseMetadata': {'RequestId': 'a'}}
+            storage = aws_inventory.store.ResultStore(
+                'default', aws_inventory.segments.SegmentBackend(directory))
+            storage.add_response('iam', 'us-east-1', 'ListRoles', resp)
+            storage.close()
+            storage = aws_inventory.store.ResultStore(
+                'default', aws_inventory.segments.SegmentBackend(directory))
+            storage.add_response('iam', 'eu-west-1', 'ListRoles', resp)
+            self.assertEqual(storage.get_shared_responses(),
+                             {('iam', 'eu-west-1', 'ListRoles'): ('iam', 'us-east-1', 'ListRoles')})
+            self.assertEqual(storage.get_response('iam', 'eu-west-1', 'ListRoles'), resp)
+            storage.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_gui_data_unshared(self):
+        # every operation has its own nodes, with its own metadata
+        data = generate_data_file(self.storage)
+        self.assertEqual(data, reference_data_file(self.storage))
+        for region in ('us-east-1', 'eu-west-1', 'ap-south-1'):
+            self.assertIn('RequestId = ' + region, data)
+
+    def test_indexed_dump(self):
+        out_fp = StringIO()
+        out_fp.name = '<memory file>'
+        self.storage.dump_indexed_response_store(out_fp)
+        out_fp.seek(0)
+        reader = aws_inventory.dumpfile.DumpReader(out_fp)
+        self.assertEqual(len(reader), 4)
+        for region in ('us-east-1', 'eu-west-1', 'ap-south-1'):
+            self.assertEqual(reader.get('iam', region, 'ListRoles'),
+                             self.storage.get_response('iam', region, 'ListRoles'))
+        self.assertEqual(len(set(entry[3:5] for entry in reader._entries)), 2)
+
+    def test_too_deep_to_share(self):
+        resp = leaf = {}
+        for _ in range(sys.getrecursionlimit() * 2):
+            leaf['Child'] = {}
+            leaf = leaf['Child']
+        self.storage.add_response('svc', 'us-east-1', 'DescribeDeep', resp)
+        self.storage.add_response('svc', 'eu-west-1', 'DescribeDeep', resp)
+        self.assertNotIn(('svc', 'eu-west-1', 'DescribeDeep'), self.storage.get_shared_responses())
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,128 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dateutil.tz import tzutc
+
+import aws_inventory.database
+import aws_inventory.store
+from tools import synthetic_inventory
+
+
+TEST_RESPONSE = {'Things': [{'Name': 'thing1',
+                             'Created': datetime.datetime(2018, 1, 2, 3, 4, 5, tzinfo=tzutc()),
+                             'Blob': '\xff\xfe'}]}
+
+class TestIterResources(unittest.TestCase):
+    def test_instances(self):
+        resp = {'Reservations': [{'ReservationId': 'r-1',
+                                  'OwnerId': '123456789012',
+                                  'Instances': [{'InstanceId': 'i-1',
+                                                 'ImageId': 'ami-1',
+                                                 'VpcId': 'vpc-1',
+                                                 'IamInstanceProfile': {'Arn': 'arn:aws:iam::1:p'},
+                                                 'SecurityGroups': [{'GroupId': 'sg-1',
+                                                                     'GroupName': 'web'}],
+                                                 'Tags': [{'Key': 'Name', 'Value': 'web-1'},
+                                                          {'Key': 'team', 'Value': 'a'}]}]}],
+                'ResponseMetadata': {'RequestId': 'x'}}
+        self.assertEqual(list(aws_inventory.database.iter_resources(resp)), [
+            ('Reservations[0]', None, 'r-1', None, []),
+            ('Reservations[0].Instances[0]', None, 'i-1', 'web-1',
+             [('Name', 'web-1'), ('team', 'a')]),
+            ('Reservations[0].Instances[0].IamInstanceProfile', 'arn:aws:iam::1:p', None, None, []),
+            ('Reservations[0].Instances[0].SecurityGroups[0]', None, 'sg-1', 'web', []),
+        ])
+
+    def test_lists_of_names(self):
+        resp = {'FunctionArns': ['arn:aws:lambda:us-east-1:1:function:f'],
+                'TableNames': ['t1'],
+                'Functions': [{'FunctionName': 'f',
+                               'FunctionArn': 'arn:aws:lambda:us-east-1:1:function:f',
+                               'Role': 'arn:aws:iam::1:role/r',
+                               'Tags': {'team': 'a'}}]}
+        self.assertEqual(list(aws_inventory.database.iter_resources(resp)), [
+            ('FunctionArns[0]', 'arn:aws:lambda:us-east-1:1:function:f', None, None, []),
+            ('Functions[0]', 'arn:aws:lambda:us-east-1:1:function:f', None, 'f', [('team', 'a')]),
+            ('TableNames[0]', None, None, 't1', []),
+        ])
+
+class TestSqliteBackend(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'inventory.db')
+        self.backend = aws_inventory.database.SqliteBackend(self.path, batch_size=10)
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self):
+        self.backend.close()
+        self.backend = aws_inventory.database.SqliteBackend(self.path)
+
+    def test_round_trip(self):
+        self.backend.put_response('svc', 'region1', 'ListThings', TEST_RESPONSE)
+        self.backend.put_response('svc', None, 'ListThings', {'Things': []})
+        self.reopen()
+        self.assertEqual(self.backend.get_response('svc', 'region1', 'ListThings'), TEST_RESPONSE)
+        self.assertEqual([entry[:3] for entry in self.backend.iter_responses()],
+                         [('svc', None, 'ListThings'), ('svc', 'region1', 'ListThings')])
+        (thing,) = self.backend.find_resources('thing1')
+        self.assertEqual((thing['service'], thing['region'], thing['operation'], thing['path']),
+                         ('svc', 'region1', 'ListThings', 'Things[0]'))
+
+    def test_pages(self):
+        self.backend.put_page('svc', 'region1', 'ListThings', {'Things': [{'Name': 'a'}]},
+                              ['Things'], 1)
+        self.backend.put_page('svc', 'region1', 'ListThings', {'Things': [{'Name': 'b'}]},
+                              ['Things'], 2)
+        # unfinished pagination is not a response
+        self.assertIsNone(self.backend.get_response('svc', 'region1', 'ListThings'))
+        self.assertEqual(self.backend.find_resources('a'), [])
+        self.backend.finish_pages('svc', 'region1', 'ListThings', {'Owner': 'me'})
+        self.assertEqual(self.backend.get_response('svc', 'region1', 'ListThings'),
+                         {'Things': [{'Name': 'a'}, {'Name': 'b'}], 'Owner': 'me'})
+        self.assertEqual(self.backend.find_resources('b')[0]['path'], 'Things[1]')
+
+        # pagination restarts on a first page, replacing the response and its resources
+        self.backend.put_page('svc', 'region1', 'ListThings', {'Things': [{'Name': 'c'}]},
+                              ['Things'], 1)
+        self.backend.finish_pages('svc', 'region1', 'ListThings', {})
+        self.reopen()
+        self.assertEqual(self.backend.get_response('svc', 'region1', 'ListThings'),
+                         {'Things': [{'Name': 'c'}]})
+        self.assertEqual(self.backend.find_resources('a'), [])
+        self.assertEqual(self.backend.resource_count, 1)
+
+    def test_remove(self):
+        self.backend.put_response('svc', 'region1', 'ListThings', TEST_RESPONSE)
+        self.backend.remove_response('svc', 'region1', 'ListThings')
+        self.reopen()
+        self.assertEqual(list(self.backend.iter_responses()), [])
+        self.assertEqual(self.backend.find_resources('thing1'), [])
+
+    def test_result_store(self):
+        storage = aws_inventory.store.ResultStore('default', self.backend)
+        synthetic_inventory.populate_store(storage, 200, regions=('us-east-1',))
+        storage.add_exception('svc', None, 'ListThings', Exception('AccessDenied'))
+        memory_storage = aws_inventory.store.ResultStore('default')
+        synthetic_inventory.populate_store(memory_storage, 200, regions=('us-east-1',))
+        self.assertEqual(json.loads(storage.get_response_store()),
+                         json.loads(memory_storage.get_response_store()))
+
+        role = storage.get_response('iam', 'us-east-1', 'ListRoles')['Roles'][0]
+        (resource,) = self.backend.find_resources(role['Arn'])
+        self.assertEqual(resource['resource_id'], role['RoleId'])
+        self.assertEqual(resource['name'], role['RoleName'])
+
+        self.reopen()
+        storage = aws_inventory.store.ResultStore('default', self.backend)
+        self.assertTrue(storage.has_exceptions('svc', 'ListThings'))
+        self.assertIn(('svc', None, 'ListThings'), storage.get_completed_targets())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import copy
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import aws_inventory.database
+import aws_inventory.diff
+import aws_inventory.store
+from tools import synthetic_inventory
+
+
+def build_storages():
+    old = aws_inventory.store.ResultStore('default')
+    synthetic_inventory.populate_store(old, 200, regions=('us-east-1', 'eu-west-1'))
+    new = aws_inventory.store.ResultStore('default')
+    for service, region, svc_op, resp in old.backend.iter_responses():
+        resp = copy.deepcopy(resp)
+        # every call has new response metadata
+        if 'ResponseMetadata' in resp:
+            resp['ResponseMetadata']['RequestId'] = 'changed'
+        new.add_response(service, region, svc_op, resp)
+    roles = new.get_response('iam', 'us-east-1', 'ListRoles')['Roles']
+    removed = roles.pop()
+    roles[0]['Description'] = 'changed'
+    added = {'RoleName': 'added', 'RoleId': 'AROAADDED', 'Arn': 'arn:aws:iam::1:role/added'}
+    roles.append(added)
+    new.add_response('svc', None, 'ListThings', {'Things': [{'Name': 'thing1'}]})
+    old.add_response('svc', None, 'Gone', {'Things': []})
+    return old, new, removed, roles[0], added
+
+class TestDiff(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, storage, name, func):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as out_fp:
+            func(storage)(out_fp)
+        return path
+
+    def diff(self, old_path, new_path):
+        old_results = aws_inventory.diff.open_results(old_path)
+        new_results = aws_inventory.diff.open_results(new_path)
+        try:
+            return aws_inventory.diff.diff_results(old_results, new_results)
+        finally:
+            old_results.close()
+            new_results.close()
+
+    def assert_diff(self, diff, removed, modified, added):
+        self.assertEqual(diff['responses'], {
+            'added': [('svc', None, 'ListThings')],
+            'removed': [('svc', None, 'Gone')],
+            'modified': [('iam', 'us-east-1', 'ListRoles')]
+        })
+        self.assertEqual(diff['summary']['resources'], {'added': 2, 'removed': 1, 'modified': 1})
+        changes = dict((resource['id'], resource) for resource in diff['resources'])
+        self.assertEqual(changes[removed['Arn']]['change'], 'removed')
+        self.assertEqual(changes[added['Arn']]['change'], 'added')
+        self.assertEqual(changes['thing1']['operation'], 'ListThings')
+        (change,) = changes[modified['Arn']]['changes']
+        self.assertEqual(change['path'], 'Description')
+        self.assertEqual(change['new'], 'changed')
+
+    def test_dumps(self):
+        old, new, removed, modified, added = build_storages()
+        for dump in (lambda storage: storage.dump_response_store,
+                     lambda storage: storage.dump_indexed_response_store):
+            diff = self.diff(self.write(old, 'old', dump), self.write(new, 'new', dump))
+            self.assert_diff(diff, removed, modified, added)
+            (resource,) = [r for r in diff['resources'] if r['id'] == added['Arn']]
+            self.assertEqual(resource['value'], added)
+
+    def test_pickles(self):
+        old, new, removed, modified, added = build_storages()
+        for protocol in (0, 1, pickle.HIGHEST_PROTOCOL):
+            dump = lambda storage: lambda out_fp: pickle.dump(storage.backend.responses, out_fp,
+                                                              protocol)
+            diff = self.diff(self.write(old, 'old', dump), self.write(new, 'new', dump))
+            self.assert_diff(diff, removed, modified, added)
+
+    def test_sqlite_unmodified(self):
+        paths = []
+        for name, storage in zip(('old.db', 'new.db'), build_storages()):
+            path = os.path.join(self.directory, name)
+            backend = aws_inventory.database.SqliteBackend(path)
+            for service, region, svc_op, resp in storage.backend.iter_responses():
+                backend.put_response(service, region, svc_op, resp)
+            backend.close()
+            # as if written by another tool
+            conn = sqlite3.connect(path)
+            conn.execute('PRAGMA journal_mode = DELETE')
+            conn.close()
+            paths.append(path)
+        digests = [hashlib.sha1(open(path, 'rb').read()).hexdigest() for path in paths]
+        self.diff(*paths)
+        self.assertEqual([hashlib.sha1(open(path, 'rb').read()).hexdigest() for path in paths],
+                         digests)
+
+    def test_unrecognized(self):
+        path = self.write(None, 'other', lambda _: lambda out_fp: out_fp.write('not results'))
+        self.assertRaises(aws_inventory.diff.DiffError, aws_inventory.diff.open_results, path)
+
+    def test_gui_data(self):
+        old, new, removed, modified, added = build_storages()
+        for generate in (lambda storage: storage.generate_data_file,
+                         lambda storage: storage.generate_chunked_data_file):
+            diff = self.diff(self.write(old, 'old', generate), self.write(new, 'new', generate))
+            self.assert_diff(diff, removed, modified, added)
+
+    def test_unchanged(self):
+        old, _, _, _, _ = build_storages()
+        path = self.write(old, 'old', lambda storage: storage.dump_response_store)
+        diff = self.diff(path, path)
+        self.assertEqual(diff['resources'], [])
+        self.assertEqual(diff['summary']['responses'], {'added': 0, 'removed': 0, 'modified': 0})
+
+    def test_write(self):
+        old, new, _, _, _ = build_storages()
+        dump = lambda storage: storage.dump_indexed_response_store
+        diff = self.diff(self.write(old, 'old', dump), self.write(new, 'new', dump))
+        json_path = self.write(diff, 'diff.json', lambda diff: lambda out_fp:
+                               aws_inventory.diff.write_json(diff, out_fp))
+        with open(json_path) as in_fp:
+            self.assertEqual(json.load(in_fp)['summary'], diff['summary'])
+        gui_path = self.write(diff, 'diff-gui.json', lambda diff: lambda out_fp:
+                              aws_inventory.diff.write_gui_data(diff, out_fp))
+        with open(gui_path) as in_fp:
+            services = json.load(in_fp)['responses'][0]['children']
+        self.assertEqual(sorted(service['text'] for service in services), ['iam', 'svc'])
+
+if __name__ == '__main__':
+    unittest.main()
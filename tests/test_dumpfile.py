@@ -0,0 +1,69 @@
+import datetime
+import pickle
+import unittest
+from StringIO import StringIO
+
+import aws_inventory.dumpfile
+import aws_inventory.store
+from tools import synthetic_inventory
+
+
+def build_storage():
+    storage = aws_inventory.store.ResultStore('default')
+    synthetic_inventory.populate_store(storage, 200, regions=('us-east-1', 'eu-west-1'))
+    storage.add_response('svc', 'us-east-1', 'Nested', {'A': {'B': [{'C': u'\u00e9t\u00e9'}]},
+                                                        'When': datetime.datetime(2018, 1, 2),
+                                                        'Blob': '\xff\x00'})
+    storage.add_exception('svc', 'us-east-1', 'Denied', Exception('AccessDenied'))
+    storage.add_exception('svc', 'eu-west-1', 'Denied', Exception('AccessDenied'))
+    return storage
+
+def write(func):
+    out_fp = StringIO()
+    out_fp.name = '<memory file>'
+    func(out_fp)
+    out_fp.seek(0)
+    return out_fp
+
+class TestDumpFile(unittest.TestCase):
+    def test_responses_match_pickle(self):
+        storage = build_storage()
+        expected = pickle.load(write(storage.dump_response_store))
+        reader = aws_inventory.dumpfile.DumpReader(write(storage.dump_indexed_response_store))
+        self.assertEqual(reader.kind, aws_inventory.dumpfile.RESPONSES)
+        self.assertEqual(reader.load(), expected)
+        self.assertEqual(len(reader), len(list(storage.backend.iter_responses())))
+        self.assertEqual(reader.get('svc', 'us-east-1', 'Nested'),
+                         expected['svc']['us-east-1']['Nested'])
+        self.assertIn(('ec2', 'eu-west-1', 'DescribeInstances'), reader)
+        self.assertRaises(KeyError, reader.get, 'svc', 'eu-west-1', 'Nested')
+        self.assertEqual(set(service for service, _, _, _ in reader.iter_entries(['ec2', 'svc'])),
+                         set(['ec2', 'svc']))
+
+    def test_exceptions_match_pickle(self):
+        storage = build_storage()
+        expected = pickle.load(write(storage.dump_exception_store))
+        reader = aws_inventory.dumpfile.DumpReader(write(storage.dump_indexed_exception_store))
+        self.assertEqual(reader.kind, aws_inventory.dumpfile.EXCEPTIONS)
+        self.assertEqual(reader.load(), expected)
+        self.assertEqual(reader.get('svc', 'eu-west-1', 'Denied'), 'AccessDenied')
+
+    def test_convert_pickle(self):
+        storage = build_storage()
+        out_fp = StringIO()
+        count = aws_inventory.dumpfile.convert_pickle(write(storage.dump_response_store), out_fp,
+                                                      aws_inventory.dumpfile.RESPONSES)
+        out_fp.seek(0)
+        reader = aws_inventory.dumpfile.DumpReader(out_fp)
+        self.assertEqual(count, len(reader))
+        self.assertEqual(reader.load(), pickle.load(write(storage.dump_response_store)))
+
+    def test_not_a_dump(self):
+        self.assertRaises(aws_inventory.dumpfile.DumpError, aws_inventory.dumpfile.DumpReader,
+                          write(build_storage().dump_response_store))
+        truncated = write(build_storage().dump_indexed_response_store).getvalue()[:-1]
+        self.assertRaises(aws_inventory.dumpfile.DumpError, aws_inventory.dumpfile.DumpReader,
+                          StringIO(truncated))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,291 @@
+import threading
+import unittest
+
+import botocore.exceptions
+import jmespath
+
+import aws_inventory.config
+import aws_inventory.errors
+import aws_inventory.invoker
+import aws_inventory.store
+import aws_inventory.throttle
+import aws_inventory.tracing
+
+
+class StubPageIterator(object):
+    """Page iterator yielding three pages."""
+
+    def __init__(self, pagination_config):
+        self.pagination_config = pagination_config
+        self.result_keys = [jmespath.compile('Things')]
+        self.non_aggregate_part = {'Owner': 'me'}
+
+    def __iter__(self):
+        for i in range(3):
+            yield {'Things': [i * 2, i * 2 + 1], 'Owner': 'me', 'NextToken': str(i)}
+
+    def build_full_result(self):
+        return {'Things': range(6), 'Owner': 'me'}
+
+class StubPaginator(object):
+    def paginate(self, PaginationConfig=None):
+        return StubPageIterator(PaginationConfig)
+
+def client_error(code, svc_op):
+    return botocore.exceptions.ClientError({'Error': {'Code': code, 'Message': code}}, svc_op)
+
+class StubClient(object):
+    """Client whose operations return a canned response."""
+
+    throttled_calls = {}  # {region: count}
+
+    def __init__(self, region):
+        self.region = region
+
+    def can_paginate(self, py_op):
+        return py_op == 'list_pages'
+
+    def get_paginator(self, py_op):
+        return StubPaginator()
+
+    def __getattr__(self, py_op):
+        if self.region == 'disabled-region':
+            def disabled():
+                raise client_error('InvalidClientTokenId', py_op)
+            return disabled
+        if py_op == 'describe_denied':
+            def denied():
+                if self.region == 'region1':
+                    raise client_error('AccessDenied', 'DescribeDenied')
+                return {'Region': self.region}
+            return denied
+        if py_op == 'describe_broken':
+            def broken():
+                raise ValueError('broken operation')
+            return broken
+        if py_op == 'describe_expired':
+            def expired():
+                raise client_error('ExpiredToken', 'DescribeExpired')
+            return expired
+        if py_op == 'describe_throttled':
+            def throttled():
+                # region1 is throttled twice, region2 more than can be retried
+                count = StubClient.throttled_calls[self.region] = \
+                    StubClient.throttled_calls.get(self.region, 0) + 1
+                if self.region == 'region2' or count <= 2:
+                    raise client_error('Throttling', 'DescribeThrottled')
+                return {'Throttled': count - 1}
+            return throttled
+        return lambda: {'Region': self.region, 'Operation': py_op}
+
+class StubProgressBar(object):
+    """Progress bar recording updates from worker threads."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def start_target(self, svc_name, region):
+        pass
+
+    def finish_target(self, svc_name, region):
+        with self._lock:
+            self.count += 1
+
+def make_params(storage, **kwargs):
+    params = {'dry_run': False,
+              'store': storage,
+              'get_client': lambda svc_name, region: StubClient(region),
+              'get_max_page_size': lambda svc_name, svc_op: 100,
+              'stream_pages': False,
+              'rate_controller': aws_inventory.throttle.RateController(),
+              'progress_bar': StubProgressBar(),
+              'tracer': aws_inventory.tracing.NullTracer(),
+              'stop': threading.Event()}
+    params.update(kwargs)
+    return params
+
+class TestSvcWorker(unittest.TestCase):
+    def setUp(self):
+        self.backoff_base = aws_inventory.config.THROTTLE_BACKOFF_BASE
+        aws_inventory.config.THROTTLE_BACKOFF_BASE = 0
+        StubClient.throttled_calls = {}
+
+    def tearDown(self):
+        aws_inventory.config.THROTTLE_BACKOFF_BASE = self.backoff_base
+
+    def _run(self, work_func, stream_pages=False):
+        storage = aws_inventory.store.ResultStore('default')
+        params = make_params(storage, stream_pages=stream_pages)
+        progress_bar = params['progress_bar']
+        targets = [(svc, region, op)
+                   for svc in ('svc1', 'svc2')
+                   for region in ('region1', 'region2', 'region3')
+                   for op in ('ListThings', 'DescribeBroken', 'ListPages')]
+        work_func(targets, params)
+
+        self.assertEqual(progress_bar.count, len(targets))
+        self.assertEqual(sorted(set(entry[0] for entry in storage.backend.iter_responses())),
+                         ['svc1', 'svc2'])
+        self.assertEqual(storage.get_response('svc2', 'region3', 'ListThings'),
+                         {'Region': 'region3', 'Operation': 'list_things'})
+        self.assertTrue(storage.has_exceptions('svc1', 'DescribeBroken'))
+        self.assertEqual(storage.get_response('svc1', 'region1', 'ListPages'),
+                         {'Things': range(6), 'Owner': 'me'})
+        return storage
+
+    def test_single_queue_across_services_and_regions(self):
+        self._run(lambda targets, params: aws_inventory.invoker.thread_work(
+            targets, aws_inventory.invoker.ApiInvoker.svc_worker, params))
+
+    def test_max_threads_bounds_calls_in_flight(self):
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def get_client(svc_name, region):
+            client = StubClient(region)
+
+            def call():
+                with lock:
+                    in_flight.append(1)
+                    peak.append(len(in_flight))
+                threading.Event().wait(0.01)
+                with lock:
+                    in_flight.pop()
+                return {}
+            client.list_things = call
+            return client
+
+        storage = aws_inventory.store.ResultStore('default')
+        targets = [('svc', 'region{:d}'.format(i), 'ListThings') for i in range(20)]
+        aws_inventory.invoker.thread_work(targets,
+                                          aws_inventory.invoker.ApiInvoker.svc_worker,
+                                          make_params(storage, get_client=get_client),
+                                          max_threads=5)
+        self.assertEqual(len(storage.get_completed_targets()), len(targets))
+        self.assertLessEqual(max(peak), 5)
+        self.assertGreater(max(peak), 1)
+
+    def test_stream_pages(self):
+        storage = self._run(
+            lambda targets, params: aws_inventory.invoker.thread_work(
+                targets, aws_inventory.invoker.ApiInvoker.svc_worker, params),
+            stream_pages=True)
+        self.assertEqual(storage.page_counts['svc1']['region1']['ListPages'], 3)
+
+    def test_expired_credentials_stop_the_scan(self):
+        storage = aws_inventory.store.ResultStore('default')
+        params = make_params(storage)
+        aws_inventory.invoker.thread_work([('svc1', 'region1', 'DescribeExpired')],
+                                          aws_inventory.invoker.ApiInvoker.svc_worker,
+                                          params)
+        self.assertTrue(params['stop'].is_set())
+        self.assertEqual(storage.get_completed_targets(), set())
+
+    def test_throttled_calls_are_retried(self):
+        storage = aws_inventory.store.ResultStore('default')
+        params = make_params(storage)
+        aws_inventory.invoker.thread_work(
+            [('svc1', 'region1', 'DescribeThrottled'), ('svc1', 'region2', 'DescribeThrottled')],
+            aws_inventory.invoker.ApiInvoker.svc_worker,
+            params)
+        self.assertEqual(storage.get_response('svc1', 'region1', 'DescribeThrottled'),
+                         {'Throttled': 2})
+        self.assertEqual(StubClient.throttled_calls['region2'],
+                         aws_inventory.config.THROTTLE_MAX_RETRIES + 1)
+        # still throttled after retrying, but that does not rule out other regions
+        self.assertFalse(storage.has_exceptions('svc1', 'DescribeThrottled'))
+        self.assertIn(('svc1', 'region2', 'DescribeThrottled'), storage.get_completed_targets())
+
+    def test_exception_scopes(self):
+        storage = aws_inventory.store.ResultStore('default')
+        params = make_params(storage)
+        targets = [('svc1', 'disabled-region', 'ListThings'),
+                   ('svc1', 'region1', 'DescribeDenied'),
+                   ('svc1', 'region2', 'DescribeDenied'),
+                   ('svc1', 'disabled-region', 'DescribeDenied'),
+                   ('svc2', 'disabled-region', 'ListThings')]
+        # invoked in order, unlike with worker threads
+        for target in targets[:-1]:
+            aws_inventory.invoker.ApiInvoker.invoke_target(target, params)
+        # denied in one region only
+        self.assertFalse(storage.has_exceptions('svc1', 'DescribeDenied'))
+        self.assertEqual(storage.get_response('svc1', 'region2', 'DescribeDenied'),
+                         {'Region': 'region2'})
+        # nothing else of the service is invoked in the region, but other services are
+        self.assertTrue(storage.is_skipped('svc1', 'disabled-region', 'DescribeDenied'))
+        self.assertFalse(storage.is_skipped('svc2', 'disabled-region', 'ListThings'))
+        self.assertFalse(storage.is_skipped('svc1', None, 'ListThings'))
+        aws_inventory.invoker.ApiInvoker.invoke_target(targets[-1], params)
+        self.assertEqual(storage.get_completed_targets(),
+                         set([('svc1', 'disabled-region', 'ListThings'),
+                              ('svc1', 'region1', 'DescribeDenied'),
+                              ('svc1', 'region2', 'DescribeDenied'),
+                              ('svc2', 'disabled-region', 'ListThings')]))
+
+class TestErrors(unittest.TestCase):
+    def test_classify(self):
+        classify = aws_inventory.errors.classify
+        self.assertEqual(classify(client_error('ExpiredToken', 'Op')), aws_inventory.errors.STOP)
+        self.assertEqual(classify(client_error('Throttling', 'Op')), aws_inventory.errors.RETRY)
+        self.assertEqual(classify(client_error('InternalError', 'Op')), aws_inventory.errors.RETRY)
+        # a quota, not a rate
+        self.assertEqual(classify(client_error('LimitExceededException', 'Op')),
+                         aws_inventory.errors.SKIP_TARGET)
+        self.assertEqual(classify(botocore.exceptions.EndpointConnectionError(endpoint_url='url')),
+                         aws_inventory.errors.RETRY)
+        self.assertEqual(classify(client_error('AuthFailure', 'Op')),
+                         aws_inventory.errors.SKIP_REGION)
+        self.assertEqual(classify(client_error('AccessDenied', 'Op')),
+                         aws_inventory.errors.SKIP_TARGET)
+        self.assertEqual(classify(client_error('ValidationException', 'Op')),
+                         aws_inventory.errors.SKIP_OPERATION)
+        self.assertEqual(classify(botocore.exceptions.ParamValidationError(report='missing')),
+                         aws_inventory.errors.SKIP_OPERATION)
+        self.assertEqual(classify(ValueError('broken')), aws_inventory.errors.SKIP_OPERATION)
+
+class TestRateController(unittest.TestCase):
+    def test_aimd(self):
+        controller = aws_inventory.throttle.RateController(initial_limit=4, max_limit=6)
+        controller.on_throttle('svc', 'region')
+        self.assertEqual(controller.get_limit('svc', 'region'), 2)
+        # decreases are at most once per interval
+        controller.on_throttle('svc', 'region')
+        self.assertEqual(controller.get_limit('svc', 'region'), 2)
+        for _ in range(3):
+            controller.on_success('svc', 'region')
+        self.assertEqual(controller.get_limit('svc', 'region'), 3)
+        for _ in range(100):
+            controller.on_success('svc', 'region')
+        self.assertEqual(controller.get_limit('svc', 'region'), 6)
+        self.assertEqual(controller.get_limit('svc', 'other-region'), 4)
+
+    def test_initial_limit_within_max(self):
+        controller = aws_inventory.throttle.RateController(initial_limit=4, max_limit=2)
+        self.assertEqual(controller.get_limit('svc', 'region'), 2)
+
+    def test_slot_limits_calls_in_flight(self):
+        controller = aws_inventory.throttle.RateController(initial_limit=2)
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def call():
+            with controller.slot('svc', 'region'):
+                with lock:
+                    in_flight.append(1)
+                    peak.append(len(in_flight))
+                threading.Event().wait(0.01)
+                with lock:
+                    in_flight.pop()
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(peak), 2)
+
+if __name__ == '__main__':
+    unittest.main()
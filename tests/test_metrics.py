@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+import urllib2
+
+import aws_inventory.database
+import aws_inventory.metrics
+import aws_inventory.segments
+import aws_inventory.store
+import aws_inventory.tracing
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.storage = aws_inventory.store.ResultStore('default')
+        self.metrics = aws_inventory.metrics.Metrics(self.storage.get_stats)
+        self.metrics.worker_count = 2
+        self.metrics.target_count = 3
+        self.metrics.begin(('ec2', 'us-east-1', 'DescribeInstances'))
+        self.metrics.throttled()
+        self.metrics.retried()
+        self.metrics.end(aws_inventory.tracing.OK)
+        self.metrics.begin(('iam', None, 'ListUsers'))
+        self.metrics.end('skip_target')
+        self.storage.add_response('ec2', 'us-east-1', 'DescribeInstances', {'Reservations': []})
+        self.metrics.begin(('ec2', 'us-west-2', 'DescribeInstances'))
+
+    def tearDown(self):
+        self.metrics.shutdown()
+
+    def test_render(self):
+        text = self.metrics.render()
+        self.assertIn('aws_inventory_calls_completed_total{service="ec2",region="us-east-1"} 1',
+                      text)
+        self.assertIn('aws_inventory_calls_failed_total{service="iam",region="global"} 1', text)
+        self.assertIn('aws_inventory_calls_throttled_total{service="ec2",region="us-east-1"} 1',
+                      text)
+        self.assertIn('aws_inventory_calls_retried_total{service="ec2",region="us-east-1"} 1', text)
+        self.assertIn('aws_inventory_targets 3', text)
+        # one worker is still invoking
+        self.assertIn('aws_inventory_workers_busy 1', text)
+        self.assertIn('aws_inventory_worker_utilization 0.5', text)
+        self.assertIn('aws_inventory_store_responses 1', text)
+        # nothing on disk to measure
+        self.assertNotIn('aws_inventory_store_bytes', text)
+
+    def test_serve(self):
+        port = self.metrics.serve(0)
+        response = urllib2.urlopen('http://127.0.0.1:{}/metrics'.format(port))
+        self.assertTrue(response.info()['Content-Type'].startswith('text/plain'))
+        self.assertIn('aws_inventory_targets 3', response.read())
+
+    def test_disk_store_stats(self):
+        store_dir = tempfile.mkdtemp()
+        try:
+            backend = aws_inventory.segments.SegmentBackend(store_dir)
+            backend.put_response('ec2', 'us-east-1', 'DescribeInstances', {'Reservations': []})
+            stats = backend.get_stats()
+            self.assertEqual((stats['backend'], stats['responses']), ('disk', 1))
+            self.assertTrue(stats['bytes'] > 0)
+            backend.close()
+        finally:
+            shutil.rmtree(store_dir)
+
+    def test_sqlite_store_stats(self):
+        store_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(store_dir, 'inventory.db')
+            backend = aws_inventory.database.SqliteBackend(path)
+            backend.put_response('ec2', 'us-east-1', 'DescribeInstances', {'Reservations': []})
+            backend.close()
+            backend = aws_inventory.database.SqliteBackend(path)
+            stats = backend.get_stats()
+            self.assertEqual((stats['backend'], stats['responses']), ('sqlite', 1))
+            # the database file, with or without a write-ahead log beside it
+            self.assertTrue(stats['bytes'] >= os.path.getsize(path) > 0)
+            backend.close()
+        finally:
+            shutil.rmtree(store_dir)
+
+if __name__ == '__main__':
+    unittest.main()
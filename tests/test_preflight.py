@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import aws_inventory.config
+import aws_inventory.preflight
+
+
+TEST_CREDENTIALS = {'AccessKeyId': 'test_access_key_id',
+                    'SecretAccessKey': 'test_secret_access_key',
+                    'SessionToken': None}
+TEST_REGION_STATES = {'region1': aws_inventory.preflight.ENABLED,
+                      'opt-in-region': aws_inventory.preflight.DISABLED,
+                      'offline-region': aws_inventory.preflight.UNREACHABLE}
+
+class TestRegionPreflight(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.probed = []
+        self.valid_credentials = True
+        self.region_states = dict(TEST_REGION_STATES)
+        self.probe_region = aws_inventory.preflight.probe_region
+        self.check_credentials = aws_inventory.preflight.check_credentials
+
+        def probe_region(region, credentials):
+            self.probed.append(region)
+            return self.region_states[region]
+        aws_inventory.preflight.probe_region = probe_region
+        aws_inventory.preflight.check_credentials = lambda credentials: self.valid_credentials
+
+    def tearDown(self):
+        aws_inventory.preflight.probe_region = self.probe_region
+        aws_inventory.preflight.check_credentials = self.check_credentials
+        shutil.rmtree(self.cache_dir)
+
+    def get_region_states(self, **kwargs):
+        return aws_inventory.preflight.get_region_states(TEST_REGION_STATES.keys(),
+                                                         TEST_CREDENTIALS,
+                                                         self.cache_dir,
+                                                         **kwargs)
+
+    def test_states_are_cached(self):
+        self.assertEqual(self.get_region_states(), TEST_REGION_STATES)
+        self.assertEqual(sorted(self.probed), sorted(TEST_REGION_STATES))
+        del self.probed[:]
+        self.assertEqual(self.get_region_states(), TEST_REGION_STATES)
+        # only unreachable regions are probed again
+        self.assertEqual(self.probed, ['offline-region'])
+
+    def test_expired_states_are_probed(self):
+        self.get_region_states()
+        cache_file = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(cache_file) as in_fp:
+            cached = json.load(in_fp)
+        cached['region1']['checked'] = time.time() - aws_inventory.config.REGION_PREFLIGHT_TTL - 1
+        with open(cache_file, 'w') as out_fp:
+            json.dump(cached, out_fp)
+        del self.probed[:]
+        self.get_region_states()
+        self.assertEqual(sorted(self.probed), ['offline-region', 'region1'])
+
+    def test_rejected_credentials(self):
+        self.valid_credentials = False
+        self.assertEqual(self.get_region_states(), {})
+        self.assertEqual(self.probed, [])
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_all_disabled_not_cached(self):
+        self.region_states = dict.fromkeys(TEST_REGION_STATES, aws_inventory.preflight.DISABLED)
+        self.assertEqual(self.get_region_states(), self.region_states)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        del self.probed[:]
+        self.get_region_states()
+        self.assertEqual(sorted(self.probed), sorted(TEST_REGION_STATES))
+
+    def test_prune_regions(self):
+        svc_descriptors = {'svc': {'regions': frozenset(TEST_REGION_STATES),
+                                   'ops': ['ListThings', 'ListOthers']},
+                           'global-svc': {'regions': [None], 'ops': ['ListThings']}}
+        ops_count = aws_inventory.preflight.prune_regions(svc_descriptors, TEST_REGION_STATES)
+        self.assertEqual(svc_descriptors['svc']['regions'], frozenset(['region1']))
+        self.assertEqual(svc_descriptors['global-svc']['regions'], [None])
+        self.assertEqual(ops_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
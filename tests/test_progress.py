@@ -0,0 +1,78 @@
+import subprocess
+import sys
+import unittest
+from StringIO import StringIO
+
+import aws_inventory.progress
+import aws_inventory.progress_gui
+
+
+class TestProgressReporter(unittest.TestCase):
+    def test_counts(self):
+        reporter = aws_inventory.progress.ProgressReporter(10)
+        reporter.update_progress(4)
+        reporter.start_target('svc', 'region1')
+        reporter.start_target('svc', 'region2')
+        reporter.finish_target('svc', 'region1')
+        stats = reporter.get_stats()
+        self.assertEqual((stats.done, stats.total, stats.in_flight), (5, 10, 1))
+
+    def test_stop(self):
+        reporter = aws_inventory.progress.ProgressReporter(10)
+        reporter.start_target('svc', 'region1')
+        reporter.request_stop()
+        self.assertRaises(aws_inventory.progress.LifetimeError,
+                          reporter.finish_target,
+                          'svc',
+                          'region1')
+        # the finished target still counts
+        self.assertEqual(reporter.get_stats().in_flight, 0)
+
+    def test_eta(self):
+        reporter = aws_inventory.progress.ProgressReporter(10)
+        reporter._samples.append((0, 0))
+        reporter.done = 5
+        stats = reporter.get_stats()
+        self.assertGreater(stats.rate, 0)
+        self.assertAlmostEqual(stats.eta, 5 / stats.rate)
+
+    def test_run_terminal(self):
+        out_fp = StringIO()
+        reporter = aws_inventory.progress.TerminalProgressReporter(2, out_fp)
+
+        def work():
+            for region in ('region1', 'region2'):
+                reporter.start_target('svc', region)
+                reporter.finish_target('svc', region)
+            reporter.finish_work()
+        reporter.run(work)
+        self.assertIn('2/2 100%', out_fp.getvalue())
+        self.assertTrue(out_fp.getvalue().endswith('\n'))
+
+    def test_headless_reporters_do_not_import_tk(self):
+        # in a new interpreter, since other tests import the GUI
+        script = ('import sys; import aws_inventory.progress as progress; '
+                  '[progress.create_reporter(kind, "test", 1) for kind in ("terminal", "log", "none")]; '
+                  'sys.exit("Tkinter" in sys.modules)')
+        self.assertEqual(subprocess.call([sys.executable, '-c', script]), 0)
+
+class TestGuiEvents(unittest.TestCase):
+    def test_coalesce(self):
+        update = aws_inventory.progress_gui.coalesce([
+            (aws_inventory.progress_gui.TARGET_COUNTS, {('svc', 'region1'): 2}),
+            (aws_inventory.progress_gui.STARTED, 'svc', 'region1'),
+            (aws_inventory.progress_gui.STARTED, 'svc', 'region2'),
+            (aws_inventory.progress_gui.FINISHED, 'svc', 'region1'),
+            (aws_inventory.progress_gui.FINISHED, 'svc', 'region1'),
+            (aws_inventory.progress_gui.FINISHED, 'svc', 'region2')
+        ])
+        self.assertEqual(update.finished, {('svc', 'region1'): 2, ('svc', 'region2'): 1})
+        self.assertEqual(update.last_started, ('svc', 'region2'))
+        self.assertEqual(update.target_counts, {('svc', 'region1'): 2})
+        self.assertFalse(update.work_finished)
+        self.assertTrue(aws_inventory.progress_gui.coalesce(
+            [(aws_inventory.progress_gui.WORK_FINISHED,)]
+        ).work_finished)
+
+if __name__ == '__main__':
+    unittest.main()
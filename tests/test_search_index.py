@@ -0,0 +1,112 @@
+import datetime
+import json
+import unittest
+from StringIO import StringIO
+
+import aws_inventory.search_index
+import aws_inventory.store
+from tools import synthetic_inventory
+
+
+def build_storage():
+    storage = aws_inventory.store.ResultStore('default')
+    synthetic_inventory.populate_store(storage, 300, regions=('us-east-1', 'eu-west-1'))
+    storage.add_response('svc', 'us-east-1', 'Empty', {})
+    storage.add_response('svc', 'us-east-1', 'Nested', {'A': {'B': [{'C': u'\u00e9t\u00e9'}]},
+                                                        'When': datetime.datetime(2018, 1, 2),
+                                                        'Blob': '\xff\x00',
+                                                        'List': [1, None, 'arn:aws:s3:::bucket']})
+    # a global service, without a region
+    storage.add_response('iam', None, 'ListUsers', {'Users': [{'UserName': 'user1'}]})
+    return storage
+
+def write(func, *args):
+    out_fp = StringIO()
+    out_fp.name = '<memory file>'
+    func(out_fp, *args)
+    return out_fp.getvalue()
+
+def read_index(data):
+    """Read a search index, undoing the differences it is written with."""
+    index = json.loads(data)
+    index['parents'] = [node - distance if distance else -1
+                        for node, distance in enumerate(index['parents'])]
+    for token, differences in index['tokens'].items():
+        nodes = []
+        for difference in differences:
+            nodes.append(difference + (nodes[-1] if nodes else 0))
+        index['tokens'][token] = nodes
+    return index
+
+def get_path(index, node):
+    path = []
+    while node != -1:
+        path.append(index['positions'][node])
+        node = index['parents'][node]
+    return path[::-1]
+
+def find_node(roots, path):
+    node = roots[path[0]]
+    for position in path[1:]:
+        node = node['children'][position]
+    return node
+
+class TestTokenize(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(aws_inventory.search_index.tokenize('InstanceId = i-0123ABC'),
+                         set(['instanceid', 'i', '0123abc']))
+        self.assertEqual(aws_inventory.search_index.tokenize(
+            'Arn = arn:aws:iam::123456789012:role/web_api'),
+                         set(['arn', 'aws', 'iam', '123456789012', 'role', 'web', 'api']))
+        self.assertEqual(aws_inventory.search_index.tokenize(u'C = \u00c9t\u00e9'),
+                         set(['c', u'\u00e9t\u00e9']))
+        self.assertEqual(aws_inventory.search_index.tokenize('x' * 100),
+                         set(['x' * aws_inventory.search_index.MAX_TOKEN_LENGTH,
+                              'x' * (100 - aws_inventory.search_index.MAX_TOKEN_LENGTH)]))
+
+class TestSearchIndex(unittest.TestCase):
+    def test_index_matches_data_file(self):
+        storage = build_storage()
+        index = aws_inventory.search_index.SearchIndex()
+        data = json.loads(write(storage.generate_data_file, index))
+        self.assertEqual(data, json.loads(write(storage.generate_data_file)))
+        written = read_index(write(index.write))
+        self.assertEqual(written['format'], 'aws-inventory-search-index')
+        self.assertEqual(len(written['parents']), len(index))
+
+        # every token is in the text of every node it maps to
+        roots = data['responses']
+        for token, nodes in written['tokens'].items():
+            for node in nodes:
+                text = find_node(roots, get_path(written, node))['text']
+                if not isinstance(text, basestring):
+                    # as the GUI shows it
+                    text = json.dumps(text)
+                self.assertIn(token, aws_inventory.search_index.tokenize(text))
+        self.assertNotIn('requestid', written['tokens'])
+
+        # scopes name their nodes
+        scopes = written['scopes']
+        (ec2,) = scopes['service']['ec2']
+        self.assertEqual(find_node(roots, get_path(written, ec2))['text'], 'ec2')
+        for node in scopes['region']['us-east-1']:
+            self.assertEqual(find_node(roots, get_path(written, node))['text'], 'us-east-1')
+        (global_region,) = scopes['region'][aws_inventory.search_index.GLOBAL_REGION_NAME]
+        self.assertIsNone(find_node(roots, get_path(written, global_region))['text'])
+        for node in scopes['operation']['describeinstances']:
+            self.assertTrue(find_node(roots, get_path(written, node))['text']
+                            .startswith('DescribeInstances'))
+
+        (arn,) = written['tokens']['bucket']
+        self.assertEqual(find_node(roots, get_path(written, arn))['text'], 'arn:aws:s3:::bucket')
+
+    def test_chunked_index_unchanged(self):
+        storage = build_storage()
+        index = aws_inventory.search_index.SearchIndex()
+        write(storage.generate_data_file, index)
+        chunked_index = aws_inventory.search_index.SearchIndex()
+        write(storage.generate_chunked_data_file, chunked_index)
+        self.assertEqual(write(chunked_index.write), write(index.write))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from dateutil.tz import tzutc
+
+import aws_inventory.segments
+import aws_inventory.store
+
+
+TEST_RESPONSE = {'Things': [{'Name': 'thing1',
+                             'Created': datetime.datetime(2018, 1, 2, 3, 4, 5, tzinfo=tzutc()),
+                             'Blob': '\xff\xfe'}]}
+
+class TestSegmentBackend(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = aws_inventory.segments.SegmentBackend(self.directory)
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self):
+        self.backend.close()
+        self.backend = aws_inventory.segments.SegmentBackend(self.directory)
+
+    def test_round_trip(self):
+        self.backend.put_response('svc', 'region1', 'ListThings', TEST_RESPONSE)
+        self.backend.put_response('svc', None, 'ListThings', {'Things': []})
+        self.reopen()
+        self.assertEqual(self.backend.get_response('svc', 'region1', 'ListThings'), TEST_RESPONSE)
+        self.assertEqual([entry[:3] for entry in self.backend.iter_responses()],
+                         [('svc', None, 'ListThings'), ('svc', 'region1', 'ListThings')])
+
+    def test_pages(self):
+        self.backend.put_page('svc', 'region1', 'ListThings', {'Things': [1]}, ['Things'], 1)
+        self.backend.put_page('svc', 'region1', 'ListThings', {'Things': [2]}, ['Things'], 2)
+        # unfinished pagination is not a response
+        self.assertIsNone(self.backend.get_response('svc', 'region1', 'ListThings'))
+        self.backend.finish_pages('svc', 'region1', 'ListThings', {'Owner': 'me'})
+        self.assertEqual(self.backend.get_response('svc', 'region1', 'ListThings'),
+                         {'Things': [1, 2], 'Owner': 'me'})
+
+        # pagination restarts on a first page
+        self.backend.put_page('svc', 'region1', 'ListThings', {'Things': [3]}, ['Things'], 1)
+        self.backend.finish_pages('svc', 'region1', 'ListThings', {})
+        self.reopen()
+        self.assertEqual(self.backend.get_response('svc', 'region1', 'ListThings'), {'Things': [3]})
+
+    def test_share_response(self):
+        self.backend.put_response('svc', 'region1', 'ListThings', TEST_RESPONSE)
+        written = self.backend.bytes_written
+        shared = dict(TEST_RESPONSE, ResponseMetadata={'RequestId': 'region2'})
+        self.backend.share_response('svc', 'region2', 'ListThings', shared,
+                                    ('svc', 'region1', 'ListThings'))
+        # only the metadata and where the values are
+        self.assertLess(self.backend.bytes_written - written, 100)
+        # the shared record stays when the first response is replaced
+        self.backend.put_response('svc', 'region1', 'ListThings', {'Things': []})
+        self.reopen()
+        self.assertEqual(self.backend.get_response('svc', 'region2', 'ListThings'), shared)
+        self.assertEqual(sorted(self.backend.iter_keys()),
+                         [('svc', 'region1', 'ListThings'), ('svc', 'region2', 'ListThings')])
+
+    def test_remove(self):
+        self.backend.put_response('svc', 'region1', 'ListThings', TEST_RESPONSE)
+        self.backend.remove_response('svc', 'region1', 'ListThings')
+        self.reopen()
+        self.assertEqual(list(self.backend.iter_responses()), [])
+
+    def test_partial_write_is_ignored(self):
+        self.backend.put_response('svc', 'region1', 'ListThings', TEST_RESPONSE)
+        self.backend.put_response('svc', 'region2', 'ListThings', TEST_RESPONSE)
+        self.backend.close()
+        segment_path = os.path.join(self.directory, 'segment-00000.ndjson')
+        with open(segment_path, 'ab') as segment_fp:
+            segment_fp.truncate(os.path.getsize(segment_path) - 1)
+
+        self.backend = aws_inventory.segments.SegmentBackend(self.directory)
+        self.assertEqual([entry[:3] for entry in self.backend.iter_responses()],
+                         [('svc', 'region1', 'ListThings')])
+        self.backend.put_response('svc', 'region3', 'ListThings', TEST_RESPONSE)
+        self.reopen()
+        self.assertEqual([entry[1] for entry in self.backend.iter_responses()],
+                         ['region1', 'region3'])
+
+    def test_segment_rotation(self):
+        self.backend.close()
+        self.backend = aws_inventory.segments.SegmentBackend(self.directory, segment_max_bytes=100)
+        for i in range(5):
+            self.backend.put_response('svc', 'region{:d}'.format(i), 'ListThings', TEST_RESPONSE)
+        self.reopen()
+        self.assertEqual(len([name for name in os.listdir(self.directory)
+                              if name.startswith('segment-')]), 5)
+        self.assertEqual([entry[3] for entry in self.backend.iter_responses()], [TEST_RESPONSE] * 5)
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume(self):
+        storage = aws_inventory.store.ResultStore(
+            'default',
+            aws_inventory.segments.SegmentBackend(self.directory))
+        storage.add_response('svc', 'region1', 'ListThings', TEST_RESPONSE)
+        storage.add_exception('svc', 'region1', 'DescribeBroken', ValueError('broken'))
+        storage.add_response_page('svc', 'region1', 'ListPages', {'Things': [1]}, ['Things'])
+        storage.close()
+
+        storage = aws_inventory.store.ResultStore(
+            'default',
+            aws_inventory.segments.SegmentBackend(self.directory))
+        self.assertTrue(storage.has_exceptions('svc', 'DescribeBroken'))
+        # the paginated response never finished, so it has to be invoked again
+        self.assertEqual(storage.get_completed_targets(),
+                         set([('svc', 'region1', 'ListThings'), ('svc', 'region1', 'DescribeBroken')]))
+        self.assertEqual(storage.get_response('svc', 'region1', 'ListThings'), TEST_RESPONSE)
+        storage.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import unittest
+from StringIO import StringIO
+
+import botocore.session
+from botocore.stub import Stubber
+
+import aws_inventory.invoker
+import aws_inventory.store
+import aws_inventory.tracing
+from tests.test_invoker import make_params
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.client = botocore.session.get_session().create_client(
+            'sqs',
+            region_name='us-east-1',
+            aws_access_key_id='test_access_key_id',
+            aws_secret_access_key='test_secret_access_key')
+        self.tracer = aws_inventory.tracing.Tracer()
+        self.stubber = Stubber(self.client)
+        self.stubber.add_response('list_queues', {'QueueUrls': ['queue1', 'queue2']})
+        self.stubber.activate()
+        storage = aws_inventory.store.ResultStore('default')
+        params = make_params(storage,
+                             get_client=lambda svc_name, region: self.client,
+                             tracer=self.tracer)
+        self.tracer.start()
+        for target in (('sqs', 'us-east-1', 'ListQueues'), ('sqs', 'us-east-1', 'DescribeBroken')):
+            aws_inventory.invoker.ApiInvoker.invoke_target(target, params)
+
+    def tearDown(self):
+        self.stubber.deactivate()
+
+    def test_records(self):
+        ok_record, error_record = self.tracer.records
+        self.assertEqual((ok_record.svc_op, ok_record.outcome), ('ListQueues', 'ok'))
+        self.assertEqual(len(ok_record.requests), 1)
+        self.assertEqual(ok_record.item_count, 2)
+        self.assertGreaterEqual(ok_record.queue_wait, 0)
+        self.assertEqual(error_record.outcome, 'skip_operation')
+
+    def test_write(self):
+        trace_fp = StringIO()
+        self.tracer.write_trace(trace_fp)
+        events = json.loads(trace_fp.getvalue())['traceEvents']
+        self.assertEqual([event['name'] for event in events if event['ph'] == 'X'],
+                         ['ListQueues', 'request 1', 'DescribeBroken'])
+
+        summary_fp = StringIO()
+        self.tracer.write_summary(summary_fp)
+        self.assertIn('sqs.ListQueues', summary_fp.getvalue())
+        self.assertIn('us-east-1', summary_fp.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+"""Benchmark the invoker against a local stand-in for AWS. No AWS account or network is needed.
+
+The real ApiInvoker invokes every operation of synthetic services in synthetic regions, as a scan
+would, and writes its output. Reports calls per second, wall time, peak memory, and the time taken
+to generate the output. Run from the repository root:
+
+    $ python -m tools.benchmark --services 50 --regions 16 --ops 10 --latency 0.05 --pages 3
+
+Compare runs of the same arguments before and after a change to catch performance regressions in
+scheduling, pagination, and storage.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import urllib2
+
+import aws_inventory.config
+import aws_inventory.invoker
+import aws_inventory.progress
+from tools import stub_aws
+
+
+LOGGER = logging.getLogger(__name__)
+
+CREDENTIALS = {'AccessKeyId': 'AKIDBENCHMARK',
+               'SecretAccessKey': 'benchmark',
+               'SessionToken': None}
+
+class BenchmarkInvoker(aws_inventory.invoker.ApiInvoker):
+    """Invoker timing how long writing its output takes."""
+
+    output_seconds = None
+
+    def write_results(self, *args, **kwargs):
+        start = time.time()
+        super(BenchmarkInvoker, self).write_results(*args, **kwargs)
+        self.output_seconds = time.time() - start
+
+def build_script_args(args, work_dir):
+    """Build the arguments of a scan as aws_inventory.py would parse them.
+
+    :param argparse.Namespace args: benchmark arguments
+    :param str work_dir: directory for the output
+    :rtype: argparse.Namespace
+    :return: scan arguments
+    """
+    return argparse.Namespace(
+        profile='benchmark',
+        dry_run=False,
+        no_region_preflight=True,
+        max_threads=args.max_threads,
+        stream_pages=args.stream_pages,
+        keep_response_metadata=False,
+        store_dir=os.path.join(work_dir, 'store') if args.store_dir else None,
+        resume=None,
+        sqlite_db=None,
+        progress=args.progress,
+        trace=False,
+        metrics_port=None,
+        exceptions_dump=None,
+        responses_dump=None,
+        dump_format='pickle',
+        gui_data_format='json',
+        search_index=False,
+        gui_data_file=os.path.join(work_dir, 'aws_inventory_data-benchmark.json'),
+        verbose=False
+    )
+
+def run(args):
+    """Run the benchmark.
+
+    :param argparse.Namespace args: benchmark arguments
+    :rtype: dict
+    :return: results
+    """
+    work_dir = tempfile.mkdtemp(prefix='aws_inventory-benchmark-')
+    server = None
+    try:
+        data_dir = os.path.join(work_dir, 'models')
+        services = stub_aws.write_models(data_dir, args.services, args.ops)
+        # botocore finds the synthetic service models here
+        os.environ['AWS_DATA_PATH'] = data_dir
+
+        # a separate process so the server neither competes for the GIL nor adds to peak memory
+        stub_options = {'latency': args.latency,
+                        'pages': args.pages,
+                        'items_per_page': args.items,
+                        'item_bytes': args.item_bytes,
+                        'throttle_rate': args.throttle_rate,
+                        'error_rate': args.error_rate,
+                        'seed': args.seed}
+        parent_conn, child_conn = multiprocessing.Pipe()
+        server = multiprocessing.Process(target=stub_aws.serve_in_process,
+                                         args=(stub_options, child_conn))
+        server.daemon = True
+        server.start()
+        endpoint_url = parent_conn.recv()
+
+        regions = stub_aws.get_region_names(args.regions)
+        svc_descriptors = dict((svc_name, {'regions': regions, 'ops': op_names})
+                               for svc_name, op_names in services.items())
+        ops_count = args.services * args.regions * args.ops
+        invoker = BenchmarkInvoker(build_script_args(args, work_dir),
+                                   svc_descriptors,
+                                   ops_count,
+                                   credentials=CREDENTIALS,
+                                   endpoint_url=endpoint_url)
+        start = time.time()
+        invoker.start()
+        wall_seconds = time.time() - start
+
+        server_stats = json.load(urllib2.urlopen(endpoint_url + stub_aws.STATS_PATH))
+        output_seconds = invoker.output_seconds or 0.0
+        invoke_seconds = wall_seconds - output_seconds
+        return {
+            'operations': ops_count,
+            'requests': server_stats['requests'],
+            'throttled': server_stats['throttled'],
+            'errors': server_stats['errors'],
+            'received_bytes': server_stats['bytes'],
+            'wall_seconds': wall_seconds,
+            'invoke_seconds': invoke_seconds,
+            'operations_per_second': ops_count / invoke_seconds if invoke_seconds else 0.0,
+            'requests_per_second': (server_stats['requests'] / invoke_seconds
+                                    if invoke_seconds else 0.0),
+            'output_seconds': output_seconds,
+            'output_bytes': os.path.getsize(invoker.script_args.gui_data_file),
+            # kilobytes on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        }
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def print_results(results, out_fp=sys.stdout):
+    """
+    :param dict results: benchmark results
+    :param file out_fp: file to print to
+    """
+    lines = [('Operations', '{operations:d}'),
+             ('HTTP requests', '{requests:d} ({throttled:d} throttled, {errors:d} errors)'),
+             ('Received', '{received_bytes:,d} bytes'),
+             ('Wall time', '{wall_seconds:.2f} s'),
+             ('Invoking', '{invoke_seconds:.2f} s, {operations_per_second:.1f} operations/s, '
+                          '{requests_per_second:.1f} requests/s'),
+             ('Output generation', '{output_seconds:.2f} s, {output_bytes:,d} bytes'),
+             ('Peak RSS', '{peak_rss_mb:.1f} MB')]
+    for name, value in lines:
+        out_fp.write('{:<20}{}\n'.format(name + ':', value.format(**results)))
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the invoker against a local stand-in for AWS.'
+    )
+
+    parser.add_argument('--services', type=int, default=20,
+                        help='Number of synthetic services (default: %(default)s)')
+
+    parser.add_argument('--regions', type=int, default=8,
+                        help='Number of synthetic regions (default: %(default)s)')
+
+    parser.add_argument('--ops', type=int, default=6,
+                        help=('Number of operations per service. Every other one is paginated '
+                              '(default: %(default)s)'))
+
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Seconds the server waits before answering (default: %(default)s)')
+
+    parser.add_argument('--pages', type=int, default=2,
+                        help=('Pages of a paginated operation at the default page size (default: '
+                              '%(default)s)'))
+
+    parser.add_argument('--items', type=int, default=10,
+                        help='Items in each page (default: %(default)s)')
+
+    parser.add_argument('--item-bytes', type=int, default=200,
+                        help='Size of the payload of each item (default: %(default)s)')
+
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help=('Fraction of requests answered with a throttling error (default: '
+                              '%(default)s)'))
+
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help=('Fraction of operations which are denied in a region (default: '
+                              '%(default)s)'))
+
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for choosing requests to throttle (default: %(default)s)')
+
+    parser.add_argument('--max-threads',
+                        type=int,
+                        default=aws_inventory.config.MAX_THREADS,
+                        help='Number of worker threads invoking APIs (default: %(default)s)')
+
+    parser.add_argument('--stream-pages',
+                        action='store_true',
+                        help=('Store each page of a paginated response as it arrives. Only '
+                              'effective with --store-dir'))
+
+    parser.add_argument('--store-dir',
+                        action='store_true',
+                        help='Append responses to a store directory instead of keeping them in memory')
+
+    parser.add_argument('--progress',
+                        choices=aws_inventory.progress.REPORTERS,
+                        default=aws_inventory.progress.NONE,
+                        help='How to show progress (default: %(default)s)')
+
+    parser.add_argument('--json',
+                        dest='json_file',
+                        help='File to write the results to, for comparing runs')
+
+    parser.add_argument('--debug',
+                        action='store_true',
+                        help='Log what the invoker does, including every error')
+
+    return parser.parse_args(args)
+
+def main(args):
+    logging.basicConfig()
+    # denied operations are expected, and logging each one would slow the invoker down
+    logging.getLogger(aws_inventory.__name__).setLevel(
+        logging.DEBUG if args.debug else logging.CRITICAL
+    )
+    results = run(args)
+    print_results(results)
+    if args.json_file:
+        with open(args.json_file, 'w') as out_fp:
+            json.dump(results, out_fp, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,294 @@
+"""Benchmark serializing large result stores, without invoking any API.
+
+A store is filled with synthetic responses (see synthetic_inventory.py) at each scale, then each way
+of writing it out is timed, along with the memory it needs on top of the store:
+
+* gui_data: ResultStore.generate_data_file
+* response_store: ResultStore.get_response_store
+* response_dump: ResultStore.dump_response_store
+* gui_load: parsing the GUI data file as the GUI does when it is opened
+* gui_chunked: ResultStore.generate_chunked_data_file
+* gui_chunked_open: reading the trailer and manifest of the chunked GUI data file, as the GUI does
+  before showing the services
+* search_index: ResultStore.generate_data_file while building a search index, then writing the
+  index. Its size is the size of the index.
+* indexed_dump: ResultStore.dump_indexed_response_store
+* indexed_get: opening the indexed dump and reading the last response in it, as reading back a
+  single response does
+* sqlite: writing every response to a SQLite store (see database.py). Its size is the size of the
+  database.
+* sqlite_lookup: finding the last resource written to the SQLite store by its ID
+
+Each scale runs in its own process so memory of one does not count towards the next. Run from the
+repository root:
+
+    $ python -m tools.benchmark_store --resources 10000 100000 1000000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import aws_inventory.database
+import aws_inventory.dumpfile
+import aws_inventory.search_index
+import aws_inventory.segments
+import aws_inventory.store
+from tools import synthetic_inventory
+
+
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+def _read_status_kb(field):
+    with open(PROC_STATUS) as status_fp:
+        for line in status_fp:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+class MemoryMeter(object):
+    """Measure the peak memory of the process during a step.
+
+    On Linux, the peak (VmHWM) is reset before each step. Elsewhere, only the peak of the whole
+    process is known, so a step is only measured if it sets a new peak.
+    """
+
+    def __init__(self):
+        self.resettable = False
+        try:
+            self._reset()
+            self.resettable = True
+        except (IOError, OSError, KeyError):
+            pass
+
+    @staticmethod
+    def _reset():
+        with open(PROC_CLEAR_REFS, 'w') as clear_refs_fp:
+            clear_refs_fp.write('5')
+        _read_status_kb('VmHWM')
+
+    def current_mb(self):
+        """
+        :rtype: float
+        :return: resident memory now, or the peak so far where that is unknown
+        """
+        if self.resettable:
+            return _read_status_kb('VmRSS') / 1024.0
+        return self.peak_mb()
+
+    def start(self):
+        """Start measuring a step.
+
+        :rtype: float
+        :return: resident memory before the step
+        """
+        if self.resettable:
+            self._reset()
+        return self.current_mb()
+
+    def peak_mb(self):
+        """
+        :rtype: float
+        :return: peak resident memory since the step started
+        """
+        if self.resettable:
+            return _read_status_kb('VmHWM') / 1024.0
+        # kilobytes on Linux, bytes on OS X
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (
+            1024.0 * (1024 if sys.platform == 'darwin' else 1))
+
+def _measure(meter, results, step, func, *args):
+    """Run a step, recording its time and memory, and the size in bytes it returns, if any."""
+    start_mb = meter.start()
+    start = time.time()
+    size = func(*args)
+    results.append({'step': step,
+                    'seconds': time.time() - start,
+                    'peak_mb': meter.peak_mb(),
+                    'extra_mb': max(0.0, meter.peak_mb() - start_mb),
+                    'bytes': size})
+
+def _populate(storage, resource_count, seed):
+    synthetic_inventory.populate_store(storage, resource_count, seed)
+
+def _write_to(path, write_func):
+    with open(path, 'wb') as out_fp:
+        write_func(out_fp)
+    return os.path.getsize(path)
+
+def _load_gui_data(path):
+    with open(path) as data_fp:
+        json.load(data_fp)
+
+def _open_chunked_gui_data(path):
+    with open(path, 'rb') as data_fp:
+        data_fp.seek(max(0, os.path.getsize(path) - 256))
+        offset, length = json.loads(data_fp.read().splitlines()[-1])['manifest']
+        data_fp.seek(offset)
+        json.loads(data_fp.read(length))
+
+def _write_search_index(storage, data_path, index_path):
+    index = aws_inventory.search_index.SearchIndex()
+    _write_to(data_path, lambda out_fp: storage.generate_data_file(out_fp, index))
+    return _write_to(index_path, index.write)
+
+def _get_last_indexed(path):
+    with open(path, 'rb') as dump_fp:
+        reader = aws_inventory.dumpfile.DumpReader(dump_fp)
+        reader.get(*reader.keys()[-1])
+
+def _write_sqlite(storage, path):
+    backend = aws_inventory.database.SqliteBackend(path)
+    for service, region, svc_op, resp in storage.backend.iter_responses():
+        backend.put_response(service, region, svc_op, resp)
+    backend.close()
+    return os.path.getsize(path)
+
+def _find_last_resource(path):
+    backend = aws_inventory.database.SqliteBackend(path)
+    (resource_id,) = backend._conn.execute(
+        'SELECT resource_id FROM resources WHERE resource_id IS NOT NULL ORDER BY id DESC LIMIT 1'
+    ).fetchone()
+    if not backend.find_resources(resource_id):
+        raise AssertionError('Resource "{}" not found.'.format(resource_id))
+    backend.close()
+
+def run_scale(resource_count, store_dir=None, seed=0):
+    """Fill a store with synthetic responses and time writing it out.
+
+    :param int resource_count: number of resources across all responses
+    :param str store_dir: directory for an on-disk store, or None for the in-memory store
+    :param int seed: seed for generating resources
+    :rtype: list
+    :return: results of each step
+    """
+    meter = MemoryMeter()
+    work_dir = tempfile.mkdtemp(prefix='aws_inventory-benchmark-')
+    results = []
+    try:
+        backend = None
+        if store_dir:
+            backend = aws_inventory.segments.SegmentBackend(os.path.join(store_dir, 'store'))
+        storage = aws_inventory.store.ResultStore('benchmark', backend)
+        _measure(meter, results, 'populate', _populate, storage, resource_count, seed)
+        gui_data_path = os.path.join(work_dir, 'aws_inventory_data-benchmark.js')
+        _measure(meter, results, 'gui_data', _write_to, gui_data_path, storage.generate_data_file)
+        _measure(meter, results, 'response_store', lambda: len(storage.get_response_store()))
+        _measure(meter, results, 'response_dump', _write_to,
+                 os.path.join(work_dir, 'responses.pickle'), storage.dump_response_store)
+        _measure(meter, results, 'gui_load', _load_gui_data, gui_data_path)
+        chunked_path = os.path.join(work_dir, 'aws_inventory_data-benchmark.ndjson')
+        _measure(meter, results, 'gui_chunked', _write_to, chunked_path,
+                 storage.generate_chunked_data_file)
+        _measure(meter, results, 'gui_chunked_open', _open_chunked_gui_data, chunked_path)
+        _measure(meter, results, 'search_index', _write_search_index, storage, gui_data_path,
+                 os.path.join(work_dir, 'aws_inventory_data-benchmark.index.json'))
+        indexed_dump_path = os.path.join(work_dir, 'responses.dump')
+        _measure(meter, results, 'indexed_dump', _write_to, indexed_dump_path,
+                 storage.dump_indexed_response_store)
+        _measure(meter, results, 'indexed_get', _get_last_indexed, indexed_dump_path)
+        sqlite_path = os.path.join(work_dir, 'inventory.db')
+        _measure(meter, results, 'sqlite', _write_sqlite, storage, sqlite_path)
+        _measure(meter, results, 'sqlite_lookup', _find_last_resource, sqlite_path)
+        storage.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    for result in results:
+        result['resources'] = resource_count
+        result['memory_resettable'] = meter.resettable
+    return results
+
+def _run_scale_in_process(conn, resource_count, store_dir, seed):
+    try:
+        conn.send(run_scale(resource_count, store_dir, seed))
+    except Exception as e:
+        conn.send(e)
+    finally:
+        conn.close()
+
+def run(resource_counts, use_store_dir=False, seed=0):
+    """Run the benchmark at each scale, each in its own process.
+
+    :param list resource_counts: numbers of resources
+    :param bool use_store_dir: whether to use an on-disk store rather than the in-memory one
+    :param int seed: seed for generating resources
+    :rtype: list
+    :return: results of each step at each scale
+    """
+    results = []
+    for resource_count in resource_counts:
+        store_dir = tempfile.mkdtemp(prefix='aws_inventory-store-') if use_store_dir else None
+        try:
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_run_scale_in_process,
+                                              args=(child_conn, resource_count, store_dir, seed))
+            process.start()
+            scale_results = parent_conn.recv()
+            process.join()
+        finally:
+            if store_dir:
+                shutil.rmtree(store_dir, ignore_errors=True)
+        if isinstance(scale_results, Exception):
+            raise scale_results
+        results.extend(scale_results)
+    return results
+
+def print_results(results, out_fp=sys.stdout):
+    """
+    :param list results: benchmark results
+    :param file out_fp: file to print to
+    """
+    out_fp.write('{:>10} {:<16}{:>10}{:>12}{:>12}{:>16}\n'.format(
+        'resources', 'step', 'seconds', 'peak MB', 'extra MB', 'bytes'))
+    for result in results:
+        out_fp.write('{:>10,d} {:<16}{:>10.2f}{:>12.1f}{:>12.1f}{:>16}\n'.format(
+            result['resources'],
+            result['step'],
+            result['seconds'],
+            result['peak_mb'],
+            result['extra_mb'],
+            '{:,d}'.format(result['bytes']) if result['bytes'] is not None else ''))
+    if results and not results[0]['memory_resettable']:
+        out_fp.write('Peak memory could not be reset between steps. It is the peak of the process '
+                     'so far.\n')
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark serializing large result stores.'
+    )
+
+    parser.add_argument('--resources',
+                        type=int,
+                        nargs='+',
+                        default=[10000, 100000],
+                        help='Numbers of resources in the store (default: %(default)s)')
+
+    parser.add_argument('--store-dir',
+                        action='store_true',
+                        help='Use an on-disk store instead of the in-memory one')
+
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for generating resources (default: %(default)s)')
+
+    parser.add_argument('--json',
+                        dest='json_file',
+                        help='File to write the results to, for comparing runs')
+
+    return parser.parse_args(args)
+
+def main(args):
+    results = run(args.resources, args.store_dir, args.seed)
+    print_results(results)
+    if args.json_file:
+        with open(args.json_file, 'w') as out_fp:
+            json.dump(results, out_fp, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,33 @@
+"""Convert a pickled responses or exceptions dump to an indexed dump (see aws_inventory/dumpfile.py).
+
+usage: python -m tools.pickle2dump [--exceptions] PICKLE_FILE DUMP_FILE
+"""
+
+import argparse
+
+from aws_inventory import dumpfile
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Convert a pickled responses or exceptions dump to an indexed dump.'
+    )
+
+    parser.add_argument('pickle_file', help='Pickled dump (from --responses-dump or --exceptions-dump)')
+
+    parser.add_argument('dump_file', help='Indexed dump to write')
+
+    parser.add_argument('--exceptions',
+                        action='store_true',
+                        help='The pickle is an exceptions dump rather than a responses dump')
+
+    return parser.parse_args(args)
+
+def main(args):
+    kind = dumpfile.EXCEPTIONS if args.exceptions else dumpfile.RESPONSES
+    with open(args.pickle_file, 'rb') as pickle_fp, open(args.dump_file, 'wb') as out_fp:
+        count = dumpfile.convert_pickle(pickle_fp, out_fp, kind)
+    print 'Converted {:d} {} to "{}".'.format(count, kind, args.dump_file)
+
+if __name__ == '__main__':
+    main(parse_args())
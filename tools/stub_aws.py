@@ -0,0 +1,302 @@
+"""Local stand-in for AWS to benchmark and test the invoker without an account.
+
+Synthetic services are written as botocore service models (JSON protocol) to a data directory which
+botocore is pointed at with AWS_DATA_PATH. Clients for them are created by the real client factory
+with the endpoint URL of :class:`StubAws`, an HTTP server answering every service and region. The
+service and region of a request are read from the credential scope of its signature.
+
+Latency, pagination depth, payload size, throttling rate, and error rate are all configurable.
+"""
+
+import BaseHTTPServer
+import datetime
+import hashlib
+import json
+import logging
+import os.path
+import random
+import re
+import SocketServer
+import threading
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+API_VERSION = '2020-01-01'
+SERVICE_NAME_TEMPLATE = 'benchsvc{:03d}'
+REGION_NAME_TEMPLATE = 'bench-region-{:d}'
+MAX_PAGE_SIZE = 1000
+
+# Authorization: AWS4-HMAC-SHA256 Credential=<key ID>/<date>/<region>/<service>/aws4_request, ...
+CREDENTIAL_SCOPE_RE = re.compile(r'Credential=[^/]+/[^/]+/([^/]+)/([^/]+)/aws4_request')
+
+STATS_PATH = '/stats'
+
+def get_operation_names(op_count):
+    """Name operations so even ones are paginated and odd ones are not.
+
+    :param int op_count: number of operations per service
+    :rtype: list
+    :return: operation names
+    """
+    return ['ListThings{:d}'.format(i) if i % 2 == 0 else 'DescribeThings{:d}'.format(i)
+            for i in range(op_count)]
+
+def build_service_model(svc_name, op_names):
+    """
+    :param str svc_name: service name
+    :param list op_names: operation names
+    :rtype: dict
+    :return: botocore service model and paginator model
+    """
+    operations = {}
+    paginators = {}
+    for svc_op in op_names:
+        paginated = svc_op.startswith('List')
+        operations[svc_op] = {
+            'name': svc_op,
+            'http': {'method': 'POST', 'requestUri': '/'},
+            'input': {'shape': 'ListThingsRequest' if paginated else 'DescribeThingsRequest'},
+            'output': {'shape': 'ListThingsResponse'}
+        }
+        if paginated:
+            paginators[svc_op] = {'input_token': 'NextToken',
+                                  'output_token': 'NextToken',
+                                  'limit_key': 'MaxResults',
+                                  'result_key': 'Things'}
+    service_model = {
+        'version': '2.0',
+        'metadata': {
+            'apiVersion': API_VERSION,
+            'endpointPrefix': svc_name,
+            'jsonVersion': '1.1',
+            'protocol': 'json',
+            'serviceFullName': 'Benchmark Service {}'.format(svc_name),
+            'serviceId': svc_name,
+            'signatureVersion': 'v4',
+            'targetPrefix': svc_name,
+            'uid': '{}-{}'.format(svc_name, API_VERSION)
+        },
+        'operations': operations,
+        'shapes': {
+            'ListThingsRequest': {'type': 'structure',
+                                  'members': {'NextToken': {'shape': 'String'},
+                                              'MaxResults': {'shape': 'MaxResults'}}},
+            'DescribeThingsRequest': {'type': 'structure', 'members': {}},
+            'ListThingsResponse': {'type': 'structure',
+                                   'members': {'Things': {'shape': 'ThingList'},
+                                               'NextToken': {'shape': 'String'}}},
+            'ThingList': {'type': 'list', 'member': {'shape': 'Thing'}},
+            'Thing': {'type': 'structure',
+                      'members': {'ThingId': {'shape': 'String'},
+                                  'Arn': {'shape': 'String'},
+                                  'CreatedAt': {'shape': 'Timestamp'},
+                                  'Tags': {'shape': 'TagMap'},
+                                  'Payload': {'shape': 'String'}}},
+            'TagMap': {'type': 'map', 'key': {'shape': 'String'}, 'value': {'shape': 'String'}},
+            'MaxResults': {'type': 'integer', 'min': 1, 'max': MAX_PAGE_SIZE},
+            'Timestamp': {'type': 'timestamp'},
+            'String': {'type': 'string'}
+        }
+    }
+    return service_model, {'pagination': paginators}
+
+def write_models(data_dir, service_count, op_count):
+    """Write synthetic service models where botocore finds them when AWS_DATA_PATH is data_dir.
+
+    :param str data_dir: directory to write models to
+    :param int service_count: number of services
+    :param int op_count: number of operations per service
+    :rtype: dict
+    :return: {service name: [operation names]}
+    """
+    services = {}
+    op_names = get_operation_names(op_count)
+    for i in range(service_count):
+        svc_name = SERVICE_NAME_TEMPLATE.format(i)
+        model_dir = os.path.join(data_dir, svc_name, API_VERSION)
+        if not os.path.isdir(model_dir):
+            os.makedirs(model_dir)
+        service_model, paginator_model = build_service_model(svc_name, op_names)
+        with open(os.path.join(model_dir, 'service-2.json'), 'w') as out_fp:
+            json.dump(service_model, out_fp)
+        with open(os.path.join(model_dir, 'paginators-1.json'), 'w') as out_fp:
+            json.dump(paginator_model, out_fp)
+        services[svc_name] = op_names
+    return services
+
+def get_region_names(region_count):
+    """
+    :param int region_count: number of regions
+    :rtype: list
+    :return: region names
+    """
+    return [REGION_NAME_TEMPLATE.format(i) for i in range(region_count)]
+
+def _fraction(*key):
+    """Map a key to a fraction in [0, 1) which is the same on every run."""
+    return int(hashlib.md5('/'.join(key)).hexdigest()[:8], 16) / float(0x100000000)
+
+class StubAws(object):
+    """HTTP server answering calls to the synthetic services in every region."""
+
+    def __init__(self,
+                 latency=0.0,
+                 pages=1,
+                 items_per_page=10,
+                 item_bytes=100,
+                 throttle_rate=0.0,
+                 error_rate=0.0,
+                 seed=None):
+        """
+        :param float latency: seconds to wait before answering each request
+        :param int pages: pages of a paginated operation at the default page size
+        :param int items_per_page: items in a page at the default page size, and in the response of
+            an operation which is not paginated
+        :param int item_bytes: size of the payload of each item
+        :param float throttle_rate: fraction of requests answered with a throttling error
+        :param float error_rate: fraction of operations (in a service and region) which always fail
+            with an access denied error
+        :param int seed: seed for choosing requests to throttle
+        """
+        self.latency = latency
+        self.pages = pages
+        self.items_per_page = items_per_page
+        self.item_bytes = item_bytes
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'bytes': 0}
+        self._server = None
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        :return: number of requests, throttled requests, error responses, and bytes sent
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                self._stats[name] += count
+
+    def answer(self, svc_name, region, svc_op, request):
+        """Answer a request.
+
+        :param str svc_name: service name
+        :param str region: region name
+        :param str svc_op: operation name
+        :param dict request: request parameters
+        :rtype: tuple
+        :return: HTTP status and response body
+        """
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            self._count(throttled=1)
+            return 400, {'__type': 'ThrottlingException', 'message': 'Rate exceeded'}
+        if self.error_rate and _fraction(svc_name, region, svc_op) < self.error_rate:
+            self._count(errors=1)
+            return 400, {'__type': 'AccessDeniedException',
+                         'message': 'Not authorized to perform {}'.format(svc_op)}
+
+        item_count = self.pages * self.items_per_page
+        page_size = self.items_per_page
+        if svc_op.startswith('List'):
+            page_size = request.get('MaxResults') or page_size
+        start = int(request.get('NextToken') or 0)
+        end = min(start + page_size, item_count)
+        response = {'Things': [self._build_item(svc_name, region, svc_op, i)
+                               for i in range(start, end)]}
+        if svc_op.startswith('List') and end < item_count:
+            response['NextToken'] = str(end)
+        return 200, response
+
+    def _build_item(self, svc_name, region, svc_op, index):
+        thing_id = '{}-{:08d}'.format(svc_op.lower(), index)
+        return {'ThingId': thing_id,
+                'Arn': 'arn:aws:{}:{}:123456789012:thing/{}'.format(svc_name, region, thing_id),
+                'CreatedAt': 1500000000 + index,
+                'Tags': {'Name': thing_id, 'Environment': 'benchmark'},
+                'Payload': (thing_id * (self.item_bytes / len(thing_id) + 1))[:self.item_bytes]}
+
+    def start(self, port=0, address='127.0.0.1'):
+        """Serve from a background thread.
+
+        :param int port: port to listen on, or 0 for any free port
+        :param str address: address to listen on
+        :rtype: str
+        :return: endpoint URL for clients
+        """
+        self._server = _StubServer((address, port), _StubHandler)
+        self._server.stub = self
+        server_thread = threading.Thread(target=self._server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        return 'http://{}:{:d}'.format(address, self._server.server_address[1])
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+def serve_in_process(options, conn):
+    """Serve until terminated. Target of a separate process, so the server does not compete with
+    the invoker for the GIL or add to its memory use.
+
+    :param dict options: keyword arguments of StubAws
+    :param multiprocessing.Connection conn: connection to send the endpoint URL to
+    """
+    endpoint_url = StubAws(**options).start()
+    conn.send(endpoint_url)
+    conn.close()
+    threading.Event().wait(365 * 24 * 3600)
+
+class _StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # many workers connect at once
+    request_queue_size = 512
+
+class _StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # keep connections open so clients reuse them, like they do with AWS
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path != STATS_PATH:
+            self._send(404, {'message': 'Not found'})
+            return
+        self._send(200, self.server.stub.get_stats())
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.getheader('Content-Length') or 0))
+        match = CREDENTIAL_SCOPE_RE.search(self.headers.getheader('Authorization') or '')
+        target = self.headers.getheader('X-Amz-Target') or ''
+        if not match or '.' not in target:
+            self._send(400, {'__type': 'InvalidRequest', 'message': 'Unsigned or untargeted'})
+            return
+        region, svc_name = match.groups()
+        svc_op = target.split('.', 1)[1]
+        if stub.latency:
+            time.sleep(stub.latency)
+        status, response = stub.answer(svc_name, region, svc_op, json.loads(body or '{}'))
+        stub._count(requests=1, bytes=self._send(status, response))
+
+    def _send(self, status, response):
+        body = json.dumps(response)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-amzn-RequestId', hashlib.md5(body).hexdigest())
+        self.send_header('Date', datetime.datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT'))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def log_message(self, format, *args):
+        LOGGER.debug('Request from %s: %s', self.client_address[0], format % args)
@@ -0,0 +1,203 @@
+"""Generate realistic responses for a large account, without invoking any API.
+
+Responses look like those of common AWS operations: nested dicts and lists, tags, datetimes,
+binary blobs (as returned by CloudTrail ListPublicKeys), response metadata, and operations with
+nothing to list. The same resource count and seed always generate the same responses.
+"""
+
+import datetime
+import random
+
+
+REGIONS = ('us-east-1', 'us-east-2', 'us-west-1', 'us-west-2', 'ca-central-1', 'eu-west-1',
+           'eu-west-2', 'eu-west-3', 'eu-central-1', 'eu-north-1', 'ap-south-1', 'ap-northeast-1',
+           'ap-northeast-2', 'ap-southeast-1', 'ap-southeast-2', 'sa-east-1')
+
+ACCOUNT_ID = '123456789012'
+
+EPOCH = datetime.datetime(2017, 1, 1)
+
+def _random_id(rng, prefix, length=17):
+    return prefix + ''.join(rng.choice('0123456789abcdef') for _ in range(length))
+
+def _random_name(rng):
+    return '-'.join(rng.choice(('web', 'api', 'db', 'cache', 'batch', 'prod', 'dev', 'stage',
+                                'blue', 'green', 'worker', 'internal')) for _ in range(3))
+
+def _random_date(rng):
+    return EPOCH + datetime.timedelta(seconds=rng.randint(0, 3 * 365 * 24 * 3600))
+
+def _tags(rng, key_name='Key', value_name='Value'):
+    tags = [{key_name: 'Name', value_name: _random_name(rng)},
+            {key_name: 'Environment', value_name: rng.choice(('prod', 'dev', 'stage'))}]
+    for i in range(rng.randint(0, 4)):
+        tags.append({key_name: 'team:{:d}'.format(i), value_name: _random_name(rng)})
+    return tags
+
+def _build_instance(rng, region):
+    instance_id = _random_id(rng, 'i-')
+    return {
+        'InstanceId': instance_id,
+        'ImageId': _random_id(rng, 'ami-'),
+        'InstanceType': rng.choice(('t2.micro', 'm5.large', 'c5.xlarge', 'r5.2xlarge')),
+        'LaunchTime': _random_date(rng),
+        'Placement': {'AvailabilityZone': region + rng.choice('abc'),
+                      'GroupName': '',
+                      'Tenancy': 'default'},
+        'PrivateIpAddress': '10.{:d}.{:d}.{:d}'.format(rng.randint(0, 255),
+                                                       rng.randint(0, 255),
+                                                       rng.randint(1, 254)),
+        'State': {'Code': 16, 'Name': 'running'},
+        'SubnetId': _random_id(rng, 'subnet-'),
+        'VpcId': _random_id(rng, 'vpc-'),
+        'Monitoring': {'State': 'disabled'},
+        'EbsOptimized': rng.random() < 0.5,
+        'BlockDeviceMappings': [{'DeviceName': '/dev/xvda',
+                                 'Ebs': {'AttachTime': _random_date(rng),
+                                         'DeleteOnTermination': True,
+                                         'Status': 'attached',
+                                         'VolumeId': _random_id(rng, 'vol-')}}],
+        'SecurityGroups': [{'GroupId': _random_id(rng, 'sg-'), 'GroupName': _random_name(rng)}
+                           for _ in range(rng.randint(1, 3))],
+        'Tags': _tags(rng)
+    }
+
+def _build_reservation(rng, region):
+    return {'ReservationId': _random_id(rng, 'r-'),
+            'OwnerId': ACCOUNT_ID,
+            'Groups': [],
+            'Instances': [_build_instance(rng, region)]}
+
+def _build_volume(rng, region):
+    return {'VolumeId': _random_id(rng, 'vol-'),
+            'Size': rng.choice((8, 20, 100, 500)),
+            'AvailabilityZone': region + rng.choice('abc'),
+            'State': rng.choice(('in-use', 'available')),
+            'CreateTime': _random_date(rng),
+            'Encrypted': rng.random() < 0.5,
+            'VolumeType': rng.choice(('gp2', 'io1', 'st1')),
+            'Attachments': [],
+            'Tags': _tags(rng)}
+
+def _build_role(rng, region):
+    name = _random_name(rng)
+    return {'RoleName': name,
+            'RoleId': _random_id(rng, 'AROA', 16).upper(),
+            'Arn': 'arn:aws:iam::{}:role/{}'.format(ACCOUNT_ID, name),
+            'Path': '/',
+            'CreateDate': _random_date(rng),
+            'MaxSessionDuration': 3600,
+            'AssumeRolePolicyDocument': {
+                'Version': '2012-10-17',
+                'Statement': [{'Effect': 'Allow',
+                               'Principal': {'Service': 'ec2.amazonaws.com'},
+                               'Action': 'sts:AssumeRole'}]}}
+
+def _build_function(rng, region):
+    name = _random_name(rng)
+    return {'FunctionName': name,
+            'FunctionArn': 'arn:aws:lambda:{}:{}:function:{}'.format(region, ACCOUNT_ID, name),
+            'Runtime': rng.choice(('python2.7', 'python3.6', 'nodejs8.10', 'java8')),
+            'Handler': 'index.handler',
+            'CodeSize': rng.randint(1000, 50000000),
+            'MemorySize': rng.choice((128, 256, 512, 1024)),
+            'Timeout': rng.choice((3, 30, 300)),
+            'LastModified': _random_date(rng).isoformat(),
+            'Environment': {'Variables': dict(('VAR_{:d}'.format(i), _random_name(rng))
+                                              for i in range(rng.randint(0, 5)))},
+            'VpcConfig': {'SubnetIds': [], 'SecurityGroupIds': []}}
+
+def _build_queue_url(rng, region):
+    return 'https://{}.queue.amazonaws.com/{}/{}'.format(region, ACCOUNT_ID, _random_name(rng))
+
+def _build_public_key(rng, region):
+    return {'Value': ''.join(chr(rng.randint(0, 255)) for _ in range(rng.randint(200, 300))),
+            'ValidityStartTime': _random_date(rng),
+            'ValidityEndTime': _random_date(rng),
+            'Fingerprint': _random_id(rng, '', 32)}
+
+def _build_table_name(rng, region):
+    return _random_name(rng)
+
+def _build_log_group(rng, region):
+    name = '/aws/lambda/' + _random_name(rng)
+    return {'logGroupName': name,
+            'creationTime': rng.randint(1483228800000, 1577836800000),
+            'metricFilterCount': 0,
+            'arn': 'arn:aws:logs:{}:{}:log-group:{}:*'.format(region, ACCOUNT_ID, name),
+            'storedBytes': rng.randint(0, 10 ** 10)}
+
+# (service, operation, key of the list of resources, resource builder, relative number of resources)
+RESOURCE_KINDS = (
+    ('ec2', 'DescribeInstances', 'Reservations', _build_reservation, 4),
+    ('ec2', 'DescribeVolumes', 'Volumes', _build_volume, 4),
+    ('iam', 'ListRoles', 'Roles', _build_role, 1),
+    ('lambda', 'ListFunctions', 'Functions', _build_function, 2),
+    ('sqs', 'ListQueues', 'QueueUrls', _build_queue_url, 2),
+    ('cloudtrail', 'ListPublicKeys', 'PublicKeyList', _build_public_key, 1),
+    ('dynamodb', 'ListTables', 'TableNames', _build_table_name, 2),
+    ('logs', 'DescribeLogGroups', 'logGroups', _build_log_group, 4)
+)
+
+# operations which find nothing, so are hidden by the GUI
+EMPTY_OPERATIONS = (
+    ('ec2', 'DescribeSpotFleetRequests', 'SpotFleetRequestConfigs'),
+    ('iam', 'ListSAMLProviders', 'SAMLProviderList'),
+    ('lambda', 'ListLayers', 'Layers'),
+    ('dynamodb', 'ListBackups', 'BackupSummaries')
+)
+
+def _response_metadata(rng):
+    request_id = '-'.join(_random_id(rng, '', length) for length in (8, 4, 4, 4, 12))
+    return {'RequestId': request_id,
+            'HTTPStatusCode': 200,
+            'HTTPHeaders': {'x-amzn-requestid': request_id,
+                            'content-type': 'text/xml;charset=UTF-8',
+                            'date': 'Mon, 01 Jan 2018 00:00:00 GMT'},
+            'RetryAttempts': 0}
+
+def iter_responses(resource_count, seed=0, regions=REGIONS):
+    """Generate responses of operations in every region, with resource_count resources in total.
+    Responses are generated one at a time, so they can be added to a store without all of them
+    being held in memory.
+
+    :param int resource_count: number of resources across all responses
+    :param int seed: seed for generating resources
+    :param tuple regions: region names
+    :rtype: iterator
+    :return: (service, region, operation, response) tuples
+    """
+    rng = random.Random(seed)
+    total_weight = sum(kind[-1] for kind in RESOURCE_KINDS) * len(regions)
+    remaining = resource_count
+    for i, (service, svc_op, list_key, build_resource, weight) in enumerate(RESOURCE_KINDS):
+        for j, region in enumerate(regions):
+            if i == len(RESOURCE_KINDS) - 1 and j == len(regions) - 1:
+                count = remaining
+            else:
+                count = min(remaining, resource_count * weight // total_weight)
+            remaining -= count
+            yield service, region, svc_op, {
+                list_key: [build_resource(rng, region) for _ in range(count)],
+                'ResponseMetadata': _response_metadata(rng)
+            }
+    for service, svc_op, list_key in EMPTY_OPERATIONS:
+        for region in regions:
+            yield service, region, svc_op, {list_key: [],
+                                            'ResponseMetadata': _response_metadata(rng)}
+
+def populate_store(storage, resource_count, seed=0, regions=REGIONS):
+    """Add generated responses to a store.
+
+    :param ResultStore storage: store to add to
+    :param int resource_count: number of resources across all responses
+    :param int seed: seed for generating resources
+    :param tuple regions: region names
+    :rtype: int
+    :return: number of responses added
+    """
+    count = 0
+    for service, region, svc_op, resp in iter_responses(resource_count, seed, regions):
+        storage.add_response(service, region, svc_op, resp)
+        count += 1
+    return count